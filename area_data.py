@@ -197,15 +197,164 @@ areasData = [
     },
 ]
 
+# -------------------------------------
+# Micromarket Centroids
+# -------------------------------------
+# Approximate (lat, lng) centre of each micromarket, used to suggest/validate
+# the micromarket from pasted coordinates. Micromarkets without a reliable
+# centre are left out and are simply never suggested.
+micromarketCentroids = {
+    # Central Bangalore
+    "Basavanagudi": (12.9416, 77.5738),
+    "BTM Layout": (12.9166, 77.6101),
+    "Chamrajapet": (12.9575, 77.5646),
+    "Chickpet": (12.9698, 77.5760),
+    "Fraser Town": (12.9966, 77.6135),
+    "Jayamahal": (13.0005, 77.5980),
+    "Jogupalya": (12.9760, 77.6240),
+    "Kempapura Agrahara": (12.9590, 77.5400),
+    "Lakkasandra": (12.9440, 77.5990),
+    "Malleswaram": (13.0035, 77.5710),
+    "Rajajinagar": (12.9916, 77.5542),
+    "Sadashivanagar": (13.0068, 77.5813),
+    "Shanthi Nagar": (12.9560, 77.5990),
+    "Vasanth Nagar": (12.9910, 77.5930),
+    "Vishveshwara Puram": (12.9480, 77.5760),
+    # East Bangalore
+    "A. Narayanapura": (12.9960, 77.6760),
+    "Aavalahalli": (13.0320, 77.7480),
+    "AECS Layout": (12.9610, 77.7150),
+    "Agaram": (12.9450, 77.6250),
+    "Avalahalli": (13.0320, 77.7480),
+    "Balagere": (12.9440, 77.7390),
+    "Bellandur": (12.9260, 77.6760),
+    "Bhoganahalli": (12.9300, 77.7310),
+    "Bidaraguppe": (12.8150, 77.7350),
+    "Brookefield": (12.9650, 77.7180),
+    "CV Raman Nagar": (12.9850, 77.6630),
+    "Carmelaram": (12.9070, 77.7060),
+    "Chikkabellandur": (12.9110, 77.7120),
+    "Chikkakannalli": (12.8870, 77.7000),
+    "Choodasandra": (12.8870, 77.6830),
+    "Dodda Nekkundi": (12.9770, 77.7100),
+    "Doddakannelli": (12.9110, 77.6960),
+    "Domlur": (12.9610, 77.6380),
+    "Dommasandra": (12.8790, 77.7500),
+    "Garudachar Palya": (12.9920, 77.7070),
+    "Gulimangala": (12.8230, 77.7120),
+    "Gunjur": (12.9270, 77.7410),
+    "HAL Airport": (12.9500, 77.6680),
+    "Harlur": (12.9080, 77.6550),
+    "Hoskote": (13.0700, 77.7980),
+    "HSR Layout": (12.9116, 77.6389),
+    "Hoodi": (12.9920, 77.7160),
+    "Huskuru": (12.8400, 77.6850),
+    "Indiranagar": (12.9784, 77.6408),
+    "KR Puram": (13.0070, 77.6950),
+    "Kadubeesanahalli": (12.9370, 77.6950),
+    "Kadugodi": (12.9980, 77.7590),
+    "Kaikondrahalli": (12.9130, 77.6720),
+    "Kannamangala": (12.9840, 77.7810),
+    "Kasvanahalli": (12.9060, 77.6800),
+    "Kodathi": (12.8990, 77.7130),
+    "Koramangala": (12.9352, 77.6245),
+    "Mahadevapura": (12.9916, 77.6960),
+    "Marathahalli": (12.9569, 77.7011),
+    "Mullur": (12.9050, 77.7290),
+    "Muthanallur": (12.8580, 77.7250),
+    "Naganathapura": (12.8860, 77.6620),
+    "Panathur": (12.9390, 77.7150),
+    "Rayasandra": (12.8730, 77.6610),
+    "Sadaramangala": (12.9880, 77.7380),
+    "Sarjapura": (12.8600, 77.7860),
+    "Somsundarapalya": (12.9100, 77.6500),
+    "Varthur": (12.9390, 77.7460),
+    "Whitefield": (12.9698, 77.7500),
+    # North Bangalore
+    "Airport City": (13.1990, 77.7060),
+    "Bagaluru": (13.1350, 77.6700),
+    "Baiyappanahalli": (12.9910, 77.6530),
+    "Banasavadi": (13.0140, 77.6510),
+    "Budigere": (13.1060, 77.7520),
+    "Budigere Cross": (13.0570, 77.7430),
+    "Byappanahalli": (12.9910, 77.6530),
+    "Byrathi": (13.0500, 77.6730),
+    "Cheemasandra": (13.0300, 77.7300),
+    "Chikkabanavara": (13.0810, 77.5000),
+    "Chikkagubbi": (13.0620, 77.6760),
+    "Devanahalli": (13.2470, 77.7130),
+    "Dodda Gubbi": (13.0720, 77.6950),
+    "Doddaballapur": (13.2920, 77.5430),
+    "HBR Layout": (13.0350, 77.6300),
+    "Hebbal": (13.0358, 77.5970),
+    "Hennur": (13.0450, 77.6390),
+    "Hesaraghatta": (13.1400, 77.4800),
+    "Horamavu": (13.0260, 77.6620),
+    "IISC": (13.0210, 77.5670),
+    "Jakkur": (13.0780, 77.6070),
+    "Jalahalli": (13.0450, 77.5450),
+    "Kadugondanahalli": (13.0160, 77.6200),
+    "Kalkere": (13.0400, 77.6700),
+    "Kannuru": (13.0930, 77.6620),
+    "Kothanur": (13.0640, 77.6430),
+    "Mandur": (13.0760, 77.7220),
+    "Nagavara": (13.0430, 77.6220),
+    "Radhakrishna Temple Ward": (13.0330, 77.5770),
+    "Rajanukunte": (13.1660, 77.5650),
+    "Ramamurthy Nagar": (13.0170, 77.6770),
+    "RT Nagar": (13.0210, 77.5950),
+    "Sahakara Nagar": (13.0620, 77.5870),
+    "Thanisandra": (13.0560, 77.6330),
+    "Vidyaranyapura": (13.0780, 77.5560),
+    "Vijinapura": (13.0100, 77.6690),
+    "Yelahanka": (13.1007, 77.5963),
+    "Yelahanka Satellite Town": (13.0990, 77.5870),
+    # South Bangalore
+    "Akshayanagar": (12.8700, 77.6100),
+    "Anekal": (12.7100, 77.6960),
+    "Anjanapura": (12.8600, 77.5570),
+    "Attibele": (12.7780, 77.7710),
+    "Banashankari": (12.9255, 77.5468),
+    "Banashankari 6th Stage": (12.8900, 77.5200),
+    "Bannerghatta": (12.8640, 77.5960),
+    "Begur": (12.8770, 77.6330),
+    "Bettadasanpura": (12.8470, 77.6530),
+    "Bilekhalli": (12.8960, 77.6110),
+    "Bommanahalli": (12.9030, 77.6240),
+    "Bommasandra": (12.8160, 77.6980),
+    "Electronic City": (12.8452, 77.6602),
+    "Hemmigepura": (12.8950, 77.4950),
+    "Hulimangala": (12.8080, 77.6480),
+    "JP Nagar": (12.9063, 77.5857),
+    "Jayanagar": (12.9250, 77.5938),
+    "Jigani": (12.7850, 77.6410),
+    "Kaggalipura": (12.8100, 77.5180),
+    "Kengeri": (12.9080, 77.4830),
+    "Kudlu": (12.8880, 77.6500),
+    "Rajarajeshwari Nagar": (12.9260, 77.5130),
+    "Uttarahalli": (12.9050, 77.5450),
+    # West Bangalore
+    "Nagarabhavi": (12.9600, 77.5110),
+    "Nagasandra": (13.0480, 77.5000),
+    "Nelamangala": (13.0970, 77.3930),
+    "Peenya": (13.0330, 77.5210),
+    "Peenya Industrial Area": (13.0280, 77.5150),
+    "Yeshwantpur": (13.0280, 77.5400),
+}
+
 # Flatten and sort micromarket options
 all_micromarkets = []
 for area in areasData:
     all_micromarkets.extend(area["MicroMarkets"])
 all_micromarkets = sorted(set(all_micromarkets))
 
+# Micromarket -> Area lookup table
+micromarket_to_area = {
+    micromarket: area_obj["Area"]
+    for area_obj in areasData
+    for micromarket in area_obj["MicroMarkets"]
+}
+
 def find_area(selected_micromarket: str) -> str:
     """Returns the Area name for the given micromarket."""
-    for area_obj in areasData:
-        if selected_micromarket in area_obj["MicroMarkets"]:
-            return area_obj["Area"]
-    return ""
+    return micromarket_to_area.get(selected_micromarket, "")
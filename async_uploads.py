@@ -0,0 +1,251 @@
+# async_uploads.py
+
+import asyncio
+import json as jsonlib
+import logging
+import os
+import threading
+
+from backends import BackendError, get_backends
+from metrics import metered
+from submission_pipeline import (
+    PARENT_FOLDER_ID, MEDIA_PREFIX, build_sheet_row, claim_property_id, create_drive_folder, drain_submission,
+    get_next_row_index, save_listing, sheet_append_lock, sheet_inline,
+)
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------------
+# Configuration
+# -------------------------------------
+# UPLOAD_ENGINE=async drains the journal on one shared event loop: every media
+# transfer of every submission is a coroutine, so concurrency is bounded by the
+# per-service limits below rather than by worker threads. The journal workers
+# that rent.py's main() starts enter it from their threads through run_sync().
+UPLOAD_ENGINE = os.getenv("UPLOAD_ENGINE", "threads")        # "threads" or "async"
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", "256"))
+ASYNC_HTTP_TIMEOUT = float(os.getenv("ASYNC_HTTP_TIMEOUT", "600"))
+SERVICE_CONCURRENCY = {
+    "storage": int(os.getenv("ASYNC_STORAGE_CONCURRENCY", "200")),
+    # Drive throttles per user well before Storage does
+    "drive": int(os.getenv("ASYNC_DRIVE_CONCURRENCY", "32")),
+}
+
+
+class AsyncHTTPError(BackendError):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"HTTP {status_code}: {message}")
+        self.status_code = status_code
+
+
+# -------------------------------------
+# Async HTTP Session
+# -------------------------------------
+class AsyncGoogleSession:
+    """aiohttp session authorized with one set of Google credentials.
+
+    Created on the engine's event loop on first use. Every request is recorded
+    in the backend call metrics, like the pooled requests sessions.
+    """
+
+    def __init__(self, credentials, max_connections: int = ASYNC_MAX_CONNECTIONS):
+        self.credentials = credentials
+        self.max_connections = max_connections
+        self._session = None
+        self._token_lock = None
+
+    async def _authorization(self) -> str:
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+        async with self._token_lock:
+            if not self.credentials.valid:
+                from google.auth.transport.requests import Request
+                await asyncio.to_thread(self.credentials.refresh, Request())
+        return f"Bearer {self.credentials.token}"
+
+    def _client(self):
+        if self._session is None or self._session.closed:
+            import aiohttp
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=ASYNC_HTTP_TIMEOUT),
+            )
+        return self._session
+
+    async def request(self, service: str, op: str, method: str, url: str, data=None, json=None, headers=None):
+        """Returns (case-insensitive response headers, parsed JSON body or {}).
+
+        `data` may be bytes or a file path, which is streamed from disk.
+        """
+        headers = {**(headers or {}), "Authorization": await self._authorization()}
+        body = data
+        nbytes = 0
+        if isinstance(data, (str, os.PathLike)):
+            # Opened off the loop; aiohttp reads file bodies in its executor
+            body = await asyncio.to_thread(open, data, "rb")
+            nbytes = os.fstat(body.fileno()).st_size
+        elif data is not None:
+            nbytes = len(data)
+        try:
+            with metered(service, op, nbytes):
+                async with self._client().request(method, url, data=body, json=json, headers=headers) as resp:
+                    if resp.status >= 400:
+                        raise AsyncHTTPError(resp.status, (await resp.text())[:500])
+                    text = await resp.text()
+                    return resp.headers.copy(), jsonlib.loads(text) if text.strip() else {}
+        finally:
+            if body is not data:
+                body.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+# -------------------------------------
+# Event Loop Bridge
+# -------------------------------------
+class EventLoopThread:
+    """A daemon thread running one event loop that sync code submits coroutines to."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="upload-loop")
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro, timeout: float = None):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+
+_loop_thread = None
+_loop_lock = threading.Lock()
+_limits = {}
+
+
+def run_sync(coro, timeout: float = None):
+    """Runs a coroutine on the shared upload loop and blocks the calling thread for its result."""
+    global _loop_thread
+    with _loop_lock:
+        if _loop_thread is None:
+            _loop_thread = EventLoopThread()
+    return _loop_thread.run(coro, timeout)
+
+
+def _limit(service: str) -> asyncio.Semaphore:
+    # Only ever touched from the loop thread
+    if service not in _limits:
+        _limits[service] = asyncio.Semaphore(SERVICE_CONCURRENCY[service])
+    return _limits[service]
+
+
+# -------------------------------------
+# Uploads & Commit
+# -------------------------------------
+# Unlike the sync helpers in submission_pipeline, these raise on failure:
+# they only run under the journal, which retries the submission.
+async def upload_media_to_firebase_async(property_id: str, source, folder: str, filename: str) -> str:
+    async with _limit("storage"):
+        with span("storage_upload", filename=filename):
+            return await get_backends().media.upload_async(f"{MEDIA_PREFIX}/{property_id}/{folder}/{filename}", source)
+
+
+async def upload_media_to_drive_async(source, filename: str, parent_folder_id: str) -> str:
+    async with _limit("drive"):
+        with span("drive_upload", filename=filename):
+            file_id = await get_backends().drive.upload_public_async(source, filename, parent_folder_id)
+    return f"https://drive.google.com/file/d/{file_id}/view?usp=sharing"
+
+
+async def append_to_google_sheet_async(row: list):
+    # Shared with the threaded path; polled so a cancelled task never holds it
+    while not sheet_append_lock.acquire(blocking=False):
+        await asyncio.sleep(0.01)
+    try:
+        with span("sheet_append"):
+            next_row = await asyncio.to_thread(get_next_row_index)
+            await get_backends().sheet.update_async(f"A{next_row}:AG{next_row}", [row])
+            get_next_row_index.clear()
+    finally:
+        sheet_append_lock.release()
+    logger.info(f"Row added at position {next_row}")
+    return True
+
+
+async def _gather_all(*aws) -> list:
+    # Lets every transfer finish (and record its step) before the first error fails the attempt
+    results = await asyncio.gather(*aws, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+async def upload_journaled_file_async(journal, entry, file, property_id: str, folder: str, drive_folder_id: str):
+    """Storage and Drive copies of one spooled file, concurrently; each is a journal step."""
+    step_key = f"{folder}/{os.path.basename(file.path)}"
+    storage = journal.step_async(entry, f"storage:{step_key}", lambda: upload_media_to_firebase_async(
+        property_id, file.path, folder, file.name
+    ))
+    if not drive_folder_id:
+        return await storage, None
+    drive = journal.step_async(entry, f"drive:{step_key}", lambda: upload_media_to_drive_async(
+        file.path, file.name, drive_folder_id
+    ))
+    return tuple(await _gather_all(storage, drive))
+
+
+async def drain_submission_async(journal, entry):
+    """Coroutine form of submission_pipeline.drain_submission_steps; all media of the submission upload at once."""
+    # Firestore is gRPC; its client stays on a thread
+    property_id = await journal.step_async(entry, "property_id", lambda: asyncio.to_thread(claim_property_id, journal, entry))
+    property_data = dict(entry["payload"]["property_data"], propertyId=property_id)
+
+    with span("drain_submission", propertyId=property_id, attempt=entry["attempts"], engine="async"):
+        drive_folder_id = ""
+        if entry["media"]:
+            async def folder():
+                folder_id = await asyncio.to_thread(create_drive_folder, property_id, PARENT_FOLDER_ID)
+                if not folder_id:
+                    raise RuntimeError("Drive folder creation failed")
+                return folder_id
+            drive_folder_id = await journal.step_async(entry, "drive_folder", folder)
+            property_data["driveLink"] = f"https://drive.google.com/drive/folders/{drive_folder_id}"
+
+        total = len(entry["media"])
+        uploaded = 0
+
+        async def upload(file):
+            nonlocal uploaded
+            result = await upload_journaled_file_async(journal, entry, file, property_id, file.folder, drive_folder_id)
+            uploaded += 1
+            journal.report_progress(entry, "uploading", uploaded, total)
+            return result
+
+        journal.report_progress(entry, "uploading", 0, total)
+        results = await _gather_all(*(upload(file) for file in entry["media"]))
+        drive_file_links = []
+        for folder_name in ("photos", "videos", "documents"):
+            pairs = [result for file, result in zip(entry["media"], results) if file.folder == folder_name]
+            property_data[folder_name] = [fb_url for fb_url, _ in pairs]
+            drive_file_links += [dlink for _, dlink in pairs if dlink]
+        property_data["driveFileLinks"] = drive_file_links
+
+        journal.report_progress(entry, "saving", total, total)
+        await journal.step_async(entry, "firestore", lambda: asyncio.to_thread(save_listing, entry, property_id, property_data))
+        if sheet_inline():
+            await journal.step_async(entry, "sheet", lambda: append_to_google_sheet_async(build_sheet_row(property_data)))
+
+
+def drain_submission_bridged(journal, entry):
+    """Sync drain for JournalWorker that runs drain_submission_async on the shared loop."""
+    run_sync(drain_submission_async(journal, entry))
+
+
+def journal_drain(engine: str = UPLOAD_ENGINE):
+    """The drain function for start_workers() under the configured upload engine."""
+    return drain_submission_bridged if engine == "async" else drain_submission
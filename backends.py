@@ -0,0 +1,914 @@
+# backends.py
+
+import asyncio
+import logging
+import os
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict, deque, namedtuple
+from io import BytesIO
+from urllib.parse import quote
+
+from metrics import meter
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------------
+# Backend Interfaces
+# -------------------------------------
+# The submission pipeline only talks to these four objects:
+#   listings - Firestore (rental-inventories + agents)
+#   media    - Firebase/GCS Storage bucket
+#   drive    - Google Drive
+#   sheet    - the "Rental Inventories" worksheet
+# Each has a production adapter over the real client and a deterministic
+# in-memory fake, so the whole flow can run offline for benchmarks and load tests.
+# Google libraries are imported inside the production adapters only.
+#
+# media.upload_async, drive.upload_public_async and sheet.update_async are the
+# coroutine forms used by the async upload engine (async_uploads.py). They take
+# bytes or a file path, which production adapters stream from disk.
+INVENTORY_COLLECTION = "rental-inventories"
+PROPERTY_IDS_COLLECTION = "rental-inventory-ids"    # {property ID: {"owner"}}; whoever creates it first owns the ID
+AGENTS_COLLECTION = "agents"
+LEASES_COLLECTION = "rental-inventory-leases"     # {lease name: {"owner", "expiresAt"}}; see Lease
+BATCH_LIMIT = 400
+
+Backends = namedtuple("Backends", ["listings", "media", "drive", "sheet"])
+
+
+class BackendError(Exception):
+    pass
+
+
+class RateLimitError(BackendError):
+    """The simulated equivalent of an HTTP 429 from a Google API."""
+
+
+def _read_source(source) -> bytes:
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def _rfc3339(ts: float) -> str:
+    # Drive's createdTime format
+    return time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(ts))
+
+
+# -------------------------------------
+# Production Adapters
+# -------------------------------------
+class FirestoreListingStore:
+    # Firestore talks gRPC, so its calls are metered here; the HTTP services
+    # (Storage, Drive, Sheets) are metered on their sessions (see http_transport.py)
+    def __init__(self, db, collection: str = INVENTORY_COLLECTION):
+        self.db = db
+        self.collection = db.collection(collection)
+
+    @meter("firestore")
+    def find_agent(self, phone_number: str):
+        from firebase_admin import firestore
+        query = self.db.collection(AGENTS_COLLECTION).where(
+            filter=firestore.FieldFilter("phonenumber", "==", phone_number)
+        ).limit(1)
+        for doc in query.stream():
+            return doc.to_dict()
+        return None
+
+    @meter("firestore")
+    def get(self, property_id: str):
+        snap = self.collection.document(property_id).get()
+        return snap.to_dict() if snap.exists else None
+
+    @meter("firestore")
+    def get_many(self, property_ids: list) -> dict:
+        refs = [self.collection.document(pid) for pid in property_ids]
+        return {snap.id: snap.to_dict() for snap in self.db.get_all(refs) if snap.exists}
+
+    @meter("firestore")
+    def set(self, property_id: str, data: dict):
+        self.collection.document(property_id).set(data)
+
+    @meter("firestore")
+    def create(self, property_id: str, data: dict) -> bool:
+        """Writes a new listing; False (nothing written) if the document already exists."""
+        from google.api_core.exceptions import Conflict
+        try:
+            self.collection.document(property_id).create(data)
+        except Conflict:
+            return False
+        return True
+
+    @meter("firestore")
+    def reserve_id(self, property_id: str, owner: str) -> str:
+        """Claims a property ID for `owner` unless it is claimed already; returns the owner holding it."""
+        from google.api_core.exceptions import Conflict
+        ref = self.db.collection(PROPERTY_IDS_COLLECTION).document(property_id)
+        try:
+            ref.create({"owner": owner, "createdAt": time.time()})
+            return owner
+        except Conflict:
+            snap = ref.get()
+            return (snap.to_dict() or {}).get("owner", "") if snap.exists else ""
+
+    @meter("firestore")
+    def reserved_ids(self, since: float) -> set:
+        """Property IDs reserved at or after `since` (epoch seconds), saved or not."""
+        from firebase_admin import firestore
+        query = (
+            self.db.collection(PROPERTY_IDS_COLLECTION)
+            .where(filter=firestore.FieldFilter("createdAt", ">=", since))
+            .select([])
+        )
+        return {doc.id for doc in query.stream()}
+
+    @meter("firestore")
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Takes or renews the lease `name` for `owner` unless another owner holds an unexpired one."""
+        from firebase_admin import firestore
+        ref = self.db.collection(LEASES_COLLECTION).document(name)
+
+        @firestore.transactional
+        def take(transaction):
+            snap = ref.get(transaction=transaction)
+            held = (snap.to_dict() or {}) if snap.exists else {}
+            now = time.time()
+            if held.get("owner") not in (None, owner) and held.get("expiresAt", 0) > now:
+                return False
+            transaction.set(ref, {"owner": owner, "expiresAt": now + ttl})
+            return True
+        return take(self.db.transaction())
+
+    @meter("firestore")
+    def release_lease(self, name: str, owner: str):
+        from firebase_admin import firestore
+
+        ref = self.db.collection(LEASES_COLLECTION).document(name)
+
+        @firestore.transactional
+        def give_up(transaction):
+            snap = ref.get(transaction=transaction)
+            if snap.exists and (snap.to_dict() or {}).get("owner") == owner:
+                transaction.delete(ref)
+        give_up(self.db.transaction())
+
+    @meter("firestore")
+    def update(self, property_id: str, fields: dict):
+        self.collection.document(property_id).update(fields)
+
+    @meter("firestore")
+    def update_many(self, updates: dict):
+        """Applies {property_id: fields} in batched writes."""
+        batch = self.db.batch()
+        pending = 0
+        for property_id, fields in updates.items():
+            batch.update(self.collection.document(property_id), fields)
+            pending += 1
+            if pending >= BATCH_LIMIT:
+                batch.commit()
+                batch = self.db.batch()
+                pending = 0
+        if pending:
+            batch.commit()
+
+    @meter("firestore")
+    def delete(self, property_id: str):
+        self.collection.document(property_id).delete()
+
+    @meter("firestore")
+    def stream(self, fields: list = None):
+        """Yields (property_id, data) for every listing, optionally projected to `fields`."""
+        query = self.collection.select(fields) if fields else self.collection
+        for doc in query.stream():
+            yield doc.id, doc.to_dict() or {}
+
+    @meter("firestore")
+    def query_range(self, field: str, lower: str, upper: str) -> list:
+        """Returns listings with lower <= field < upper."""
+        from firebase_admin import firestore
+        query = (
+            self.collection
+            .where(filter=firestore.FieldFilter(field, ">=", lower))
+            .where(filter=firestore.FieldFilter(field, "<", upper))
+        )
+        return [doc.to_dict() for doc in query.stream()]
+
+    def watch(self, callback):
+        """Calls callback([(change_type, property_id, data), ...]) with every change, starting
+        with all existing listings as ADDED. Returns a function that stops the watch."""
+        def on_snapshot(col_snapshot, changes, read_time):
+            callback([
+                (change.type.name, change.document.id, change.document.to_dict() or {})
+                for change in changes
+            ])
+        watch = self.collection.on_snapshot(on_snapshot)
+        return watch.unsubscribe
+
+
+GCS_UPLOAD_URL = "https://storage.googleapis.com/upload/storage/v1"
+DRIVE_API_URL = "https://www.googleapis.com/drive/v3"
+DRIVE_UPLOAD_URL = "https://www.googleapis.com/upload/drive/v3"
+SHEETS_API_URL = "https://sheets.googleapis.com/v4"
+
+
+class GCSMediaStore:
+    # http is an async_uploads.AsyncGoogleSession; without one, upload_async runs upload() on a thread
+    def __init__(self, bucket, http=None):
+        self.bucket = bucket
+        self.http = http
+
+    def upload(self, path: str, data: bytes, content_type: str = "application/octet-stream") -> str:
+        blob = self.bucket.blob(path)
+        blob.upload_from_file(BytesIO(data), content_type=content_type)
+        blob.make_public()
+        return blob.public_url
+
+    async def upload_async(self, path: str, source, content_type: str = "application/octet-stream") -> str:
+        if self.http is None:
+            return await asyncio.to_thread(self.upload, path, _read_source(source), content_type)
+        # JSON API simple upload; publicRead matches blob.make_public()
+        url = (
+            f"{GCS_UPLOAD_URL}/b/{self.bucket.name}/o"
+            f"?uploadType=media&name={quote(path, safe='')}&predefinedAcl=publicRead"
+        )
+        await self.http.request("storage", "upload", "POST", url, data=source, headers={"Content-Type": content_type})
+        return f"https://storage.googleapis.com/{self.bucket.name}/{quote(path)}"
+
+    def list(self, prefix: str):
+        """Yields (name, size) for every object under prefix."""
+        for blob in self.bucket.list_blobs(prefix=prefix):
+            yield blob.name, blob.size
+
+    def list_objects(self, prefix: str, start_offset: str = None, page_size: int = 1000):
+        """Yields {"name", "size", "updated"} in name order, from start_offset (inclusive) on."""
+        blobs = self.bucket.list_blobs(
+            prefix=prefix, start_offset=start_offset, page_size=page_size,
+            fields="items(name,size,updated),nextPageToken",
+        )
+        for blob in blobs:
+            yield {"name": blob.name, "size": blob.size, "updated": blob.updated.timestamp() if blob.updated else 0}
+
+    def download(self, path: str) -> bytes:
+        return self.bucket.blob(path).download_as_bytes()
+
+    def delete(self, path: str):
+        self.bucket.blob(path).delete()
+
+
+class GoogleDriveStore:
+    FOLDER_MIME = "application/vnd.google-apps.folder"
+
+    def __init__(self, drive_service, http=None):
+        self.service = drive_service
+        self.http = http
+
+    def find_folder(self, name: str, parent_id: str) -> str:
+        query = (
+            f"'{parent_id}' in parents and name='{name}' and "
+            f"mimeType='{self.FOLDER_MIME}' and trashed=false"
+        )
+        files = self.service.files().list(q=query, fields="files(id)").execute().get("files", [])
+        return files[0]["id"] if files else ""
+
+    def create_folder(self, name: str, parent_id: str) -> str:
+        meta = {"name": name, "mimeType": self.FOLDER_MIME, "parents": [parent_id]}
+        return self.service.files().create(body=meta, fields="id").execute().get("id")
+
+    def upload_public(self, data: bytes, filename: str, parent_id: str) -> str:
+        """Uploads a file readable by anyone with the link; returns its file ID."""
+        from googleapiclient.http import MediaIoBaseUpload
+        meta = {"name": filename, "parents": [parent_id]}
+        media = MediaIoBaseUpload(BytesIO(data), mimetype="application/octet-stream", resumable=True)
+        file_id = self.service.files().create(body=meta, media_body=media, fields="id").execute().get("id")
+        self.service.permissions().create(fileId=file_id, body={"type": "anyone", "role": "reader"}).execute()
+        return file_id
+
+    async def upload_public_async(self, source, filename: str, parent_id: str) -> str:
+        if self.http is None:
+            return await asyncio.to_thread(self.upload_public, _read_source(source), filename, parent_id)
+        # Resumable session: metadata first, then the whole body in one PUT
+        headers, _ = await self.http.request(
+            "drive", "upload.start", "POST", f"{DRIVE_UPLOAD_URL}/files?uploadType=resumable&fields=id",
+            json={"name": filename, "parents": [parent_id]},
+            headers={"X-Upload-Content-Type": "application/octet-stream"},
+        )
+        _, body = await self.http.request("drive", "upload", "PUT", headers["Location"], data=source)
+        file_id = body["id"]
+        await self.http.request(
+            "drive", "share", "POST", f"{DRIVE_API_URL}/files/{file_id}/permissions",
+            json={"type": "anyone", "role": "reader"},
+        )
+        return file_id
+
+    def list_folders(self, parent_id: str, page_size: int = 1000):
+        """Yields {"id", "name", "createdTime"} for every folder directly under parent_id, by name."""
+        query = f"'{parent_id}' in parents and mimeType='{self.FOLDER_MIME}' and trashed=false"
+        page_token = None
+        while True:
+            res = self.service.files().list(
+                q=query, fields="nextPageToken, files(id, name, createdTime)", orderBy="name",
+                pageSize=page_size, pageToken=page_token,
+            ).execute()
+            yield from res.get("files", [])
+            page_token = res.get("nextPageToken")
+            if not page_token:
+                break
+
+    def delete(self, file_id: str):
+        self.service.files().delete(fileId=file_id).execute()
+
+    def trash(self, file_id: str):
+        """Moves a file or folder (with its contents) to the trash, restorable for 30 days."""
+        self.service.files().update(fileId=file_id, body={"trashed": True}).execute()
+
+
+class GSheetStore:
+    def __init__(self, worksheet, http=None):
+        self.worksheet = worksheet
+        self.http = http
+
+    def row_values(self, row: int) -> list:
+        return self.worksheet.row_values(row)
+
+    def get_all_values(self) -> list:
+        return self.worksheet.get_all_values()
+
+    def update(self, range_name: str, values: list):
+        self.worksheet.update(values=values, range_name=range_name, value_input_option="USER_ENTERED")
+
+    def batch_update(self, data: list):
+        """Writes [{"range": ..., "values": [[...]]}, ...] in one request."""
+        self.worksheet.batch_update(data, value_input_option="USER_ENTERED")
+
+    def batch_get(self, ranges: list) -> list:
+        """Reads several A1 ranges in one request; values unformatted, dates as serial numbers."""
+        return [list(values) for values in self.worksheet.batch_get(
+            ranges, value_render_option="UNFORMATTED_VALUE", date_time_render_option="SERIAL_NUMBER"
+        )]
+
+    def last_modified(self) -> str:
+        # Drive metadata of the spreadsheet: one small request that changes on every edit
+        return self.worksheet.spreadsheet.get_lastUpdateTime()
+
+    async def update_async(self, range_name: str, values: list):
+        if self.http is None:
+            return await asyncio.to_thread(self.update, range_name, values)
+        a1 = quote(f"'{self.worksheet.title}'!{range_name}", safe="")
+        await self.http.request(
+            "sheets", "values.update", "PUT",
+            f"{SHEETS_API_URL}/spreadsheets/{self.worksheet.spreadsheet.id}/values/{a1}?valueInputOption=USER_ENTERED",
+            json={"majorDimension": "ROWS", "values": values},
+        )
+
+
+def production_backends(db, bucket, drive_service, worksheet, async_http: dict = None) -> Backends:
+    """async_http optionally maps storage/drive/sheets to AsyncGoogleSessions for the *_async methods."""
+    async_http = async_http or {}
+    return Backends(
+        listings=FirestoreListingStore(db),
+        media=GCSMediaStore(bucket, async_http.get("storage")),
+        drive=GoogleDriveStore(drive_service, async_http.get("drive")),
+        sheet=GSheetStore(worksheet, async_http.get("sheets")),
+    )
+
+
+# -------------------------------------
+# In-memory Fakes
+# -------------------------------------
+class FakeNetwork:
+    """Simulated link: per-call latency with jitter, bandwidth for payloads and injected errors.
+
+    Seeded, so a given sequence of calls always sees the same delays and failures.
+    With rate_limit_per_s, calls beyond that many in any one second raise RateLimitError.
+    Counts calls and bytes per operation for benchmark/load-test reports.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, bandwidth_mbps: float = None,
+                 error_rate: float = 0.0, rate_limit_per_s: int = None, seed: int = 0, sleep=time.sleep):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.bandwidth_mbps = bandwidth_mbps
+        self.error_rate = error_rate
+        self.rate_limit_per_s = rate_limit_per_s
+        self.sleep = sleep
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = deque()
+        self.calls = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.throttled = defaultdict(int)
+        self.bytes = defaultdict(int)
+
+    def _over_rate_limit(self) -> bool:
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] >= 1.0:
+            self._recent.popleft()
+        if len(self._recent) >= self.rate_limit_per_s:
+            return True
+        self._recent.append(now)
+        return False
+
+    def _admit(self, op: str, nbytes: int):
+        """Counts the call and returns (delay in seconds, whether it fails)."""
+        with self._lock:
+            self.calls[op] += 1
+            if self.rate_limit_per_s and self._over_rate_limit():
+                self.throttled[op] += 1
+                raise RateLimitError(f"Rate limit exceeded in {op}")
+            self.bytes[op] += nbytes
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.errors[op] += 1
+        if self.bandwidth_mbps:
+            delay += nbytes * 8 / (self.bandwidth_mbps * 1_000_000)
+        return delay, fail
+
+    def call(self, op: str, nbytes: int = 0):
+        delay, fail = self._admit(op, nbytes)
+        if delay:
+            self.sleep(delay)
+        if fail:
+            raise BackendError(f"Injected failure in {op}")
+
+    async def acall(self, op: str, nbytes: int = 0):
+        """call() for the async engine: waits on the event loop instead of blocking a thread."""
+        delay, fail = self._admit(op, nbytes)
+        if delay:
+            await asyncio.sleep(delay)
+        if fail:
+            raise BackendError(f"Injected failure in {op}")
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+            self.errors.clear()
+            self.throttled.clear()
+            self.bytes.clear()
+
+
+class MemoryListingStore:
+    def __init__(self, network: FakeNetwork = None, agents: dict = None):
+        self.network = network or FakeNetwork()
+        self.agents = dict(agents or {})       # phone number -> {"cpId", "name", "phonenumber"}
+        self.docs = {}
+        self.reservations = {}                  # property ID -> owner
+        self.reserved_at = {}                   # property ID -> time reserved
+        self.leases = {}                        # lease name -> (owner, expires at)
+        self._lock = threading.Lock()
+        self._watchers = []
+
+    def _notify(self, changes: list):
+        for callback in list(self._watchers):
+            callback(changes)
+
+    def find_agent(self, phone_number: str):
+        self.network.call("firestore.find_agent")
+        return self.agents.get(phone_number)
+
+    def get(self, property_id: str):
+        self.network.call("firestore.get")
+        with self._lock:
+            data = self.docs.get(property_id)
+            return dict(data) if data is not None else None
+
+    def get_many(self, property_ids: list) -> dict:
+        self.network.call("firestore.get_many")
+        with self._lock:
+            return {pid: dict(self.docs[pid]) for pid in property_ids if pid in self.docs}
+
+    def set(self, property_id: str, data: dict):
+        self.network.call("firestore.set", len(repr(data)))
+        with self._lock:
+            change = "MODIFIED" if property_id in self.docs else "ADDED"
+            self.docs[property_id] = dict(data)
+        self._notify([(change, property_id, dict(data))])
+
+    def create(self, property_id: str, data: dict) -> bool:
+        self.network.call("firestore.create", len(repr(data)))
+        with self._lock:
+            if property_id in self.docs:
+                return False
+            self.docs[property_id] = dict(data)
+        self._notify([("ADDED", property_id, dict(data))])
+        return True
+
+    def reserve_id(self, property_id: str, owner: str) -> str:
+        self.network.call("firestore.reserve_id")
+        with self._lock:
+            if property_id not in self.reservations:
+                self.reservations[property_id] = owner
+                self.reserved_at[property_id] = time.time()
+            return self.reservations[property_id]
+
+    def reserved_ids(self, since: float) -> set:
+        self.network.call("firestore.reserved_ids")
+        with self._lock:
+            return {pid for pid in self.reservations if self.reserved_at.get(pid, 0) >= since}
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        self.network.call("firestore.acquire_lease")
+        with self._lock:
+            holder, expires = self.leases.get(name, (owner, 0))
+            if holder != owner and expires > time.time():
+                return False
+            self.leases[name] = (owner, time.time() + ttl)
+            return True
+
+    def release_lease(self, name: str, owner: str):
+        self.network.call("firestore.release_lease")
+        with self._lock:
+            if self.leases.get(name, (None, 0))[0] == owner:
+                del self.leases[name]
+
+    def update(self, property_id: str, fields: dict):
+        self.update_many({property_id: fields})
+
+    def update_many(self, updates: dict):
+        self.network.call("firestore.update", len(repr(updates)))
+        changes = []
+        with self._lock:
+            for property_id, fields in updates.items():
+                if property_id not in self.docs:
+                    raise BackendError(f"No document to update: {property_id}")
+                self.docs[property_id].update(fields)
+                changes.append(("MODIFIED", property_id, dict(self.docs[property_id])))
+        self._notify(changes)
+
+    def delete(self, property_id: str):
+        self.network.call("firestore.delete")
+        with self._lock:
+            existed = self.docs.pop(property_id, None) is not None
+        if existed:
+            self._notify([("REMOVED", property_id, {})])
+
+    def stream(self, fields: list = None):
+        with self._lock:
+            items = list(self.docs.items())
+        self.network.call("firestore.stream", len(items) * (50 if fields else 2000))
+        for property_id, data in items:
+            if fields:
+                yield property_id, {k: data[k] for k in fields if k in data}
+            else:
+                yield property_id, dict(data)
+
+    def query_range(self, field: str, lower: str, upper: str) -> list:
+        self.network.call("firestore.query")
+        with self._lock:
+            return [dict(d) for d in self.docs.values() if lower <= (d.get(field) or "") < upper]
+
+    def watch(self, callback):
+        with self._lock:
+            initial = [("ADDED", pid, dict(data)) for pid, data in self.docs.items()]
+            self._watchers.append(callback)
+        callback(initial)
+        return lambda: self._watchers.remove(callback)
+
+
+class MemoryMediaStore:
+    def __init__(self, network: FakeNetwork = None, base_url: str = "https://storage.invalid/bucket"):
+        self.network = network or FakeNetwork()
+        self.base_url = base_url
+        self.objects = {}
+        self.updated = {}
+        self._lock = threading.Lock()
+
+    def upload(self, path: str, data: bytes, content_type: str = "application/octet-stream") -> str:
+        self.network.call("storage.upload", len(data))
+        with self._lock:
+            self.objects[path] = bytes(data)
+            self.updated[path] = time.time()
+        return f"{self.base_url}/{path}"
+
+    async def upload_async(self, path: str, source, content_type: str = "application/octet-stream") -> str:
+        data = _read_source(source)
+        await self.network.acall("storage.upload", len(data))
+        with self._lock:
+            self.objects[path] = data
+            self.updated[path] = time.time()
+        return f"{self.base_url}/{path}"
+
+    def list(self, prefix: str):
+        self.network.call("storage.list")
+        with self._lock:
+            items = sorted((name, len(data)) for name, data in self.objects.items() if name.startswith(prefix))
+        yield from items
+
+    def list_objects(self, prefix: str, start_offset: str = None, page_size: int = 1000):
+        with self._lock:
+            items = sorted(
+                (name, len(data), self.updated.get(name, 0))
+                for name, data in self.objects.items()
+                if name.startswith(prefix) and (start_offset is None or name >= start_offset)
+            )
+        for start in range(0, max(len(items), 1), page_size):
+            self.network.call("storage.list")
+            for name, size, updated in items[start:start + page_size]:
+                yield {"name": name, "size": size, "updated": updated}
+
+    def download(self, path: str) -> bytes:
+        with self._lock:
+            if path not in self.objects:
+                raise BackendError(f"No such object: {path}")
+            data = self.objects[path]
+        self.network.call("storage.download", len(data))
+        return data
+
+    def delete(self, path: str):
+        self.network.call("storage.delete")
+        with self._lock:
+            self.objects.pop(path, None)
+            self.updated.pop(path, None)
+
+
+class MemoryDriveStore:
+    def __init__(self, network: FakeNetwork = None):
+        self.network = network or FakeNetwork()
+        self.files = {}     # id -> {"name", "parent", "folder", "size"}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _new_id(self) -> str:
+        self._next_id += 1
+        return f"drive{self._next_id:08d}"
+
+    def find_folder(self, name: str, parent_id: str) -> str:
+        self.network.call("drive.find_folder")
+        with self._lock:
+            for file_id, meta in self.files.items():
+                if meta["folder"] and not meta.get("trashed") and meta["name"] == name and meta["parent"] == parent_id:
+                    return file_id
+        return ""
+
+    def create_folder(self, name: str, parent_id: str) -> str:
+        self.network.call("drive.create_folder")
+        with self._lock:
+            file_id = self._new_id()
+            self.files[file_id] = {"name": name, "parent": parent_id, "folder": True, "size": 0, "created": time.time()}
+            return file_id
+
+    def upload_public(self, data: bytes, filename: str, parent_id: str) -> str:
+        self.network.call("drive.upload", len(data))
+        self.network.call("drive.share")
+        with self._lock:
+            file_id = self._new_id()
+            self.files[file_id] = {"name": filename, "parent": parent_id, "folder": False, "size": len(data)}
+            return file_id
+
+    async def upload_public_async(self, source, filename: str, parent_id: str) -> str:
+        data = _read_source(source)
+        await self.network.acall("drive.upload", len(data))
+        await self.network.acall("drive.share")
+        with self._lock:
+            file_id = self._new_id()
+            self.files[file_id] = {"name": filename, "parent": parent_id, "folder": False, "size": len(data)}
+            return file_id
+
+    def list_folders(self, parent_id: str, page_size: int = 1000):
+        with self._lock:
+            folders = sorted((
+                {"id": file_id, "name": meta["name"], "createdTime": _rfc3339(meta.get("created", 0))}
+                for file_id, meta in self.files.items()
+                if meta["folder"] and not meta.get("trashed") and meta["parent"] == parent_id
+            ), key=lambda folder: folder["name"])
+        for start in range(0, max(len(folders), 1), page_size):
+            self.network.call("drive.list")
+            yield from folders[start:start + page_size]
+
+    def delete(self, file_id: str):
+        self.network.call("drive.delete")
+        with self._lock:
+            doomed = {file_id}
+            # Deleting a folder removes everything under it, as in Drive
+            changed = True
+            while changed:
+                children = {fid for fid, meta in self.files.items() if meta["parent"] in doomed} - doomed
+                doomed |= children
+                changed = bool(children)
+            for fid in doomed:
+                self.files.pop(fid, None)
+
+    def trash(self, file_id: str):
+        self.network.call("drive.trash")
+        with self._lock:
+            if file_id in self.files:
+                self.files[file_id]["trashed"] = True
+
+
+_CELL = re.compile(r"^([A-Z]+)(\d+)")
+_RANGE = re.compile(r"^([A-Z]+)(\d+):([A-Z]+)(\d*)$")
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for ch in letters:
+        index = index * 26 + (ord(ch) - 64)
+    return index - 1
+
+
+class MemorySheetStore:
+    def __init__(self, network: FakeNetwork = None, rows: list = None):
+        self.network = network or FakeNetwork()
+        self.rows = [list(r) for r in rows or []]
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def _size(self, rows) -> int:
+        return sum(len(str(cell)) + 1 for row in rows for cell in row)
+
+    def row_values(self, row: int) -> list:
+        self.network.call("sheets.row_values")
+        with self._lock:
+            return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def get_all_values(self) -> list:
+        with self._lock:
+            rows = [list(r) for r in self.rows]
+        self.network.call("sheets.get_all_values", self._size(rows))
+        return rows
+
+    def _write(self, range_name: str, values: list):
+        match = _CELL.match(range_name.split("!")[-1])
+        if not match:
+            raise BackendError(f"Unsupported range: {range_name}")
+        col, row = _column_index(match.group(1)), int(match.group(2))
+        with self._lock:
+            for offset, values_row in enumerate(values):
+                index = row - 1 + offset
+                while len(self.rows) <= index:
+                    self.rows.append([])
+                target = self.rows[index]
+                while len(target) < col + len(values_row):
+                    target.append("")
+                target[col:col + len(values_row)] = [str(v) for v in values_row]
+            self.version += 1
+
+    def update(self, range_name: str, values: list):
+        self.network.call("sheets.update", self._size(values))
+        self._write(range_name, values)
+
+    async def update_async(self, range_name: str, values: list):
+        await self.network.acall("sheets.update", self._size(values))
+        self._write(range_name, values)
+
+    def batch_update(self, data: list):
+        self.network.call("sheets.batch_update", sum(self._size(item["values"]) for item in data))
+        for item in data:
+            self._write(item["range"], item["values"])
+
+    def batch_get(self, ranges: list) -> list:
+        results = []
+        with self._lock:
+            for range_name in ranges:
+                match = _RANGE.match(range_name.split("!")[-1])
+                if not match:
+                    raise BackendError(f"Unsupported range: {range_name}")
+                first, last = _column_index(match.group(1)), _column_index(match.group(3))
+                start = int(match.group(2)) - 1
+                end = int(match.group(4)) if match.group(4) else len(self.rows)
+                values = [list(row[first:last + 1]) for row in self.rows[start:end]]
+                # Like the API: no trailing blank cells or rows
+                for row in values:
+                    while row and row[-1] == "":
+                        row.pop()
+                while values and not values[-1]:
+                    values.pop()
+                results.append(values)
+        self.network.call("sheets.batch_get", sum(self._size(values) for values in results))
+        return results
+
+    def last_modified(self) -> str:
+        self.network.call("sheets.last_modified")
+        with self._lock:
+            return str(self.version)
+
+
+def memory_backends(seed: int = 0, agents: dict = None, **profiles) -> Backends:
+    """Builds in-memory backends. `profiles` maps listings/media/drive/sheet to FakeNetwork kwargs."""
+    def network(name, offset):
+        return FakeNetwork(seed=seed + offset, **profiles.get(name, {}))
+    return Backends(
+        listings=MemoryListingStore(network("listings", 1), agents=agents),
+        media=MemoryMediaStore(network("media", 2)),
+        drive=MemoryDriveStore(network("drive", 3)),
+        sheet=MemorySheetStore(network("sheet", 4)),
+    )
+
+
+# -------------------------------------
+# Registry
+# -------------------------------------
+BACKEND = os.getenv("BACKEND", "google")       # "google" or "memory"
+_backends = None
+
+
+def set_backends(backends: Backends):
+    global _backends
+    _backends = backends
+
+
+def get_backends() -> Backends:
+    if _backends is None:
+        raise BackendError("Backends not configured; call set_backends() first")
+    return _backends
+
+
+# -------------------------------------
+# Shared Listing Watch
+# -------------------------------------
+class ListingFeed:
+    """One watch on the listing store, fanned out to every in-process subscriber.
+
+    Has the store's watch(callback) contract, so indexes and the sheet projector
+    take it in place of the store: each process loads the collection and holds a
+    listener once, however many indexes it keeps. A subscriber that joins after
+    the first snapshot gets the current listings as ADDED. Subscribers share the
+    change tuples and must not modify them.
+    """
+
+    def __init__(self, listings):
+        self.listings = listings
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._docs = {}
+        self._synced = False
+        self._unwatch = None
+
+    def watch(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+            # Before the first snapshot, the subscriber receives it with everyone else
+            if self._synced:
+                callback([("ADDED", pid, data) for pid, data in self._docs.items()])
+            start = self._unwatch is None
+            if start:
+                self._unwatch = lambda: None
+        if start:
+            # Outside the lock: the store may deliver the snapshot on this thread
+            self._unwatch = self.listings.watch(self._on_changes)
+        return lambda: self._unsubscribe(callback)
+
+    def _unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def _on_changes(self, changes):
+        with self._lock:
+            for change_type, property_id, data in changes:
+                if change_type == "REMOVED":
+                    self._docs.pop(property_id, None)
+                else:
+                    self._docs[property_id] = data
+            self._synced = True
+            for callback in list(self._subscribers):
+                try:
+                    callback(changes)
+                except Exception as e:
+                    # One failing subscriber must not starve the others
+                    logger.error(f"Listing feed subscriber failed: {e}")
+
+    def __len__(self):
+        return len(self._docs)
+
+    def stop(self):
+        unwatch, self._unwatch = self._unwatch, None
+        if unwatch:
+            unwatch()
+
+
+# -------------------------------------
+# Leases
+# -------------------------------------
+class Lease:
+    """A named lease in the listing store, so a background job runs in one process across all hosts.
+
+    Every process may start the job; each pass calls renew() and only the holder
+    does any work. A holder that stops renewing loses the lease after `ttl` seconds.
+    """
+
+    def __init__(self, name: str, ttl: float):
+        self.name = name
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.held = False
+        self.renewed_at = 0.0
+
+    def renew(self) -> bool:
+        self.held = False
+        now = time.time()
+        self.held = get_backends().listings.acquire_lease(self.name, self.owner, self.ttl)
+        if self.held:
+            self.renewed_at = now
+        return self.held
+
+    def release(self):
+        if self.held:
+            self.held = False
+            get_backends().listings.release_lease(self.name, self.owner)
@@ -0,0 +1,378 @@
+# benchmarks.py
+#
+# Repeatable benchmarks of the submission pipeline against the in-memory backends.
+#
+#   python benchmarks.py --out bench.json
+#   python benchmarks.py --only id_generation --compare bench.json
+#
+# Datasets are generated from a fixed seed and the fakes simulate per-service
+# latency and bandwidth (see PROFILES), so results are comparable between commits.
+
+import os
+os.environ.setdefault("TRACE_ENABLED", "0")     # keep span I/O out of the measurements
+
+import argparse
+import gc
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from backends import memory_backends, set_backends
+from shared_cache import LRUBackend, set_backend
+from tracing import percentile
+import submission_pipeline as pipeline
+from facet_index import FacetIndex
+from text_search import TextIndex
+
+# -------------------------------------
+# Configuration
+# -------------------------------------
+SEED = 20240601
+PROFILES = {
+    # Rough figures for a server in the same region as the services
+    "realistic": {
+        "listings": {"latency_ms": 40, "jitter_ms": 10, "bandwidth_mbps": 50},
+        "media": {"latency_ms": 80, "jitter_ms": 20, "bandwidth_mbps": 100},
+        "drive": {"latency_ms": 150, "jitter_ms": 40, "bandwidth_mbps": 50},
+        "sheet": {"latency_ms": 200, "jitter_ms": 50, "bandwidth_mbps": 20},
+    },
+    # No simulated network: measures only our own CPU and memory cost
+    "zero": {},
+}
+MICROMARKETS = ["HSR Layout", "Koramangala", "Whitefield", "Indiranagar", "Electronic City", "Hebbal"]
+CONFIGURATIONS = ["1 BHK", "2 BHK", "3 BHK", "4 BHK", "Studio"]
+
+
+class MemoryFile:
+    """Duck-types the .name/.read()/.getvalue() of a Streamlit UploadedFile."""
+
+    def __init__(self, name: str, data: bytes):
+        self.name = name
+        self._data = data
+
+    def read(self) -> bytes:
+        return self._data
+
+    def getvalue(self) -> bytes:
+        return self._data
+
+
+# -------------------------------------
+# Seeded Datasets
+# -------------------------------------
+def make_listing(rng: random.Random, number: int) -> dict:
+    lat, lng = 12.9716 + rng.uniform(-0.15, 0.15), 77.5946 + rng.uniform(-0.15, 0.15)
+    return {
+        "propertyId": f"RN{number:03d}",
+        "propertyName": f"Residency {rng.randint(1, 5000)}",
+        "propertyType": "Apartment",
+        "configuration": rng.choice(CONFIGURATIONS),
+        "micromarket": rng.choice(MICROMARKETS),
+        "rentPerMonthInLakhs": str(round(rng.uniform(0.2, 3.0), 2)),
+        "exactFloor": str(rng.randint(0, 30)),
+        "amenities": "Gym, Swimming pool, Club house",
+        "extraDetails": "x" * rng.randint(50, 400),
+        "_geoloc": {"lat": lat, "lng": lng},
+        "photos": [f"https://storage.invalid/bucket/rental-media-files/RN{number:03d}/photos/{i}.jpg" for i in range(8)],
+        "inventoryStatus": "Available",
+    }
+
+
+def seed_listings(backends, count: int, seed: int = SEED):
+    rng = random.Random(seed)
+    # Written straight into the fake so seeding does not pay simulated latency
+    for number in range(1, count + 1):
+        backends.listings.docs[f"RN{number:03d}"] = make_listing(rng, number)
+
+
+def seed_sheet(backends, rows: int, seed: int = SEED):
+    rng = random.Random(seed)
+    backends.sheet.rows = [list(pipeline.SHEET_HEADER)] + [
+        [f"RN{n:03d}", f"Residency {rng.randint(1, 5000)}", "Apartment"] + ["value"] * 30
+        for n in range(1, rows + 1)
+    ]
+
+
+def make_media(seed: int, photos: int, videos: int, photo_kb: int, video_mb: int) -> list:
+    rng = random.Random(seed)
+    files = [MemoryFile(f"photo_{i:02d}.jpg", rng.randbytes(photo_kb * 1024)) for i in range(photos)]
+    files += [MemoryFile(f"video_{i:02d}.mp4", rng.randbytes(video_mb * 1024 * 1024)) for i in range(videos)]
+    return files
+
+
+def fresh_backends(profile: str, seed: int = SEED):
+    backends = memory_backends(
+        seed=seed, agents={"+919876543210": {"cpId": "CP001", "name": "Bench Agent"}}, **PROFILES[profile]
+    )
+    set_backends(backends)
+    # A private in-process cache so runs never see each other's entries
+    set_backend(LRUBackend())
+    return backends
+
+
+# -------------------------------------
+# Measurement
+# -------------------------------------
+def measure(name: str, params: dict, func, iterations: int, setup=None, ops_per_call: int = 1, backends=None,
+            memory: bool = True) -> dict:
+    """Times `iterations` calls of func() and takes peak memory from one extra traced call.
+
+    setup() runs untimed before every call (e.g. to clear caches). With memory=False
+    there is no extra call and no peak (for first calls, which a second call cannot repeat).
+    """
+    timings = []
+    if backends:
+        for store in backends:
+            store.network.reset_counters()
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    calls = {}
+    if backends:
+        for store in backends:
+            calls.update({op: count / iterations for op, count in store.network.calls.items()})
+
+    peak = None
+    if memory:
+        if setup:
+            setup()
+        gc.collect()
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    timings.sort()
+    total_s = sum(timings) / 1000
+    return {
+        "name": name,
+        "params": params,
+        "iterations": iterations,
+        "throughput_per_s": round(iterations * ops_per_call / total_s, 3) if total_s else None,
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "max_ms": round(timings[-1], 3),
+        "peak_memory_mb": round(peak / 1024 / 1024, 3) if peak is not None else None,
+        "backend_calls_per_iteration": calls,
+    }
+
+
+# -------------------------------------
+# Benchmarks
+# -------------------------------------
+def bench_id_generation(profile: str, iterations: int, sizes=(10_000, 100_000)) -> list:
+    results = []
+    for size in sizes:
+        backends = fresh_backends(profile)
+        seed_listings(backends, size)
+        results.append(measure(
+            "id_generation", {"documents": size}, pipeline.generate_property_id, iterations,
+            backends=backends,
+        ))
+    return results
+
+
+def bench_agent_lookup(profile: str, iterations: int) -> list:
+    backends = fresh_backends(profile)
+    cold = measure(
+        "agent_lookup", {"cache": "cold"}, lambda: pipeline.fetch_agent_details("9876543210"), iterations,
+        setup=pipeline.fetch_agent_details.clear, backends=backends,
+    )
+    warm = measure(
+        "agent_lookup", {"cache": "warm"}, lambda: pipeline.fetch_agent_details("9876543210"), iterations,
+        backends=backends,
+    )
+    return [cold, warm]
+
+
+def bench_uploads(profile: str, iterations: int, photos: int = 30, videos: int = 2,
+                  photo_kb: int = 300, video_mb: int = 10) -> list:
+    backends = fresh_backends(profile)
+    files = make_media(SEED, photos, videos, photo_kb, video_mb)
+    photo_files, video_files = files[:photos], files[photos:]
+    total_mb = (photos * photo_kb / 1024) + videos * video_mb
+
+    def run():
+        folder_id = pipeline.create_drive_folder("RN-BENCH", "parent")
+        pipeline.process_files_concurrent(photo_files, "RN-BENCH", "photos", folder_id)
+        pipeline.process_files_concurrent(video_files, "RN-BENCH", "videos", folder_id)
+
+    result = measure(
+        "process_files_concurrent",
+        {"photos": photos, "videos": videos, "photo_kb": photo_kb, "video_mb": video_mb},
+        run, iterations, setup=pipeline.create_drive_folder.clear, ops_per_call=photos + videos, backends=backends,
+    )
+    result["megabytes_per_s_p50"] = round(total_mb / (result["p50_ms"] / 1000), 3)
+    return [result]
+
+
+def bench_sheet_append(profile: str, iterations: int, sizes=(1_000, 10_000, 50_000)) -> list:
+    results = []
+    row = ["RN-BENCH", "Bench Residency", "Apartment"] + ["value"] * 30
+    for size in sizes:
+        backends = fresh_backends(profile)
+        seed_sheet(backends, size)
+        results.append(measure(
+            "sheet_append", {"existing_rows": size}, lambda: pipeline.append_to_google_sheet(row), iterations,
+            backends=backends,
+        ))
+    return results
+
+
+AMENITIES = ["Gym", "Swimming pool", "Club house", "Power backup", "Lift", "Covered parking", "Security",
+             "Play area", "Jogging track", "Tennis court", "Balcony", "Modular kitchen"]
+RESTRICTIONS = ["No bachelors", "Family only", "No pets", "Pets allowed", "Vegetarians only",
+                "Bachelors allowed", "No smoking", "Company lease only"]
+DETAIL_WORDS = ["spacious", "sunlight", "metro", "school", "park", "view", "corner", "furnished", "wardrobe",
+                "east", "facing", "quiet", "road", "market", "hospital", "renovated", "marble", "servant", "room"]
+TEXT_QUERIES = ["gym", "pet", "no bachelors", "swimming pool gym", "family only no pets", "metro sunlight quiet"]
+
+
+def bench_text_search(profile: str, iterations: int, sizes=(10_000, 100_000)) -> list:
+    # In-process only; the profile's simulated latency does not apply
+    results = []
+    for size in sizes:
+        rng = random.Random(SEED)
+        index = TextIndex()
+        # Loaded the way the watch's first snapshot is, sorted postings included
+        index.load([
+            ("ADDED", f"RN{number:03d}", {
+                "amenities": ", ".join(rng.sample(AMENITIES, rng.randint(1, 7))),
+                "restrictions": ", ".join(rng.sample(RESTRICTIONS, rng.randint(0, 2))),
+                "extraDetails": " ".join(rng.choices(DETAIL_WORDS, k=rng.randint(5, 40))),
+            })
+            for number in range(1, size + 1)
+        ])
+        for query in TEXT_QUERIES:
+            # The first call of each query on the freshly loaded index: nothing cached for it yet
+            results.append(measure(
+                "text_search_cold", {"documents": size, "query": query}, lambda: index.search(query), 1,
+                memory=False,
+            ))
+        for query in TEXT_QUERIES:
+            # Result cache cleared before every call
+            results.append(measure(
+                "text_search", {"documents": size, "query": query}, lambda: index.search(query), iterations,
+                setup=index.clear_cache,
+            ))
+    return results
+
+
+FACET_FILTERS = {
+    "none": {},
+    "configuration": {"configuration": ["2 BHK", "3 BHK"]},
+    "micromarket_pets": {"micromarket": MICROMARKETS[:2], "petFriendly": ["Yes"]},
+    "four_facets": {"micromarket": MICROMARKETS[:1], "configuration": ["3 BHK"],
+                    "furnishingStatus": ["Fully Furnished"], "inventoryStatus": ["Available"]},
+}
+
+
+def bench_facets(profile: str, iterations: int, sizes=(10_000, 100_000)) -> list:
+    # In-process only; the profile's simulated latency does not apply
+    results = []
+    for size in sizes:
+        rng = random.Random(SEED)
+        index = FacetIndex()
+        for number in range(1, size + 1):
+            listing = make_listing(rng, number)
+            listing.update(
+                furnishingStatus=rng.choice(["Fully Furnished", "Semi Furnished", "Bare Shell"]),
+                petFriendly=rng.choice(["", "Yes", "No", "Conditional"]),
+                inventoryStatus=rng.choice(["Available", "Rented", "On Hold"]),
+            )
+            index.upsert(listing["propertyId"], listing)
+        for name, filters in FACET_FILTERS.items():
+            results.append(measure(
+                "facet_query", {"documents": size, "filters": name}, lambda: index.query(filters), iterations,
+            ))
+    return results
+
+
+BENCHMARKS = {
+    "id_generation": bench_id_generation,
+    "agent_lookup": bench_agent_lookup,
+    "uploads": bench_uploads,
+    "sheet_append": bench_sheet_append,
+    "text_search": bench_text_search,
+    "facets": bench_facets,
+}
+
+
+# -------------------------------------
+# Reporting
+# -------------------------------------
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def result_key(result: dict) -> str:
+    return result["name"] + json.dumps(result["params"], sort_keys=True)
+
+
+def compare(results: list, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {result_key(r): r for r in json.load(f)["results"]}
+    print(f"\nCompared with {baseline_path}:")
+    for result in results:
+        old = baseline.get(result_key(result))
+        if not old:
+            continue
+        for metric in ("p50_ms", "p95_ms", "peak_memory_mb"):
+            if old.get(metric) and result[metric] is not None:
+                change = (result[metric] - old[metric]) / old[metric] * 100
+                print(f"  {result['name']} {result['params']} {metric}: {old[metric]} -> {result[metric]} ({change:+.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the submission pipeline on in-memory backends.")
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--profile", default="realistic", choices=sorted(PROFILES))
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--out", help="Write results as JSON to this path")
+    parser.add_argument("--compare", help="Print changes against an earlier results file")
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.only or BENCHMARKS:
+        for result in BENCHMARKS[name](args.profile, args.iterations):
+            results.append(result)
+            print(
+                f"{result['name']:<26} {json.dumps(result['params']):<60} "
+                f"p50 {result['p50_ms']:>9.1f} ms  p95 {result['p95_ms']:>9.1f} ms  "
+                + (f"peak {result['peak_memory_mb']:>8.2f} MB" if result["peak_memory_mb"] is not None else "")
+            )
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": int(time.time()),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "profile": args.profile,
+            "seed": SEED,
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# duplicate_index.py
+
+import logging
+import threading
+from collections import defaultdict
+
+from gazetteer import normalize
+
+logger = logging.getLogger(__name__)
+
+# Words that agents add or drop freely in property names
+NAME_STOPWORDS = {"the", "apartment", "apartments", "apts", "apt", "flat", "flats", "residency", "residences"}
+GEO_DECIMALS = 3         # ~110 m cells
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(w for w in normalize(name or "").split() if w not in NAME_STOPWORDS)
+
+
+def normalize_floor(floor) -> str:
+    text = str(floor or "").strip().lower()
+    try:
+        return str(int(float(text)))
+    except ValueError:
+        return text
+
+
+def _geo_cell(geoloc):
+    if not geoloc:
+        return None
+    return round(geoloc["lat"], GEO_DECIMALS), round(geoloc["lng"], GEO_DECIMALS)
+
+
+def listing_keys(data: dict) -> set:
+    """Index keys for a listing: one on normalized text fields, one on its rounded location."""
+    config = normalize(data.get("configuration", ""))
+    floor = normalize_floor(data.get("exactFloor", ""))
+    keys = set()
+    name = normalize_name(data.get("propertyName", ""))
+    if name:
+        keys.add(("name", name, data.get("micromarket", ""), config, floor))
+    cell = _geo_cell(data.get("_geoloc"))
+    if cell:
+        keys.add(("geo", cell[0], cell[1], config, floor))
+    return keys
+
+
+# -------------------------------------
+# Duplicate Index
+# -------------------------------------
+class DuplicateIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys_by_id = {}
+        self._ids_by_key = defaultdict(set)
+        self._summaries = {}
+        self._watch = None
+        self.ready = threading.Event()
+
+    def upsert(self, data: dict):
+        pid = data.get("propertyId")
+        if not pid:
+            return
+        keys = listing_keys(data)
+        with self._lock:
+            self._remove_locked(pid)
+            self._keys_by_id[pid] = keys
+            for key in keys:
+                self._ids_by_key[key].add(pid)
+            self._summaries[pid] = {
+                "propertyId": pid,
+                "propertyName": data.get("propertyName", ""),
+                "micromarket": data.get("micromarket", ""),
+                "configuration": data.get("configuration", ""),
+                "exactFloor": data.get("exactFloor", ""),
+                "agentName": data.get("agentName", ""),
+            }
+
+    def remove(self, pid: str):
+        with self._lock:
+            self._remove_locked(pid)
+
+    def _remove_locked(self, pid: str):
+        for key in self._keys_by_id.pop(pid, ()):
+            ids = self._ids_by_key.get(key)
+            if ids:
+                ids.discard(pid)
+                if not ids:
+                    del self._ids_by_key[key]
+        self._summaries.pop(pid, None)
+
+    def find_candidates(self, data: dict) -> list:
+        """Returns summaries of indexed listings that look like the same flat as `data`."""
+        keys = listing_keys(data)
+        probe = set()
+        for key in keys:
+            if key[0] == "geo":
+                # Also probe neighbouring cells so rounding boundaries do not hide a match
+                step = 10 ** -GEO_DECIMALS
+                for dlat in (-step, 0, step):
+                    for dlng in (-step, 0, step):
+                        probe.add(("geo", round(key[1] + dlat, GEO_DECIMALS), round(key[2] + dlng, GEO_DECIMALS), key[3], key[4]))
+            else:
+                probe.add(key)
+        with self._lock:
+            matches = set()
+            for key in probe:
+                matches |= self._ids_by_key.get(key, set())
+            matches.discard(data.get("propertyId"))
+            return [self._summaries[pid] for pid in sorted(matches)]
+
+    def __len__(self):
+        return len(self._keys_by_id)
+
+    # --- Listing store sync ---
+    def _on_changes(self, changes):
+        for change_type, property_id, data in changes:
+            if change_type == "REMOVED":
+                self.remove(property_id)
+            else:
+                self.upsert(data)
+        self.ready.set()
+
+    def watch(self, listings):
+        """Loads every listing and keeps the index current by watching the listing store."""
+        self._watch = listings.watch(self._on_changes)
+        return self
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch()
+            self._watch = None
@@ -0,0 +1,250 @@
+# facet_index.py
+
+import heapq
+import threading
+import time
+
+# -------------------------------------
+# Facets
+# -------------------------------------
+# Listing field -> label shown in the app
+FACETS = {
+    "micromarket": "Micromarket",
+    "area": "Area",
+    "configuration": "Configuration",
+    "furnishingStatus": "Furnishing",
+    "facing": "Facing",
+    "propertyType": "Property Type",
+    "vegNonVeg": "Veg/Non Veg",
+    "petFriendly": "Pet Friendly",
+    "inventoryStatus": "Inventory Status",
+}
+BLANK = "(blank)"       # facet value of listings that leave the field empty
+SPARSE_RATIO = 32       # below this many listings per facet value, counts are taken listing by listing
+
+
+def facet_value(data: dict, field: str) -> str:
+    value = data.get(field)
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else ""
+    return str(value if value is not None else "").strip() or BLANK
+
+
+def _bits(bitmap: int, limit: int = None) -> list:
+    """Set bit positions of `bitmap`, lowest first."""
+    # The binary string is searched in C; shifting the int bit by bit would copy it every step
+    digits = bin(bitmap)[:1:-1]
+    positions = []
+    i = digits.find("1")
+    while i != -1 and (limit is None or len(positions) < limit):
+        positions.append(i)
+        i = digits.find("1", i + 1)
+    return positions
+
+
+# -------------------------------------
+# Bitmap Index
+# -------------------------------------
+class FacetIndex:
+    """One bitmap per facet value over the listings, kept current from the listing store.
+
+    Every listing gets a small document number and each bitmap is a Python
+    int with that bit set for the listings holding the value. AND, OR and
+    counts then run in C over machine words (`&`, `|`, `int.bit_count()`).
+    Freed numbers are reused lowest first so the bitmaps stay dense.
+
+    Filters are {field: [values]}: values of one field are ORed and fields
+    are ANDed. Arbitrary combinations are nested tuples, see `evaluate`.
+    """
+
+    def __init__(self, facets: dict = FACETS):
+        self.facets = dict(facets)
+        self._lock = threading.Lock()
+        self._bitmaps = {field: {} for field in self.facets}   # field -> {value: bitmap}
+        self._sizes = {field: {} for field in self.facets}     # field -> {value: listings}; popcounts are not free
+        self._all = 0                                           # bitmap of every listing
+        self._docno = {}                                        # property ID -> document number
+        self._values = {}                                       # document number -> {field: value}
+        self._summaries = {}                                    # document number -> result row
+        self._next_docno = 0
+        self._free = []                                         # freed document numbers, a min-heap
+        self._watch = None
+        self.ready = threading.Event()
+
+    # --- Updates ---
+    def _set(self, field: str, value: str, bit: int):
+        bitmaps, sizes = self._bitmaps[field], self._sizes[field]
+        bitmaps[value] = bitmaps.get(value, 0) | bit
+        sizes[value] = sizes.get(value, 0) + 1
+
+    def _clear(self, field: str, value: str, bit: int):
+        bitmaps, sizes = self._bitmaps[field], self._sizes[field]
+        remaining = bitmaps[value] & ~bit
+        if remaining:
+            bitmaps[value] = remaining
+            sizes[value] -= 1
+        else:
+            del bitmaps[value], sizes[value]
+
+    def upsert(self, property_id: str, data: dict):
+        values = {field: facet_value(data, field) for field in self.facets}
+        with self._lock:
+            docno = self._docno.get(property_id)
+            if docno is None:
+                if self._free:
+                    docno = heapq.heappop(self._free)
+                else:
+                    docno, self._next_docno = self._next_docno, self._next_docno + 1
+                self._docno[property_id] = docno
+                self._all |= 1 << docno
+            bit = 1 << docno
+            old = self._values.get(docno, {})
+            # Only the fields that changed touch their bitmaps
+            for field, value in values.items():
+                if old.get(field) != value:
+                    if field in old:
+                        self._clear(field, old[field], bit)
+                    self._set(field, value, bit)
+            self._values[docno] = values
+            self._summaries[docno] = {
+                "propertyId": property_id,
+                "propertyName": data.get("propertyName", ""),
+                "micromarket": data.get("micromarket", ""),
+                "configuration": data.get("configuration", ""),
+                "rentPerMonthInLakhs": data.get("rentPerMonthInLakhs", ""),
+                "inventoryStatus": data.get("inventoryStatus", ""),
+                "agentName": data.get("agentName", ""),
+            }
+
+    def remove(self, property_id: str):
+        with self._lock:
+            docno = self._docno.pop(property_id, None)
+            if docno is None:
+                return
+            bit = 1 << docno
+            for field, value in self._values.pop(docno).items():
+                self._clear(field, value, bit)
+            self._all &= ~bit
+            del self._summaries[docno]
+            # Kept sorted so the lowest number is reused first
+            heapq.heappush(self._free, docno)
+
+    # --- Queries ---
+    def _filter_bitmap(self, field: str, values) -> int:
+        if isinstance(values, str):
+            values = [values]
+        bitmaps = self._bitmaps.get(field, {})
+        bitmap = 0
+        for value in values:
+            bitmap |= bitmaps.get(value, 0)
+        return bitmap
+
+    def _evaluate_locked(self, expr) -> int:
+        if isinstance(expr, dict):
+            bitmap = self._all
+            for field, values in expr.items():
+                if values:
+                    bitmap &= self._filter_bitmap(field, values)
+            return bitmap
+        op, *operands = expr
+        if op == "and":
+            bitmap = self._all
+            for operand in operands:
+                bitmap &= self._evaluate_locked(operand)
+            return bitmap
+        if op == "or":
+            bitmap = 0
+            for operand in operands:
+                bitmap |= self._evaluate_locked(operand)
+            return bitmap
+        if op == "not":
+            return self._all & ~self._evaluate_locked(operands[0])
+        # (field, value, ...): any of the values
+        return self._filter_bitmap(op, operands)
+
+    def evaluate(self, expr) -> int:
+        """Bitmap of the listings matching `expr`.
+
+        `expr` is a filter dict, ("and", expr, ...), ("or", expr, ...),
+        ("not", expr) or (field, value, ...), e.g.
+        ("or", {"micromarket": ["HSR Layout"]}, ("and", ("configuration", "3 BHK"), ("petFriendly", "Yes"))).
+        """
+        with self._lock:
+            return self._evaluate_locked(expr)
+
+    def _counts_locked(self, filters: dict) -> dict:
+        """Facet counts where each field ignores its own filter, so its other values stay selectable."""
+        fields = list(self.facets)
+        masks = [self._filter_bitmap(f, filters[f]) if filters.get(f) else self._all for f in fields]
+        # Prefix and suffix ANDs give "every filter but this one" in 2n operations
+        prefix = [self._all]
+        for mask in masks[:-1]:
+            prefix.append(prefix[-1] & mask)
+        suffix = self._all
+        counts = {}
+        for i in range(len(fields) - 1, -1, -1):
+            field, base = fields[i], prefix[i] & suffix
+            bitmaps = self._bitmaps[field]
+            if base == self._all:
+                counts[field] = dict(self._sizes[field])
+            elif base.bit_count() < len(bitmaps) * SPARSE_RATIO:
+                # Few listings left: reading their values beats one AND per facet value
+                field_counts = counts[field] = {}
+                for docno in _bits(base):
+                    value = self._values[docno][field]
+                    field_counts[value] = field_counts.get(value, 0) + 1
+            else:
+                counts[field] = {
+                    value: count
+                    for value, bitmap in bitmaps.items()
+                    if (count := (base & bitmap).bit_count())
+                }
+            suffix &= masks[i]
+        return counts
+
+    def query(self, filters: dict = None, expr=None, limit: int = 200) -> dict:
+        """Matching listings and live facet counts for {field: [values]} filters.
+
+        `expr` (see `evaluate`) further restricts the listings; the counts
+        follow `filters` only.
+        """
+        filters = filters or {}
+        started = time.perf_counter()
+        with self._lock:
+            bitmap = self._evaluate_locked(filters)
+            if expr is not None:
+                bitmap &= self._evaluate_locked(expr)
+            counts = self._counts_locked(filters)
+            listings = [dict(self._summaries[docno]) for docno in _bits(bitmap, limit)]
+        return {
+            "total": bitmap.bit_count(),
+            "listings": listings,
+            "counts": counts,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def property_ids(self, expr) -> list:
+        with self._lock:
+            return [self._summaries[docno]["propertyId"] for docno in _bits(self._evaluate_locked(expr))]
+
+    def __len__(self):
+        return len(self._docno)
+
+    # --- Listing store sync ---
+    def _on_changes(self, changes):
+        for change_type, property_id, data in changes:
+            if change_type == "REMOVED":
+                self.remove(property_id)
+            else:
+                self.upsert(property_id, data)
+        self.ready.set()
+
+    def watch(self, listings):
+        """Loads every listing and keeps the bitmaps current by watching the listing store."""
+        self._watch = listings.watch(self._on_changes)
+        return self
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch()
+            self._watch = None
@@ -0,0 +1,131 @@
+# gazetteer.py
+
+import re
+from collections import defaultdict
+
+from area_data import areasData, micromarket_to_area
+
+# -------------------------------------
+# Aliases
+# -------------------------------------
+# Spellings and abbreviations agents commonly type. Names ending in "Layout"
+# also get their leading abbreviation ("HSR", "BTM", ...) automatically.
+ALIASES = {
+    "Banasavadi": ["Banaswadi"],
+    "Basavanagudi": ["Basavangudi"],
+    "Byappanahalli": ["Baiyappanahalli Metro"],
+    "CV Raman Nagar": ["C V Raman Nagar"],
+    "Electronic City": ["E City", "Ecity", "EC"],
+    "HAL Airport": ["HAL", "Old Airport Road"],
+    "Indiranagar": ["Indira Nagar"],
+    "JP Nagar": ["J P Nagar", "Jayaprakash Nagar"],
+    "KR Puram": ["K R Puram", "Krishnarajapuram"],
+    "Koramangala": ["Kormangala"],
+    "Malleswaram": ["Malleshwaram", "Malleshwara"],
+    "Marathahalli": ["Marathalli"],
+    "RT Nagar": ["R T Nagar"],
+    "Rajarajeshwari Nagar": ["RR Nagar", "Raja Rajeshwari Nagar"],
+    "Sarjapura": ["Sarjapur", "Sarjapur Road"],
+    "Vishveshwara Puram": ["VV Puram"],
+    "Whitefield": ["White Field", "WF"],
+    "Yelahanka Satellite Town": ["YST"],
+    "Yeshwantpur": ["Yeshwanthpur", "Yesvantpur"],
+}
+
+
+def normalize(text: str) -> str:
+    """Lowercases and strips punctuation/extra spaces ("J. P. Nagar" -> "j p nagar")."""
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+def _compact(text: str) -> str:
+    return normalize(text).replace(" ", "")
+
+
+def _trigrams(compact: str) -> set:
+    padded = f"$${compact}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# -------------------------------------
+# Compiled Index
+# -------------------------------------
+# Each searchable term (canonical name or alias) maps to its canonical micromarket.
+_terms = []             # list of (compact term, normalized term, canonical micromarket)
+_exact = {}             # compact term -> canonical micromarket
+_trigram_index = defaultdict(list)   # trigram -> [term ids]
+_term_trigrams = []
+
+
+def _add_term(term: str, canonical: str):
+    compact = _compact(term)
+    if not compact or compact in _exact:
+        return
+    term_id = len(_terms)
+    _terms.append((compact, normalize(term), canonical))
+    _exact[compact] = canonical
+    grams = _trigrams(compact)
+    _term_trigrams.append(len(grams))
+    for gram in grams:
+        _trigram_index[gram].append(term_id)
+
+
+for _area in areasData:
+    for _mm in _area["MicroMarkets"]:
+        _add_term(_mm, _mm)
+        if _mm.endswith(" Layout"):
+            _add_term(_mm[: -len(" Layout")], _mm)
+for _mm, _aliases in ALIASES.items():
+    if _mm in micromarket_to_area:
+        for _alias in _aliases:
+            _add_term(_alias, _mm)
+
+
+# -------------------------------------
+# Lookup API
+# -------------------------------------
+def resolve_micromarket(text: str) -> str:
+    """Returns the canonical micromarket for an exact name or alias (any case/spacing), else ""."""
+    if text in micromarket_to_area:
+        return text
+    return _exact.get(_compact(text), "")
+
+
+def area_for(text: str) -> str:
+    """Returns the Area for a micromarket name or alias in O(1)."""
+    return micromarket_to_area.get(resolve_micromarket(text), "")
+
+
+def search_micromarkets(query: str, limit: int = 10, min_score: float = 0.3) -> list:
+    """Returns up to `limit` canonical micromarkets ranked by how well they match `query`.
+
+    Exact/alias matches rank first, then prefix matches on any word, then
+    trigram similarity, so "HSR", "koramangla" and "ecity" all resolve.
+    """
+    compact = _compact(query)
+    if not compact:
+        return []
+    norm = normalize(query)
+
+    grams = _trigrams(compact)
+    overlap = defaultdict(int)
+    for gram in grams:
+        for term_id in _trigram_index.get(gram, ()):
+            overlap[term_id] += 1
+
+    best = {}
+    for term_id, shared in overlap.items():
+        term_compact, term_norm, canonical = _terms[term_id]
+        score = 2.0 * shared / (len(grams) + _term_trigrams[term_id])
+        if term_compact == compact:
+            score += 2.0
+        elif term_compact.startswith(compact) or any(w.startswith(norm) for w in term_norm.split()):
+            score += 1.0
+        if score > best.get(canonical, 0.0):
+            best[canonical] = score
+
+    ranked = sorted(
+        ((name, score) for name, score in best.items() if score >= min_score),
+        key=lambda item: (-item[1], len(item[0]), item[0]),
+    )
+    return [name for name, _ in ranked[:limit]]
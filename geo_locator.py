@@ -0,0 +1,99 @@
+# geo_locator.py
+
+import math
+from collections import defaultdict
+
+from area_data import micromarketCentroids, micromarket_to_area
+
+# -------------------------------------
+# Distance
+# -------------------------------------
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+# -------------------------------------
+# Grid Index over Micromarket Centroids
+# -------------------------------------
+CELL_DEG = 0.02          # ~2.2 km cells at Bangalore's latitude
+CELL_KM = 2.0            # conservative lower bound on a cell's width in km
+MAX_RINGS = 25           # stop searching ~50 km out
+SUGGEST_MAX_KM = 5.0     # farther than this from every centroid -> no suggestion
+MISMATCH_KM = 3.0        # selected micromarket farther than this is flagged
+
+_grid = defaultdict(list)
+
+
+def _cell(lat: float, lng: float):
+    return int(math.floor(lat / CELL_DEG)), int(math.floor(lng / CELL_DEG))
+
+
+for _name, (_lat, _lng) in micromarketCentroids.items():
+    _grid[_cell(_lat, _lng)].append((_name, _lat, _lng))
+
+
+def nearest_micromarkets(lat: float, lng: float, k: int = 3, max_km: float = None) -> list:
+    """Returns up to k (micromarket, area, distance_km) tuples nearest to the point.
+
+    Searches grid rings outwards from the point's cell and stops once no
+    unvisited ring can hold anything closer than the k-th best match, or
+    anything within max_km.
+    """
+    ci, cj = _cell(lat, lng)
+    found = []
+    rings = MAX_RINGS
+    if max_km is not None:
+        # Ring r holds nothing closer than (r - 1) * CELL_KM
+        rings = min(rings, math.ceil(max_km / CELL_KM) + 1)
+    for ring in range(rings + 1):
+        for di in range(-ring, ring + 1):
+            for dj in range(-ring, ring + 1):
+                if max(abs(di), abs(dj)) != ring:
+                    continue
+                for name, m_lat, m_lng in _grid.get((ci + di, cj + dj), ()):
+                    found.append((haversine_km(lat, lng, m_lat, m_lng), name))
+        # Anything in ring r+1 is at least r * CELL_KM away
+        if len(found) >= k:
+            found.sort()
+            if found[k - 1][0] <= ring * CELL_KM:
+                break
+    found.sort()
+    return [
+        (name, micromarket_to_area.get(name, ""), round(dist, 2))
+        for dist, name in found[:k]
+        if max_km is None or dist <= max_km
+    ]
+
+
+def suggest_micromarket(geoloc: dict, max_km: float = SUGGEST_MAX_KM):
+    """Returns (micromarket, area, distance_km) for the closest centroid, or None."""
+    if not geoloc:
+        return None
+    matches = nearest_micromarkets(geoloc["lat"], geoloc["lng"], k=1, max_km=max_km)
+    return matches[0] if matches else None
+
+
+def check_micromarket(micromarket: str, geoloc: dict, tolerance_km: float = MISMATCH_KM):
+    """Checks a selected micromarket against coordinates.
+
+    Returns (ok, distance_km) where distance_km is the distance from the point
+    to the selected micromarket's centre, or None when that centre is unknown
+    (in which case the selection is accepted).
+    """
+    if not geoloc or micromarket not in micromarketCentroids:
+        return True, None
+    m_lat, m_lng = micromarketCentroids[micromarket]
+    dist = round(haversine_km(geoloc["lat"], geoloc["lng"], m_lat, m_lng), 2)
+    if dist <= tolerance_km:
+        return True, dist
+    # Centroids are approximate, so also accept any of the few nearest markets
+    nearby = {name for name, _, _ in nearest_micromarkets(geoloc["lat"], geoloc["lng"], k=3)}
+    return micromarket in nearby, dist
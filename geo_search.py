@@ -0,0 +1,138 @@
+# geo_search.py
+
+import math
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from geo_locator import haversine_km
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------------
+# Geohash
+# -------------------------------------
+# Listings store a precision-9 geohash (~5 m cell) next to _geoloc. Any prefix
+# of it names a larger enclosing cell, so one range query per covering cell
+# ("geohash" >= prefix and < prefix + "~") finds every listing inside it.
+GEOHASH_PRECISION = 9
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+KM_PER_DEG = 111.32
+
+
+def geohash_encode(lat: float, lng: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    chars = []
+    bits, ch, even = 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                ch = (ch << 1) | 1
+                lng_lo = mid
+            else:
+                ch <<= 1
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(chars)
+
+
+def geohash_for(geoloc: dict) -> str:
+    """Returns the geohash to store with a listing, or "" when it has no _geoloc."""
+    if not geoloc:
+        return ""
+    return geohash_encode(geoloc["lat"], geoloc["lng"])
+
+
+def _cell_size_deg(precision: int):
+    bits = 5 * precision
+    lng_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def covering_cells(lat: float, lng: float, radius_km: float) -> list:
+    """Returns geohash prefixes whose cells together cover the circle's bounding box.
+
+    Uses the finest precision whose cells are still at least radius_km on each
+    side, which keeps the cover to at most 3x3 = 9 cells.
+    """
+    cos_lat = max(math.cos(math.radians(lat)), 0.01)
+    precision = 1
+    for p in range(GEOHASH_PRECISION, 0, -1):
+        cell_lat, cell_lng = _cell_size_deg(p)
+        if cell_lat * KM_PER_DEG >= radius_km and cell_lng * KM_PER_DEG * cos_lat >= radius_km:
+            precision = p
+            break
+    cell_lat, cell_lng = _cell_size_deg(precision)
+    dlat = radius_km / KM_PER_DEG
+    dlng = radius_km / (KM_PER_DEG * cos_lat)
+
+    def steps(lo, hi, step):
+        values, v = [], lo
+        while v < hi:
+            values.append(v)
+            v += step
+        values.append(hi)
+        return values
+
+    cells = set()
+    for la in steps(lat - dlat, lat + dlat, cell_lat / 2):
+        for ln in steps(lng - dlng, lng + dlng, cell_lng / 2):
+            cells.add(geohash_encode(max(min(la, 90.0), -90.0), ln, precision))
+    return sorted(cells)
+
+
+# -------------------------------------
+# Radius Query
+# -------------------------------------
+def _query_cell(listings, prefix: str) -> list:
+    return listings.query_range("geohash", prefix, prefix + "~")
+
+
+def nearby_listings(listings, lat: float, lng: float, radius_km: float = 2.0, limit: int = None) -> list:
+    """Returns listings within radius_km of (lat, lng), nearest first.
+
+    Each result is the stored listing dict with an added "distanceKm".
+    """
+    cells = covering_cells(lat, lng, radius_km)
+    with ThreadPoolExecutor(max_workers=min(len(cells), 9)) as executor:
+        batches = list(executor.map(lambda prefix: _query_cell(listings, prefix), cells))
+
+    results = {}
+    for batch in batches:
+        for data in batch:
+            geoloc = data.get("_geoloc")
+            if not geoloc:
+                continue
+            dist = haversine_km(lat, lng, geoloc["lat"], geoloc["lng"])
+            if dist <= radius_km:
+                data["distanceKm"] = round(dist, 3)
+                results[data.get("propertyId")] = data
+    ranked = sorted(results.values(), key=lambda d: d["distanceKm"])
+    return ranked[:limit] if limit else ranked
+
+
+def backfill_geohashes(listings) -> int:
+    """Writes "geohash" on listings that have _geoloc but no geohash yet. Returns the count."""
+    updates = {}
+    for property_id, data in listings.stream(fields=["_geoloc", "geohash"]):
+        geohash = geohash_for(data.get("_geoloc"))
+        if geohash and data.get("geohash") != geohash:
+            updates[property_id] = {"geohash": geohash}
+    if updates:
+        listings.update_many(updates)
+    logger.info(f"Backfilled geohash on {len(updates)} listings")
+    return len(updates)
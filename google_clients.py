@@ -0,0 +1,161 @@
+# google_clients.py
+
+import os
+import logging
+
+import firebase_admin
+from firebase_admin import credentials, firestore, storage
+from google.cloud import storage as gcs
+import gspread
+from google.oauth2.service_account import Credentials as ServiceAccountCredentials
+from googleapiclient.discovery import build
+from dotenv import load_dotenv
+
+from async_uploads import UPLOAD_ENGINE, AsyncGoogleSession
+from backends import BACKEND, memory_backends, production_backends
+from http_transport import pooled_session, SessionHttp
+from metrics import instrument_session
+from resilience import resilient_backends
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------------
+# CONFIGURATION & ENVIRONMENT
+# -------------------------------------
+load_dotenv()
+
+SHEET_NAME = "Rental Inventories"
+
+# --- Firebase Credentials ---
+FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID")
+FIREBASE_PRIVATE_KEY = os.getenv("FIREBASE_PRIVATE_KEY", "").replace('\\n', '\n')
+FIREBASE_PRIVATE_KEY_ID = os.getenv("FIREBASE_PRIVATE_KEY_ID")
+FIREBASE_CLIENT_EMAIL = os.getenv("FIREBASE_CLIENT_EMAIL")
+FIREBASE_CLIENT_ID = os.getenv("FIREBASE_CLIENT_ID")
+FIREBASE_STORAGE_BUCKET = os.getenv("FIREBASE_STORAGE_BUCKET")
+
+firebase_sa_info = {
+    "type": "service_account",
+    "project_id": FIREBASE_PROJECT_ID,
+    "private_key_id": FIREBASE_PRIVATE_KEY_ID,
+    "private_key": FIREBASE_PRIVATE_KEY,
+    "client_email": FIREBASE_CLIENT_EMAIL,
+    "client_id": FIREBASE_CLIENT_ID,
+    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+    "token_uri": "https://oauth2.googleapis.com/token",
+    "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
+    "client_x509_cert_url": f"https://www.googleapis.com/robot/v1/metadata/x509/{FIREBASE_CLIENT_EMAIL}",
+}
+
+# --- Google Sheets Credentials ---
+GSPREAD_PROJECT_ID = os.getenv("GSPREAD_PROJECT_ID")
+GSPREAD_PRIVATE_KEY_ID = os.getenv("GSPREAD_PRIVATE_KEY_ID")
+GSPREAD_PRIVATE_KEY = os.getenv("GSPREAD_PRIVATE_KEY", "").replace('\\n', '\n')
+GSPREAD_CLIENT_EMAIL = os.getenv("GSPREAD_CLIENT_EMAIL")
+GSPREAD_CLIENT_ID = os.getenv("GSPREAD_CLIENT_ID")
+GSPREAD_SHEET_ID = os.getenv("GSPREAD_SHEET_ID")
+
+gspread_sa_info = {
+    "type": "service_account",
+    "project_id": GSPREAD_PROJECT_ID,
+    "private_key_id": GSPREAD_PRIVATE_KEY_ID,
+    "private_key": GSPREAD_PRIVATE_KEY,
+    "client_email": GSPREAD_CLIENT_EMAIL,
+    "client_id": GSPREAD_CLIENT_ID,
+    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+    "token_uri": "https://oauth2.googleapis.com/token",
+    "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
+    "client_x509_cert_url": f"https://www.googleapis.com/robot/v1/metadata/x509/{GSPREAD_CLIENT_EMAIL}",
+}
+
+# --- Google Drive Credentials ---
+GOOGLE_DRIVE_PROJECT_ID = os.getenv("GOOGLE_DRIVE_PROJECT_ID")
+GOOGLE_DRIVE_PRIVATE_KEY_ID = os.getenv("GOOGLE_DRIVE_PRIVATE_KEY_ID")
+GOOGLE_DRIVE_PRIVATE_KEY = os.getenv("GOOGLE_DRIVE_PRIVATE_KEY", "").replace('\\n', '\n')
+GOOGLE_DRIVE_CLIENT_EMAIL = os.getenv("GOOGLE_DRIVE_CLIENT_EMAIL")
+GOOGLE_DRIVE_CLIENT_ID = os.getenv("GOOGLE_DRIVE_CLIENT_ID")
+
+drive_sa_info = {
+    "type": "service_account",
+    "project_id": GOOGLE_DRIVE_PROJECT_ID,
+    "private_key_id": GOOGLE_DRIVE_PRIVATE_KEY_ID,
+    "private_key": GOOGLE_DRIVE_PRIVATE_KEY,
+    "client_email": GOOGLE_DRIVE_CLIENT_EMAIL,
+    "client_id": GOOGLE_DRIVE_CLIENT_ID,
+    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+    "token_uri": "https://oauth2.googleapis.com/token",
+    "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
+    "client_x509_cert_url": f"https://www.googleapis.com/robot/v1/metadata/x509/{GOOGLE_DRIVE_CLIENT_EMAIL}",
+}
+
+# -------------------------------------
+# CLIENTS
+# -------------------------------------
+# Plain constructors; rent.py wraps them in st.cache_resource, headless
+# services (ingest_api.py) call backends_from_env() once at startup.
+def firebase_clients():
+    """Returns (firestore client, storage bucket, GCS client)."""
+    if not firebase_admin._apps:
+        try:
+            cred = credentials.Certificate(firebase_sa_info)
+            firebase_admin.initialize_app(cred, {"storageBucket": FIREBASE_STORAGE_BUCKET})
+            logger.info("Firebase initialized successfully.")
+        except Exception as e:
+            logger.error(f"Error initializing Firebase: {e}")
+            raise
+    db_inst = firestore.client()
+    bucket_inst = storage.bucket()
+    gcs_client_inst = gcs.Client.from_service_account_info(firebase_sa_info)
+    instrument_session(bucket_inst.client._http, "storage")
+    instrument_session(gcs_client_inst._http, "storage")
+    return db_inst, bucket_inst, gcs_client_inst
+
+def gspread_client():
+    scopes = [
+        "https://www.googleapis.com/auth/spreadsheets",
+        "https://www.googleapis.com/auth/drive",
+    ]
+    gs_creds = ServiceAccountCredentials.from_service_account_info(gspread_sa_info, scopes=scopes)
+    client = gspread.Client(auth=gs_creds, session=pooled_session(gs_creds))
+    return client
+
+def drive_service():
+    scopes = [
+        "https://www.googleapis.com/auth/spreadsheets",
+        "https://www.googleapis.com/auth/drive",
+    ]
+    drive_creds = ServiceAccountCredentials.from_service_account_info(drive_sa_info, scopes=scopes)
+    # Shared pooled transport: upload_single_file calls this service from worker threads
+    service = build("drive", "v3", http=SessionHttp(pooled_session(drive_creds)), cache_discovery=False)
+    return service
+
+def async_google_sessions():
+    """aiohttp sessions for the async upload engine, keyed like production_backends(async_http=...).
+
+    Empty unless UPLOAD_ENGINE=async, so the *_async backend methods fall back to threads.
+    """
+    if UPLOAD_ENGINE != "async":
+        return {}
+    google_scopes = [
+        "https://www.googleapis.com/auth/spreadsheets",
+        "https://www.googleapis.com/auth/drive",
+    ]
+    storage_creds = ServiceAccountCredentials.from_service_account_info(
+        firebase_sa_info, scopes=["https://www.googleapis.com/auth/devstorage.full_control"]
+    )
+    return {
+        "storage": AsyncGoogleSession(storage_creds),
+        "drive": AsyncGoogleSession(ServiceAccountCredentials.from_service_account_info(drive_sa_info, scopes=google_scopes)),
+        "sheets": AsyncGoogleSession(ServiceAccountCredentials.from_service_account_info(gspread_sa_info, scopes=google_scopes)),
+    }
+
+
+def backends_from_env():
+    """BACKEND=memory gives seeded in-memory fakes; anything else the Google services."""
+    if BACKEND == "memory":
+        return memory_backends()
+    db_inst, bucket_inst, _ = firebase_clients()
+    worksheet = gspread_client().open_by_key(GSPREAD_SHEET_ID).worksheet(SHEET_NAME)
+    return resilient_backends(
+        production_backends(db_inst, bucket_inst, drive_service(), worksheet, async_google_sessions())
+    )
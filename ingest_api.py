@@ -0,0 +1,390 @@
+# ingest_api.py
+#
+# Headless ingestion service for machine clients (CRM, WhatsApp bot).
+#
+#   POST /v1/uploads?folder=photos&filename=a.jpg   raw file body, streamed to disk -> {"uploadId"}
+#   POST /v1/listings                               {"fields": {...}, "uploads": [uploadId, ...],
+#                                                    "allowDuplicate": false}
+#                                                   Idempotency-Key header recommended
+#   GET  /v1/listings/<submissionId>                journal status
+#   GET  /healthz
+#
+# Listings go through the same validation, ID reservation, journal and upload
+# steps as the Submit button in rent.py; the journal workers drain them.
+#
+#   INGEST_API_KEY=... python ingest_api.py
+
+import hmac
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from backends import ListingFeed, set_backends
+from duplicate_index import DuplicateIndex
+from metrics import start_exporter
+from photo_hash import PhotoIndex, find_reused_photos
+from resilience import breaker_states
+from media_workers import start_journal_workers, hash_photos
+from sheet_projector import SheetProjector
+from submission_journal import SubmissionJournal, SpooledFile
+from submission_pipeline import (
+    clean_listing_fields, validate_listing_fields, ensure_sheet_header,
+    submit_listing, parse_coordinates, SHEET_SYNC,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# -------------------------------------
+# Configuration
+# -------------------------------------
+INGEST_HOST = os.getenv("INGEST_HOST", "127.0.0.1")
+INGEST_PORT = int(os.getenv("INGEST_PORT", "8600"))
+INGEST_API_KEY = os.getenv("INGEST_API_KEY", "")
+INGEST_THREADS = int(os.getenv("INGEST_THREADS", "16"))
+MAX_UPLOAD_BYTES = int(os.getenv("INGEST_MAX_UPLOAD_MB", "500")) * 1024 * 1024
+MAX_JSON_BYTES = 1024 * 1024
+UPLOAD_TTL = 24 * 3600       # uploads never attached to a listing are deleted after this
+CHUNK_SIZE = 1024 * 1024
+REPLAY_WAIT = 10.0           # how long a request racing another with its Idempotency-Key waits for the journal entry
+MEDIA_FOLDERS = ("photos", "videos", "documents")
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str, **extra):
+        super().__init__(message)
+        self.status = status
+        self.body = {"error": message, **extra}
+
+
+# -------------------------------------
+# Service
+# -------------------------------------
+class IngestService:
+    def __init__(self, journal: SubmissionJournal, duplicate_index: DuplicateIndex = None, photo_index: PhotoIndex = None):
+        self.journal = journal
+        self.duplicate_index = duplicate_index
+        self.photo_index = photo_index
+        self._inflight = {}                     # Idempotency-Key -> Event set when its request finishes
+        self._inflight_lock = threading.Lock()
+
+    # --- Uploads ---
+    def _upload_paths(self, upload_id: str):
+        if not _UPLOAD_ID.match(upload_id or ""):
+            raise ApiError(400, f"Invalid upload ID: {upload_id}")
+        base = os.path.join(self.journal.upload_dir, upload_id)
+        return base + ".bin", base + ".json"
+
+    def store_upload(self, stream, length: int, folder: str, filename: str) -> dict:
+        """Streams `length` bytes from `stream` to disk in chunks and records the upload."""
+        if folder not in MEDIA_FOLDERS:
+            raise ApiError(400, f"folder must be one of {', '.join(MEDIA_FOLDERS)}")
+        filename = os.path.basename(filename or "")
+        if not filename:
+            raise ApiError(400, "filename is required")
+        if length > MAX_UPLOAD_BYTES:
+            raise ApiError(413, f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+        upload_id = uuid.uuid4().hex
+        data_path, meta_path = self._upload_paths(upload_id)
+        remaining = length
+        try:
+            with open(data_path, "wb") as f:
+                while remaining:
+                    chunk = stream.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise ApiError(400, "Upload body ended early")
+                    f.write(chunk)
+                    remaining -= len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            if os.path.exists(data_path):
+                os.remove(data_path)
+            raise
+        meta = {"uploadId": upload_id, "folder": folder, "filename": filename, "bytes": length, "created": time.time()}
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        return meta
+
+    def _load_upload(self, upload_id: str) -> dict:
+        data_path, meta_path = self._upload_paths(upload_id)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise ApiError(404, f"Unknown upload: {upload_id}")
+        if not os.path.exists(data_path):
+            raise ApiError(409, f"Upload already attached to a listing: {upload_id}")
+        meta["path"] = data_path
+        return meta
+
+    def sweep_uploads(self, max_age: float = UPLOAD_TTL) -> int:
+        cutoff = time.time() - max_age
+        removed = 0
+        for name in os.listdir(self.journal.upload_dir):
+            path = os.path.join(self.journal.upload_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+    # --- Listings ---
+    def create_listing(self, body: dict, token: str) -> tuple:
+        """Returns (HTTP status, response body).
+
+        Requests sharing an Idempotency-Key run one at a time; the later ones get the replay.
+        """
+        if not isinstance(body, dict):
+            raise ApiError(400, "Body must be a JSON object")
+        while True:
+            with self._inflight_lock:
+                running = self._inflight.get(token)
+                if running is None:
+                    done = self._inflight[token] = threading.Event()
+                    break
+            running.wait()
+        try:
+            return self._create_listing(body, token)
+        finally:
+            with self._inflight_lock:
+                del self._inflight[token]
+            done.set()
+
+    def _create_listing(self, body: dict, token: str) -> tuple:
+        existing = self.journal.find_submission(token)
+        if existing is not None:
+            return 200, self._status_body(existing, replayed=True)
+
+        if not isinstance(body.get("fields") or {}, dict):
+            raise ApiError(400, "fields must be an object")
+        upload_ids = body.get("uploads") or []
+        if not isinstance(upload_ids, list) or not all(isinstance(u, str) for u in upload_ids):
+            raise ApiError(400, "uploads must be a list of upload IDs")
+        fields = clean_listing_fields(body.get("fields") or {})
+        errors = validate_listing_fields(fields)
+        if errors:
+            raise ApiError(422, "Invalid listing", details=errors)
+        # Each upload is moved into the journal once, so a repeated ID is attached once
+        uploads = [self._load_upload(upload_id) for upload_id in dict.fromkeys(upload_ids)]
+
+        if self.duplicate_index is not None and not body.get("allowDuplicate"):
+            self.duplicate_index.ready.wait(timeout=10)
+            duplicates = self.duplicate_index.find_candidates({
+                **fields, "_geoloc": parse_coordinates(fields["coordinates"]),
+            })
+            if duplicates:
+                raise ApiError(409, "Possible duplicate listing; resend with allowDuplicate to submit anyway",
+                               candidates=duplicates)
+
+        photos = [SpooledFile(u["folder"], u["filename"], u["path"]) for u in uploads if u["folder"] == "photos"]
+        photo_hashes = hash_photos(photos)
+        warnings = []
+        if photo_hashes and self.photo_index is not None:
+            self.photo_index.ready.wait(timeout=10)
+            for i, pids in find_reused_photos(self.photo_index, photo_hashes).items():
+                warnings.append(f"Photo {i + 1} ({photos[i].name}) is also used in {', '.join(pids)}")
+
+        media = [(u["folder"], u["filename"], u["path"]) for u in uploads]
+        try:
+            property_id, _ = submit_listing(self.journal, fields, media, token=token, photo_hashes=photo_hashes)
+        except FileNotFoundError:
+            # Another process sharing the journal moved the uploads for the same key first
+            existing = self._await_submission(token)
+            if existing is None:
+                raise
+            return 200, self._status_body(existing, replayed=True)
+        for upload in uploads:
+            meta_path = self._upload_paths(upload["uploadId"])[1]
+            if os.path.exists(meta_path):
+                os.remove(meta_path)
+        return 202, {"submissionId": token, "propertyId": property_id, "status": "pending", "warnings": warnings}
+
+    def _await_submission(self, token: str, timeout: float = REPLAY_WAIT):
+        deadline = time.monotonic() + timeout
+        while True:
+            existing = self.journal.find_submission(token)
+            if existing is not None or time.monotonic() >= deadline:
+                return existing
+            time.sleep(0.05)
+
+    def listing_status(self, submission_id: str) -> dict:
+        entry = self.journal.find_submission(submission_id)
+        if entry is None:
+            raise ApiError(404, f"Unknown submission: {submission_id}")
+        return self._status_body(entry)
+
+    def _status_body(self, entry: dict, replayed: bool = False) -> dict:
+        body = {"submissionId": entry["id"], "propertyId": entry["property_id"], "status": entry["status"]}
+        if entry["stage"]:
+            body["progress"] = {"stage": entry["stage"], "filesDone": entry["done"], "filesTotal": entry["total"]}
+        if replayed:
+            body["replayed"] = True
+        return body
+
+
+# -------------------------------------
+# HTTP
+# -------------------------------------
+class PooledHTTPServer(HTTPServer):
+    """Handles each connection on a bounded worker pool instead of a thread per request."""
+
+    daemon_threads = True
+
+    def __init__(self, address, handler, service: IngestService, workers: int = INGEST_THREADS):
+        super().__init__(address, handler)
+        self.service = service
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
+
+class IngestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status: int, body: dict):
+        data = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorize(self):
+        if not INGEST_API_KEY:
+            return
+        supplied = self.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(supplied.encode(), INGEST_API_KEY.encode()):
+            raise ApiError(401, "Missing or invalid API key")
+
+    def _content_length(self) -> int:
+        if "Content-Length" not in self.headers:
+            raise ApiError(411, "Content-Length is required")
+        try:
+            return int(self.headers["Content-Length"])
+        except ValueError:
+            raise ApiError(400, "Invalid Content-Length")
+
+    def _handle(self, route):
+        try:
+            self._authorize()
+            status, body = route()
+        except ApiError as e:
+            status, body = e.status, e.body
+            # Unread request bodies would be parsed as the next request on this connection
+            self.close_connection = True
+        except Exception as e:
+            logger.error(f"Ingest error on {self.command} {self.path}: {e}")
+            status, body = 500, {"error": "Internal error"}
+            self.close_connection = True
+        self._send(status, body)
+
+    def do_GET(self):
+        def route():
+            path = urlparse(self.path).path.rstrip("/")
+            if path == "/healthz":
+                return 200, {"status": "ok", "circuits": breaker_states()}
+            if path.startswith("/v1/listings/"):
+                return 200, self.server.service.listing_status(path.rsplit("/", 1)[1])
+            raise ApiError(404, "Not found")
+        self._handle(route)
+
+    def do_POST(self):
+        def route():
+            url = urlparse(self.path)
+            path = url.path.rstrip("/")
+            length = self._content_length()
+            if path == "/v1/uploads":
+                query = parse_qs(url.query)
+                meta = self.server.service.store_upload(
+                    self.rfile, length, query.get("folder", [""])[0], query.get("filename", [""])[0]
+                )
+                return 201, meta
+            if path == "/v1/listings":
+                if length > MAX_JSON_BYTES:
+                    raise ApiError(413, "Listing body too large")
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    raise ApiError(400, "Body must be JSON")
+                token = self.headers.get("Idempotency-Key", "").strip() or uuid.uuid4().hex
+                return self.server.service.create_listing(body, token)
+            raise ApiError(404, "Not found")
+        self._handle(route)
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} {format % args}")
+
+
+# -------------------------------------
+# Startup
+# -------------------------------------
+def build_service(journal: SubmissionJournal = None) -> IngestService:
+    # Google clients are only needed to serve, not to import the service
+    from google_clients import backends_from_env
+    backends = backends_from_env()
+    set_backends(backends)
+    ensure_sheet_header()
+    journal = journal or SubmissionJournal()
+    start_journal_workers(journal)
+    # One listener on the listing store, shared by the projector and both indexes
+    feed = ListingFeed(backends.listings)
+    if SHEET_SYNC == "projector":
+        SheetProjector().start(feed)
+    return IngestService(
+        journal,
+        duplicate_index=DuplicateIndex().watch(feed),
+        photo_index=PhotoIndex().watch(feed),
+    )
+
+
+def _sweep_loop(service: IngestService):
+    while True:
+        try:
+            removed = service.sweep_uploads()
+            if removed:
+                logger.info(f"Removed {removed} expired uploads")
+        except OSError as e:
+            logger.error(f"Upload sweep error: {e}")
+        time.sleep(3600)
+
+
+def main():
+    if not INGEST_API_KEY and INGEST_HOST not in ("127.0.0.1", "localhost"):
+        raise SystemExit("Set INGEST_API_KEY before listening on a non-local address")
+    service = build_service()
+    start_exporter()
+    threading.Thread(target=_sweep_loop, args=(service,), daemon=True, name="upload-sweep").start()
+    server = PooledHTTPServer((INGEST_HOST, INGEST_PORT), IngestHandler, service)
+    logger.info(f"Ingestion API listening on http://{INGEST_HOST}:{INGEST_PORT}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+# load_test.py
+#
+# Simulates many agents submitting listings at once through the same code path
+# as the Submit button in rent.py (submission_pipeline.submit_listing followed by
+# the journal workers), against the in-memory backends.
+#
+#   python load_test.py --sessions 50 --ramp-s 30
+#   python load_test.py --sessions 40 --instances 2 --drive-rate-limit 10 --out load.json
+#   python load_test.py --sessions 200 --engine async
+#
+# --instances runs several app instances, each with its own journal and workers,
+# against the same backends (like replicas behind a load balancer).
+
+import os
+os.environ.setdefault("TRACE_ENABLED", "0")
+
+import argparse
+import json
+import random
+import shutil
+import tempfile
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import submission_journal
+import submission_pipeline
+from area_data import areasData, micromarketCentroids
+from backends import memory_backends, set_backends
+from benchmarks import PROFILES, seed_listings, seed_sheet
+from resilience import breaker_states, resilient_backends
+from shared_cache import LRUBackend, set_backend
+from sheet_projector import SheetProjector
+from submission_journal import SubmissionJournal, start_workers
+from async_uploads import journal_drain
+from submission_pipeline import submit_listing, ensure_sheet_header
+from tracing import percentile
+
+# -------------------------------------
+# Synthetic Sessions
+# -------------------------------------
+AGENT_POOL = 60
+CONFIGURATIONS = ["1 BHK", "2 BHK", "2.5 BHK", "3 BHK", "3.5 BHK", "4 BHK"]
+FURNISHING = ["Fully Furnished", "Semi Furnished", "Warm Shell", "Bare Shell"]
+
+
+def agent_number(index: int) -> str:
+    return f"98{index:08d}"
+
+
+def agents_directory() -> dict:
+    return {
+        "+91" + agent_number(i): {"cpId": f"CP{i:03d}", "name": f"Agent {i}", "phonenumber": "+91" + agent_number(i)}
+        for i in range(AGENT_POOL)
+    }
+
+
+def random_form(rng: random.Random, session: int) -> dict:
+    entry = rng.choice(areasData)
+    micromarket = rng.choice(entry["MicroMarkets"])
+    centroid = micromarketCentroids.get(micromarket)
+    coordinates = ""
+    if centroid:
+        coordinates = f"{centroid[0] + rng.uniform(-0.01, 0.01):.6f}, {centroid[1] + rng.uniform(-0.01, 0.01):.6f}"
+    floor = rng.randint(0, 25)
+    return {
+        # The session number makes every name unique, so overwrites are detectable
+        "propertyName": f"Load Test Residency {session}",
+        "propertyType": "Apartment",
+        "plotSize": "",
+        "SBUA": f"{rng.randint(6, 40) * 100} sq.ft",
+        "rentPerMonthInLakhs": str(round(rng.uniform(0.2, 3.0), 2)),
+        "commissionType": rng.choice(["NA", "Side by Side", "Single Side Commission Split"]),
+        "maintenanceCharges": rng.choice(["Included", "Not included"]),
+        "securityDeposit": f"{rng.randint(2, 10)} months",
+        "configuration": rng.choice(CONFIGURATIONS),
+        "facing": rng.choice(["East", "North", "West", "South"]),
+        "furnishingStatus": rng.choice(FURNISHING),
+        "micromarket": micromarket,
+        "area": entry["Area"],
+        "availableFrom": "Ready-to-move",
+        "floorNumber": "",
+        "exactFloor": str(floor),
+        "leasePeriod": "11 months",
+        "lockInPeriod": "6 months",
+        "amenities": "Gym, Swimming pool",
+        "extraDetails": "",
+        "restrictions": "",
+        "vegNonVeg": rng.choice(["Veg Only", "Both"]),
+        "petFriendly": rng.choice(["Yes", "No"]),
+        "mapLocation": micromarket,
+        "coordinates": coordinates,
+        # A few sessions use a number that is not in the agents collection
+        "agentNumber": agent_number(rng.randrange(AGENT_POOL + AGENT_POOL // 10)),
+    }
+
+
+def random_media(rng: random.Random, scale: float) -> list:
+    media = [
+        ("photos", f"photo_{i:02d}.jpg", rng.randbytes(int(rng.randint(100, 400) * 1024 * scale)))
+        for i in range(rng.randint(3, 12))
+    ]
+    if rng.random() < 0.3:
+        media.append(("videos", "walkthrough.mp4", rng.randbytes(int(rng.randint(2, 8) * 1024 * 1024 * scale))))
+    if rng.random() < 0.2:
+        media.append(("documents", "agreement.pdf", rng.randbytes(int(200 * 1024 * scale))))
+    return media
+
+
+def run_session(session: int, journal, args) -> dict:
+    rng = random.Random(args.seed * 100_003 + session)
+    time.sleep(rng.uniform(0, args.ramp_s))
+    fields = random_form(rng, session)
+    media = random_media(rng, args.media_scale)
+    token = uuid.UUID(int=rng.getrandbits(128)).hex
+    result = {"session": session, "token": token, "propertyName": fields["propertyName"],
+              "property_id": "", "submitted_id": "", "ack_ms": None, "error": "", "replay_mismatch": False}
+    start = time.perf_counter()
+    try:
+        result["property_id"], _ = submit_listing(journal, fields, media, token=token)
+        result["submitted_id"] = result["property_id"]
+        result["ack_ms"] = (time.perf_counter() - start) * 1000
+        # A double click: the replay must come back with the same ID and journal nothing new
+        if rng.random() < args.replay_rate:
+            replay_id, _ = submit_listing(journal, fields, media, token=token)
+            result["replay_mismatch"] = replay_id != result["property_id"]
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+# -------------------------------------
+# Run
+# -------------------------------------
+def wait_for_drain(journals: list, timeout: float) -> dict:
+    """Polls the journals until nothing is pending or running; returns {submission id: row}."""
+    deadline = time.time() + timeout
+    while True:
+        rows = {}
+        for journal in journals:
+            rows.update({row["id"]: row for row in journal.recent(limit=100_000)})
+        busy = sum(1 for row in rows.values() if row["status"] in ("pending", "running"))
+        if not busy or time.time() >= deadline:
+            return rows
+        time.sleep(0.5)
+
+
+def latency_summary(values: list) -> dict:
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50), 1),
+        "p95_ms": round(percentile(values, 95), 1),
+        "p99_ms": round(percentile(values, 99), 1),
+        "max_ms": round(values[-1], 1),
+    }
+
+
+def run(args) -> dict:
+    submission_journal.BACKOFF_BASE = args.backoff_s
+    submission_pipeline.SHEET_SYNC = args.sheet_sync
+    profiles = {name: dict(profile) for name, profile in PROFILES[args.profile].items()}
+    for name in ("listings", "media", "drive", "sheet"):
+        profiles.setdefault(name, {})
+        if args.error_rate:
+            profiles[name]["error_rate"] = args.error_rate
+    if args.drive_rate_limit:
+        profiles["drive"]["rate_limit_per_s"] = args.drive_rate_limit
+    if args.sheet_rate_limit:
+        profiles["sheet"]["rate_limit_per_s"] = args.sheet_rate_limit
+    backends = memory_backends(seed=args.seed, agents=agents_directory(), **profiles)
+    set_backends(resilient_backends(backends) if args.resilience else backends)
+    set_backend(LRUBackend())
+    seed_listings(backends, args.existing, seed=args.seed)
+    seed_sheet(backends, args.existing, seed=args.seed)
+    ensure_sheet_header()
+    projector = SheetProjector(batch_interval=0.5).start() if args.sheet_sync == "projector" else None
+
+    journal_dirs = [tempfile.mkdtemp(prefix="load-journal-") for _ in range(args.instances)]
+    journals = [SubmissionJournal(d) for d in journal_dirs]
+    workers = [w for journal in journals for w in start_workers(journal, journal_drain(args.engine), count=args.workers)]
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+            sessions = list(executor.map(
+                lambda i: run_session(i, journals[i % args.instances], args), range(args.sessions)
+            ))
+        rows = wait_for_drain(journals, args.timeout)
+        drained = time.perf_counter()
+        if projector is not None:
+            projector.wait_idle(args.timeout)
+    finally:
+        for worker in workers:
+            worker.stop()
+        if projector is not None:
+            projector.stop()
+    elapsed = time.perf_counter() - started
+    sheet_lag = time.perf_counter() - drained
+    for journal_dir in journal_dirs:
+        shutil.rmtree(journal_dir, ignore_errors=True)
+
+    # --- Outcomes ---
+    for s in sessions:
+        # The drain moves a submission to a new ID when another instance claimed its first one
+        s["property_id"] = rows.get(s["token"], {}).get("property_id") or s["property_id"]
+    status = Counter(rows.get(s["token"], {}).get("status", "not journaled") for s in sessions)
+    done = [s for s in sessions if rows.get(s["token"], {}).get("status") == "done"]
+    id_owners = defaultdict(set)
+    for s in sessions:
+        if s["property_id"]:
+            id_owners[s["property_id"]].add(s["token"])
+    sheet_ids = Counter(row[0] for row in backends.sheet.rows[1:] if row)
+    overwritten = [
+        s for s in done
+        if (backends.listings.docs.get(s["property_id"]) or {}).get("propertyName") != s["propertyName"]
+    ]
+    e2e = [
+        (rows[s["token"]]["updated_at"] - rows[s["token"]]["created_at"]) * 1000 for s in done
+    ]
+
+    calls, errors, throttled = {}, {}, {}
+    for store in backends:
+        calls.update(store.network.calls)
+        errors.update(store.network.errors)
+        throttled.update(store.network.throttled)
+
+    return {
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "elapsed_s": round(elapsed, 2),
+        "sessions": args.sessions,
+        "success_rate": round(len(done) / args.sessions, 4) if args.sessions else 0.0,
+        "status": dict(status),
+        "submit_errors": [s["error"] for s in sessions if s["error"]],
+        "collisions": {
+            "property_ids_shared": sum(1 for owners in id_owners.values() if len(owners) > 1),
+            "firestore_overwritten": len(overwritten),
+            "sheet_duplicate_ids": sum(1 for count in sheet_ids.values() if count > 1),
+            "sheet_rows_missing": sum(1 for s in done if s["property_id"] not in sheet_ids),
+            "replay_mismatches": sum(1 for s in sessions if s["replay_mismatch"]),
+            "property_ids_reassigned": sum(1 for s in sessions if s["property_id"] != s["submitted_id"]),
+        },
+        "latency": {
+            "submit_ack": latency_summary([s["ack_ms"] for s in sessions]),
+            "end_to_end": latency_summary(e2e),
+        },
+        "backend_calls": dict(sorted(calls.items())),
+        "backend_errors": dict(sorted(errors.items())),
+        "backend_throttled": dict(sorted(throttled.items())),
+        "journal_attempts": dict(Counter(rows[s["token"]]["attempts"] for s in done)),
+        "circuits": breaker_states(),
+        "sheet_lag_s": round(sheet_lag, 2) if projector is not None else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent agents submitting listings.")
+    parser.add_argument("--sessions", type=int, default=40)
+    parser.add_argument("--ramp-s", type=float, default=10.0, help="Sessions start spread over this many seconds")
+    parser.add_argument("--instances", type=int, default=1, help="App instances, each with its own journal")
+    parser.add_argument("--workers", type=int, default=submission_journal.JOURNAL_WORKERS, help="Journal workers per instance")
+    parser.add_argument("--profile", default="realistic", choices=sorted(PROFILES))
+    parser.add_argument("--engine", default="threads", choices=["threads", "async"], help="Upload engine draining the journals")
+    parser.add_argument("--sheet-sync", default="inline", choices=["inline", "projector"], help="How the sheet is kept current")
+    parser.add_argument("--resilience", action="store_true", help="Wrap the fakes in the retry/deadline/breaker layer")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Injected failure rate on every backend")
+    parser.add_argument("--drive-rate-limit", type=int, default=None, help="Drive calls allowed per second")
+    parser.add_argument("--sheet-rate-limit", type=int, default=None, help="Sheets calls allowed per second")
+    parser.add_argument("--replay-rate", type=float, default=0.1, help="Share of sessions that double-submit")
+    parser.add_argument("--media-scale", type=float, default=0.25, help="Multiplier on synthetic media sizes")
+    parser.add_argument("--existing", type=int, default=2000, help="Listings and sheet rows present before the run")
+    parser.add_argument("--backoff-s", type=float, default=0.5, help="Journal retry backoff base")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Max seconds to wait for the journals to drain")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="Write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print(json.dumps({k: v for k, v in report.items() if k != "config"}, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+# media_gc.py
+#
+# Finds media that no listing points to: Storage prefixes
+# rental-media-files/<id>/ and Drive folders <id> under PARENT_FOLDER_ID whose
+# property ID has no Firestore document. These are left behind when a
+# submission uploads its files and then never reaches Firestore.
+#
+# Storage is scanned in parallel shards (one per leading digit of the ID) and
+# Drive alongside them. Progress is checkpointed to a JSON file after each
+# batch of IDs, so an interrupted run over a large bucket resumes where it
+# stopped; a completed run clears the checkpoint.
+#
+#   python media_gc.py                    # report orphans only
+#   python media_gc.py --delete           # delete Storage objects, trash Drive folders
+#
+# Media newer than --min-age-hours is never touched, nor are IDs still owned
+# by the local submission journal or reserved in rental-inventory-ids within
+# RESERVATION_TTL_HOURS: a reserved ID without a listing may belong to a
+# submission still draining (or failed and waiting to be requeued) on another
+# host, whose recorded upload steps point at this media.
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backends import get_backends, set_backends
+from submission_journal import JOURNAL_DIR, SubmissionJournal
+from submission_pipeline import MEDIA_PREFIX, PARENT_FOLDER_ID
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------------
+# Configuration
+# -------------------------------------
+MEDIA_GC_CHECKPOINT = os.getenv("MEDIA_GC_CHECKPOINT", os.path.join(JOURNAL_DIR, "media_gc.json"))
+ORPHAN_MIN_AGE_HOURS = float(os.getenv("ORPHAN_MIN_AGE_HOURS", "72"))
+RESERVATION_TTL_HOURS = float(os.getenv("RESERVATION_TTL_HOURS", str(30 * 24)))    # unsaved reservations count as live this long
+CHECKPOINT_EVERY = 50           # IDs per shard between checkpoint writes
+REPORT_LIMIT = 200              # orphans listed in the report; all are counted
+STORAGE_SHARDS = [f"RN{digit}" for digit in "0123456789"]
+_PROPERTY_ID = re.compile(r"^RN\d+$")
+
+
+def _drive_time(value: str) -> float:
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=datetime.timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+# -------------------------------------
+# Checkpoint
+# -------------------------------------
+class Checkpoint:
+    """Last property ID finished per scan ("storage:RN1", "drive"), saved atomically to JSON."""
+
+    def __init__(self, path: str = MEDIA_GC_CHECKPOINT):
+        self.path = path
+        self._lock = threading.Lock()
+        self.positions = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.positions = json.load(f).get("positions", {})
+
+    def get(self, scan: str):
+        with self._lock:
+            return self.positions.get(scan)
+
+    def advance(self, scan: str, property_id: str):
+        with self._lock:
+            self.positions[scan] = property_id
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"positions": self.positions, "saved": time.time()}, f)
+            os.replace(tmp, self.path)
+
+    def clear(self):
+        with self._lock:
+            self.positions = {}
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+# -------------------------------------
+# Reconciliation
+# -------------------------------------
+class MediaReconciler:
+    def __init__(self, delete: bool = False, min_age_hours: float = ORPHAN_MIN_AGE_HOURS,
+                 checkpoint: Checkpoint = None, journal: SubmissionJournal = None, parent_folder_id: str = PARENT_FOLDER_ID,
+                 reservation_ttl_hours: float = RESERVATION_TTL_HOURS):
+        self.delete = delete
+        self.min_age = min_age_hours * 3600
+        self.reservation_ttl = reservation_ttl_hours * 3600
+        self.checkpoint = checkpoint or Checkpoint()
+        self.journal = journal
+        self.parent_folder_id = parent_folder_id
+        self._lock = threading.Lock()
+        self.report = {
+            "storage": {"prefixes": 0, "orphans": 0, "objects": 0, "bytes": 0},
+            "drive": {"folders": 0, "orphans": 0},
+            "skipped_recent": 0,
+            "deleted": 0,
+            "orphans": [],
+        }
+
+    def _known_ids(self) -> set:
+        # Document IDs only; the projection keeps this one cheap query
+        listings = get_backends().listings
+        ids = {pid for pid, _ in listings.stream(fields=["propertyId"])}
+        # Submissions on other hosts' journals hold a reservation until they are saved
+        ids |= listings.reserved_ids(time.time() - self.reservation_ttl)
+        if self.journal is not None:
+            ids |= set(self.journal.unfinished_property_ids())
+        return ids
+
+    def _record(self, kind: str, property_id: str, newest: float, **details) -> bool:
+        """Counts an orphan; True when it is old enough to collect."""
+        with self._lock:
+            if time.time() - newest < self.min_age:
+                self.report["skipped_recent"] += 1
+                return False
+            self.report[kind]["orphans"] += 1
+            if len(self.report["orphans"]) < REPORT_LIMIT:
+                self.report["orphans"].append({"kind": kind, "propertyId": property_id, **details})
+            return True
+
+    def _storage_groups(self, shard: str):
+        """Yields (property_id, [objects]) for each ID prefix in the shard, in name order."""
+        start_after = self.checkpoint.get(f"storage:{shard}")
+        # U+FFFF sorts after every object name under the last finished ID
+        start_offset = f"{MEDIA_PREFIX}/{start_after}/\uffff" if start_after else None
+        current, objects = None, []
+        for obj in get_backends().media.list_objects(f"{MEDIA_PREFIX}/{shard}", start_offset=start_offset):
+            property_id = obj["name"][len(MEDIA_PREFIX) + 1:].split("/", 1)[0]
+            if property_id != current:
+                if objects:
+                    yield current, objects
+                current, objects = property_id, []
+            objects.append(obj)
+        if objects:
+            yield current, objects
+
+    def scan_storage(self, shard: str, known: set):
+        media = get_backends().media
+        for count, (property_id, objects) in enumerate(self._storage_groups(shard), start=1):
+            with self._lock:
+                self.report["storage"]["prefixes"] += 1
+            if _PROPERTY_ID.match(property_id) and property_id not in known:
+                size = sum(obj["size"] or 0 for obj in objects)
+                newest = max(obj["updated"] for obj in objects)
+                if self._record("storage", property_id, newest, objects=len(objects), bytes=size):
+                    with self._lock:
+                        self.report["storage"]["objects"] += len(objects)
+                        self.report["storage"]["bytes"] += size
+                    if self.delete:
+                        for obj in objects:
+                            media.delete(obj["name"])
+                        with self._lock:
+                            self.report["deleted"] += len(objects)
+            if count % CHECKPOINT_EVERY == 0:
+                self.checkpoint.advance(f"storage:{shard}", property_id)
+
+    def scan_drive(self, known: set):
+        if not self.parent_folder_id:
+            return
+        drive = get_backends().drive
+        # Folders come back sorted by name, so everything up to the checkpoint was done
+        done_through = self.checkpoint.get("drive") or ""
+        count = 0
+        for folder in drive.list_folders(self.parent_folder_id):
+            name = folder["name"]
+            if name <= done_through:
+                continue
+            count += 1
+            with self._lock:
+                self.report["drive"]["folders"] += 1
+            if _PROPERTY_ID.match(name) and name not in known:
+                if self._record("drive", name, _drive_time(folder.get("createdTime")), folderId=folder["id"]) and self.delete:
+                    # Trashed, not deleted: Drive keeps it restorable for 30 days
+                    drive.trash(folder["id"])
+                    with self._lock:
+                        self.report["deleted"] += 1
+            if count % CHECKPOINT_EVERY == 0:
+                self.checkpoint.advance("drive", name)
+
+    def run(self) -> dict:
+        started = time.perf_counter()
+        known = self._known_ids()
+        with ThreadPoolExecutor(max_workers=len(STORAGE_SHARDS) + 1, thread_name_prefix="media-gc") as executor:
+            futures = [executor.submit(self.scan_storage, shard, known) for shard in STORAGE_SHARDS]
+            futures.append(executor.submit(self.scan_drive, known))
+            for future in futures:
+                # Re-raises a failed scan; its checkpoint lets the next run resume
+                future.result()
+        self.checkpoint.clear()
+        self.report["listings"] = len(known)
+        self.report["elapsed_s"] = round(time.perf_counter() - started, 2)
+        return self.report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report or remove media that no listing points to.")
+    parser.add_argument("--delete", action="store_true", help="Delete orphaned Storage objects and trash Drive folders")
+    parser.add_argument("--min-age-hours", type=float, default=ORPHAN_MIN_AGE_HOURS)
+    parser.add_argument("--checkpoint", default=MEDIA_GC_CHECKPOINT)
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint of an interrupted run")
+    parser.add_argument("--journal-dir", default=JOURNAL_DIR, help="Submission journal whose unfinished IDs are kept")
+    args = parser.parse_args(argv)
+
+    from google_clients import backends_from_env
+
+    logging.basicConfig(level=logging.INFO)
+    set_backends(backends_from_env())
+    os.makedirs(os.path.dirname(os.path.abspath(args.checkpoint)), exist_ok=True)
+    checkpoint = Checkpoint(args.checkpoint)
+    if args.restart:
+        checkpoint.clear()
+    journal = SubmissionJournal(args.journal_dir) if os.path.isdir(args.journal_dir) else None
+    report = MediaReconciler(args.delete, args.min_age_hours, checkpoint, journal).run()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# media_workers.py
+#
+# Runs the journal drain (uploads, Firestore and Sheets writes) and photo
+# hashing in separate worker processes, so a large submission never competes
+# with the Streamlit script threads for the server process's CPU and GIL.
+#
+# The queue is the SQLite submission journal itself: the UI process enqueues
+# (spooled file paths, property ID and folders) and any number of worker
+# processes claim entries from it and report progress back into it.
+#
+#   MEDIA_WORKER_PROCESSES=4 streamlit run rent.py      # pool started by the app
+#   python media_workers.py --processes 4               # standalone, with JOURNAL_WORKERS=0 in the app
+
+import argparse
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from async_uploads import UPLOAD_ENGINE, journal_drain
+from backends import BACKEND
+from photo_hash import photo_dhash
+from submission_journal import JOURNAL_DIR, JOURNAL_WORKERS, SubmissionJournal, start_workers
+from submission_pipeline import hash_photos_concurrent
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------------
+# Configuration
+# -------------------------------------
+MEDIA_WORKER_PROCESSES = int(os.getenv("MEDIA_WORKER_PROCESSES", "0"))    # 0 keeps the drain on threads in-process
+MEDIA_HASH_PROCESSES = int(os.getenv("MEDIA_HASH_PROCESSES", "2"))
+RESTART_DELAY = 5.0
+
+# Spawn, not fork: the Streamlit server process is multi-threaded
+_mp = multiprocessing.get_context("spawn")
+
+
+def process_mode() -> bool:
+    # Fakes live in process memory, so worker processes could not share them with the UI
+    if MEDIA_WORKER_PROCESSES and BACKEND == "memory":
+        logger.warning("MEDIA_WORKER_PROCESSES is ignored with BACKEND=memory")
+        return False
+    return MEDIA_WORKER_PROCESSES > 0
+
+
+# -------------------------------------
+# Worker Processes
+# -------------------------------------
+def _worker_process(journal_dir: str, threads: int, engine: str):
+    """Entry point of one worker process: drains the journal until the parent goes away."""
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [media-{os.getpid()}] %(levelname)s %(message)s")
+    from backends import set_backends
+    from google_clients import backends_from_env
+    from shared_cache import LRUBackend, SQLiteBackend, get_backend, set_backend
+
+    # The sheet row index is cached; it must be one cache for every process that appends
+    if isinstance(get_backend(), LRUBackend):
+        set_backend(SQLiteBackend(os.path.join(journal_dir, "worker_cache.sqlite3")))
+    set_backends(backends_from_env())
+    journal = SubmissionJournal(journal_dir)
+    workers = start_workers(journal, journal_drain(engine), count=threads)
+    parent = os.getppid()
+    while os.getppid() == parent:
+        time.sleep(1.0)
+    for worker in workers:
+        worker.stop()
+
+
+class MediaWorkerPool:
+    """Keeps `processes` worker processes draining one journal, restarting any that exit."""
+
+    def __init__(self, journal_dir: str = JOURNAL_DIR, processes: int = MEDIA_WORKER_PROCESSES,
+                 threads: int = JOURNAL_WORKERS, engine: str = UPLOAD_ENGINE):
+        self.journal_dir = journal_dir
+        self.processes = processes
+        self.threads = max(1, threads)
+        self.engine = engine
+        self._procs = []
+        self._stop_event = threading.Event()
+
+    def _spawn(self):
+        proc = _mp.Process(
+            target=_worker_process, args=(self.journal_dir, self.threads, self.engine),
+            daemon=True, name="media-worker",
+        )
+        proc.start()
+        return proc
+
+    def start(self):
+        # Inherited by the children at spawn: serializes Sheet appends across them
+        os.environ["SHEET_LOCK_FILE"] = os.path.join(os.path.abspath(self.journal_dir), "sheet_append.lock")
+        self._procs = [self._spawn() for _ in range(self.processes)]
+        threading.Thread(target=self._supervise, daemon=True, name="media-supervisor").start()
+        logger.info(f"Started {self.processes} media worker processes ({self.threads} workers each, {self.engine} engine)")
+        return self
+
+    def _supervise(self):
+        while not self._stop_event.wait(RESTART_DELAY):
+            for i, proc in enumerate(self._procs):
+                if not proc.is_alive():
+                    logger.error(f"Media worker {proc.pid} exited with {proc.exitcode}; restarting")
+                    self._procs[i] = self._spawn()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop_event.set()
+        for proc in self._procs:
+            proc.terminate()
+        for proc in self._procs:
+            proc.join(timeout)
+
+    def alive(self) -> int:
+        return sum(1 for proc in self._procs if proc.is_alive())
+
+
+def start_journal_workers(journal: SubmissionJournal):
+    """Starts the drain for this journal: a worker process pool if configured, else threads in-process."""
+    if process_mode():
+        return MediaWorkerPool(journal.journal_dir).start()
+    return start_workers(journal, journal_drain())
+
+
+# -------------------------------------
+# Photo Hashing
+# -------------------------------------
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+
+
+def _hash_bytes(data: bytes):
+    try:
+        return photo_dhash(data)
+    except Exception as e:
+        logger.error(f"Photo hash error: {e}")
+        return None
+
+
+def hash_photos(files) -> dict:
+    """{position: dhash} for uploaded photos, hashed in the process pool when process mode is on."""
+    if not files or not process_mode():
+        return hash_photos_concurrent(files)
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            _hash_pool = ProcessPoolExecutor(max_workers=MEDIA_HASH_PROCESSES, mp_context=_mp)
+    hashes = _hash_pool.map(_hash_bytes, [file.getvalue() for file in files])
+    return {i: value for i, value in enumerate(hashes) if value is not None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drain the submission journal in worker processes.")
+    parser.add_argument("--processes", type=int, default=max(1, MEDIA_WORKER_PROCESSES))
+    parser.add_argument("--threads", type=int, default=JOURNAL_WORKERS, help="Journal workers per process")
+    parser.add_argument("--engine", default=UPLOAD_ENGINE, choices=["threads", "async"])
+    parser.add_argument("--journal-dir", default=JOURNAL_DIR)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    os.makedirs(args.journal_dir, exist_ok=True)
+    pool = MediaWorkerPool(args.journal_dir, args.processes, args.threads, args.engine).start()
+    try:
+        while True:
+            time.sleep(60)
+            logger.info(f"{pool.alive()}/{args.processes} media workers alive")
+    except KeyboardInterrupt:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# photo_hash.py
+
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+MEDIA_PREFIX = "rental-media-files/"
+HASH_SIZE = 8            # 64-bit dHash
+MATCH_DISTANCE = 6       # max differing bits for two photos to count as the same picture
+REBUILD_MIN = 1000       # tombstones before the BK-tree is rebuilt...
+REBUILD_RATIO = 0.25     # ...once they are also this share of its entries
+
+
+# -------------------------------------
+# Perceptual Hash
+# -------------------------------------
+def photo_dhash(image_bytes: bytes, hash_size: int = HASH_SIZE) -> int:
+    """Difference hash: robust to resizing, recompression and small colour edits."""
+    image = Image.open(BytesIO(image_bytes))
+    # Let the JPEG decoder downscale while decoding instead of decoding full size
+    image.draft("L", (hash_size * 8, hash_size * 8))
+    pixels = list(image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hash_to_hex(value: int) -> str:
+    return f"{value:016x}"
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+# -------------------------------------
+# BK-tree
+# -------------------------------------
+class BKTree:
+    """Metric tree over Hamming distance; a radius search visits only a small part of the tree."""
+
+    def __init__(self):
+        self._root = None    # [hash, items, {distance: child}]
+        self._size = 0
+
+    def add(self, value: int, item):
+        self._size += 1
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+        node = self._root
+        while True:
+            dist = hamming(value, node[0])
+            if dist == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(dist)
+            if child is None:
+                node[2][dist] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> list:
+        """Returns (distance, item) pairs within max_distance, closest first."""
+        results = []
+        stack = [self._root] if self._root else []
+        while stack:
+            node = stack.pop()
+            dist = hamming(value, node[0])
+            if dist <= max_distance:
+                results.extend((dist, item) for item in node[1])
+            for edge, child in node[2].items():
+                if dist - max_distance <= edge <= dist + max_distance:
+                    stack.append(child)
+        results.sort(key=lambda r: r[0])
+        return results
+
+    def __len__(self):
+        return self._size
+
+
+# -------------------------------------
+# Photo Index
+# -------------------------------------
+class PhotoIndex:
+    """Perceptual hashes of every listing photo, kept current from the listings' photoHashes.
+
+    The BK-tree cannot delete, so hashes a listing no longer has are
+    tombstoned and filtered out of matches; the tree is rebuilt from the
+    live hashes once tombstones pile up.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tree = BKTree()
+        self._indexed = {}              # property ID -> set of hex hashes it currently has
+        self._tombstones = set()        # (hex hash, property ID) still in the tree but gone from the listing
+        self._watch = None
+        self.ready = threading.Event()
+
+    def add_listing(self, property_id: str, hex_hashes: list):
+        """Indexes the listing's current photo hashes, replacing the ones indexed before."""
+        with self._lock:
+            current = set(hex_hashes or [])
+            previous = self._indexed.pop(property_id, set())
+            for hex_hash in previous - current:
+                self._tombstones.add((hex_hash, property_id))
+            for hex_hash in current - previous:
+                if (hex_hash, property_id) in self._tombstones:
+                    # Still in the tree from before; bring it back
+                    self._tombstones.discard((hex_hash, property_id))
+                else:
+                    self._tree.add(int(hex_hash, 16), (hex_hash, property_id))
+            if current:
+                self._indexed[property_id] = current
+            if len(self._tombstones) >= max(REBUILD_MIN, len(self._tree) * REBUILD_RATIO):
+                self._rebuild_locked()
+
+    def remove_listing(self, property_id: str):
+        self.add_listing(property_id, [])
+
+    def _rebuild_locked(self):
+        tree = BKTree()
+        for property_id, hex_hashes in self._indexed.items():
+            for hex_hash in hex_hashes:
+                tree.add(int(hex_hash, 16), (hex_hash, property_id))
+        self._tree, self._tombstones = tree, set()
+
+    def rebuild(self):
+        """Drops tombstoned hashes from the BK-tree."""
+        with self._lock:
+            self._rebuild_locked()
+
+    def find_matches(self, value: int, max_distance: int = MATCH_DISTANCE) -> list:
+        """Returns (distance, property ID) pairs within max_distance, closest first."""
+        with self._lock:
+            return [
+                (dist, property_id)
+                for dist, (hex_hash, property_id) in self._tree.search(value, max_distance)
+                if (hex_hash, property_id) not in self._tombstones
+            ]
+
+    def _on_changes(self, changes):
+        for change_type, property_id, data in changes:
+            if change_type == "REMOVED":
+                self.remove_listing(property_id)
+            else:
+                self.add_listing(property_id, data.get("photoHashes"))
+        self.ready.set()
+
+    def watch(self, listings):
+        """Follows a listing store (see backends.py)."""
+        self._watch = listings.watch(self._on_changes)
+        return self
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch()
+            self._watch = None
+
+
+def find_reused_photos(index: PhotoIndex, photos: dict, exclude_property_id: str = None) -> dict:
+    """Maps each key of {position: dhash} to the property IDs already using a near-identical photo."""
+    reused = {}
+    for position, value in photos.items():
+        matches = sorted({pid for _, pid in index.find_matches(value) if pid != exclude_property_id})
+        if matches:
+            reused[position] = matches
+    return reused
+
+
+# -------------------------------------
+# Backfill
+# -------------------------------------
+def _hash_object(media, name: str):
+    try:
+        return name, photo_dhash(media.download(name))
+    except Exception as e:
+        logger.error(f"Photo hash error ({name}): {e}")
+        return name, None
+
+
+def backfill_photo_hashes(listings, media, max_workers: int = 16) -> int:
+    """Hashes every rental-media-files/*/photos/* object in parallel and stores photoHashes per listing.
+
+    Returns the number of listings updated.
+    """
+    names = [name for name, _ in media.list(MEDIA_PREFIX) if "/photos/" in name]
+    by_property = defaultdict(list)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for name, value in executor.map(lambda n: _hash_object(media, n), names):
+            if value is not None:
+                property_id = name[len(MEDIA_PREFIX):].split("/", 1)[0]
+                by_property[property_id].append(hash_to_hex(value))
+
+    existing = listings.get_many(list(by_property))
+    updates = {pid: {"photoHashes": hashes} for pid, hashes in by_property.items() if pid in existing}
+    if updates:
+        listings.update_many(updates)
+    logger.info(f"Backfilled photo hashes on {len(updates)} listings from {len(names)} photos")
+    return len(updates)
@@ -1,20 +1,15 @@
-import os
 import datetime
 import logging
-from io import BytesIO
-from concurrent.futures import ThreadPoolExecutor
+import uuid
 from typing import List, Dict, Any, Tuple, Optional
 import time
 
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore, storage
-from google.cloud import storage as gcs
-import gspread
-from google.oauth2.service_account import Credentials as ServiceAccountCredentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
-from dotenv import load_dotenv
+
+from google_clients import (
+    GSPREAD_SHEET_ID, SHEET_NAME, firebase_clients, gspread_client, drive_service, async_google_sessions,
+)
+from metrics import start_exporter
 
 # Set page configuration with wider layout and custom theme
 st.set_page_config(
@@ -81,355 +76,178 @@ st.markdown("""
 
 # Import area data (assumed to be available)
 from area_data import areasData, all_micromarkets, find_area
-
-# -------------------------------------
-# CONFIGURATION & ENVIRONMENT
-# -------------------------------------
-load_dotenv()
-
-# --- Firebase Credentials ---
-FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID")
-FIREBASE_PRIVATE_KEY = os.getenv("FIREBASE_PRIVATE_KEY").replace('\\n', '\n')
-FIREBASE_PRIVATE_KEY_ID = os.getenv("FIREBASE_PRIVATE_KEY_ID")
-FIREBASE_CLIENT_EMAIL = os.getenv("FIREBASE_CLIENT_EMAIL")
-FIREBASE_CLIENT_ID = os.getenv("FIREBASE_CLIENT_ID")
-FIREBASE_STORAGE_BUCKET = os.getenv("FIREBASE_STORAGE_BUCKET")
-
-firebase_sa_info = {
-    "type": "service_account",
-    "project_id": FIREBASE_PROJECT_ID,
-    "private_key_id": FIREBASE_PRIVATE_KEY_ID,
-    "private_key": FIREBASE_PRIVATE_KEY,
-    "client_email": FIREBASE_CLIENT_EMAIL,
-    "client_id": FIREBASE_CLIENT_ID,
-    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-    "token_uri": "https://oauth2.googleapis.com/token",
-    "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
-    "client_x509_cert_url": f"https://www.googleapis.com/robot/v1/metadata/x509/{FIREBASE_CLIENT_EMAIL}",
-}
-
-# --- Google Sheets Credentials ---
-GSPREAD_PROJECT_ID = os.getenv("GSPREAD_PROJECT_ID")
-GSPREAD_PRIVATE_KEY_ID = os.getenv("GSPREAD_PRIVATE_KEY_ID")
-GSPREAD_PRIVATE_KEY = os.getenv("GSPREAD_PRIVATE_KEY").replace('\\n', '\n')
-GSPREAD_CLIENT_EMAIL = os.getenv("GSPREAD_CLIENT_EMAIL")
-GSPREAD_CLIENT_ID = os.getenv("GSPREAD_CLIENT_ID")
-GSPREAD_SHEET_ID = os.getenv("GSPREAD_SHEET_ID")
-
-# --- Google Drive Credentials ---
-GOOGLE_DRIVE_PROJECT_ID = os.getenv("GOOGLE_DRIVE_PROJECT_ID")
-GOOGLE_DRIVE_PRIVATE_KEY_ID = os.getenv("GOOGLE_DRIVE_PRIVATE_KEY_ID")
-GOOGLE_DRIVE_PRIVATE_KEY = os.getenv("GOOGLE_DRIVE_PRIVATE_KEY").replace('\\n', '\n')
-GOOGLE_DRIVE_CLIENT_EMAIL = os.getenv("GOOGLE_DRIVE_CLIENT_EMAIL")
-GOOGLE_DRIVE_CLIENT_ID = os.getenv("GOOGLE_DRIVE_CLIENT_ID")
-
-# --- Other Configurations ---
-PARENT_FOLDER_ID = os.getenv("PARENT_FOLDER_ID")
+from gazetteer import search_micromarkets
+from geo_locator import suggest_micromarket, check_micromarket
+from geo_search import nearby_listings
+from duplicate_index import DuplicateIndex
+from photo_hash import PhotoIndex, find_reused_photos
+from submission_journal import SubmissionJournal
+from tracing import span, read_spans, summarize
+from rerun_profiler import PROFILE_RERUNS, profile_rerun, recent_profiles
+from backends import BACKEND, ListingFeed, memory_backends, production_backends, set_backends
+from media_workers import start_journal_workers, hash_photos
+from resilience import resilient_backends
+from sheet_projector import SheetProjector
+from sheet_sync import SHEET_REVERSE_SYNC_SECONDS, SheetStatusSync
+from text_search import TextIndex, highlight
+from facet_index import FACETS, FacetIndex
+from submission_pipeline import (
+    parse_coordinates, compute_floor_range, clean_listing_fields, missing_listing_fields, ensure_sheet_header,
+    fetch_agent_details, submit_listing, SHEET_SYNC,
+)
 
 # Logging setup
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# The submission queue refreshes on its own at this interval, without a full rerun
+JOURNAL_REFRESH_SECONDS = 15
+
 # -------------------------------------
 # CACHED INITIALIZATIONS
 # -------------------------------------
 @st.cache_resource(ttl=3600)  # Cache for 1 hour
 def init_firebase():
-    if not firebase_admin._apps:
-        try:
-            cred = credentials.Certificate(firebase_sa_info)
-            firebase_admin.initialize_app(cred, {"storageBucket": FIREBASE_STORAGE_BUCKET})
-            logger.info("Firebase initialized successfully.")
-        except Exception as e:
-            logger.error(f"Error initializing Firebase: {e}")
-            raise
-    db_inst = firestore.client()
-    bucket_inst = storage.bucket()
-    gcs_client_inst = gcs.Client.from_service_account_info(firebase_sa_info)
-    return db_inst, bucket_inst, gcs_client_inst
-
-# Instead of initializing on import, initialize when needed
-db = None
-bucket = None
-gcs_client = None
+    return firebase_clients()
 
 @st.cache_resource(ttl=3600)  # Cache for 1 hour
 def init_gspread_client():
-    scopes = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ]
-    gs_creds = ServiceAccountCredentials.from_service_account_info({
-        "type": "service_account",
-        "project_id": GSPREAD_PROJECT_ID,
-        "private_key_id": GSPREAD_PRIVATE_KEY_ID,
-        "private_key": GSPREAD_PRIVATE_KEY,
-        "client_email": GSPREAD_CLIENT_EMAIL,
-        "client_id": GSPREAD_CLIENT_ID,
-        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-        "token_uri": "https://oauth2.googleapis.com/token",
-        "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
-        "client_x509_cert_url": f"https://www.googleapis.com/robot/v1/metadata/x509/{GSPREAD_CLIENT_EMAIL}",
-    }, scopes=scopes)
-    client = gspread.authorize(gs_creds)
-    return client
-
-# Lazy loading for Google Sheets
-gc = None
-sheet = None
+    return gspread_client()
 
 @st.cache_resource(ttl=3600)  # Cache for 1 hour
 def init_drive_service():
-    scopes = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ]
-    drive_creds = ServiceAccountCredentials.from_service_account_info({
-        "type": "service_account",
-        "project_id": GOOGLE_DRIVE_PROJECT_ID,
-        "private_key_id": GOOGLE_DRIVE_PRIVATE_KEY_ID,
-        "private_key": GOOGLE_DRIVE_PRIVATE_KEY,
-        "client_email": GOOGLE_DRIVE_CLIENT_EMAIL,
-        "client_id": GOOGLE_DRIVE_CLIENT_ID,
-        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-        "token_uri": "https://oauth2.googleapis.com/token",
-        "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
-        "client_x509_cert_url": f"https://www.googleapis.com/robot/v1/metadata/x509/{GOOGLE_DRIVE_CLIENT_EMAIL}",
-    }, scopes=scopes)
-    service = build("drive", "v3", credentials=drive_creds)
-    return service
-
-# Lazy loading for Drive
-drive_service = None
+    return drive_service()
+
+@st.cache_resource
+def init_backends():
+    # BACKEND=memory runs the whole app against seeded in-memory fakes, with no network
+    if BACKEND == "memory":
+        backends = memory_backends()
+    else:
+        db_inst, bucket_inst, _ = init_firebase()
+        worksheet = init_gspread_client().open_by_key(GSPREAD_SHEET_ID).worksheet(SHEET_NAME)
+        backends = resilient_backends(
+            production_backends(db_inst, bucket_inst, init_drive_service(), worksheet, async_google_sessions())
+        )
+    set_backends(backends)
+    return backends
+
+@st.cache_resource
+def init_listing_feed():
+    # One listener on the listing store per server process, shared by every index
+    return ListingFeed(init_backends().listings)
+
+@st.cache_resource
+def init_duplicate_index():
+    # One index per server process, kept current by the shared listing feed
+    return DuplicateIndex().watch(init_listing_feed())
+
+@st.cache_resource
+def init_photo_index():
+    return PhotoIndex().watch(init_listing_feed())
+
+@st.cache_resource
+def init_text_index():
+    # BM25 over amenities, restrictions and extra details, kept current like the other indexes
+    return TextIndex().watch(init_listing_feed())
+
+@st.cache_resource
+def init_facet_index():
+    # Bitmap per facet value; any combination of filters is answered in memory
+    return FacetIndex().watch(init_listing_feed())
 
 def ensure_sheet_headers():
     # Cached function to avoid checking headers on every run
     if 'headers_verified' in st.session_state and st.session_state['headers_verified']:
         return
-
-    expected_header = [
-        "Property Id", "Property Name", "Property Type", "Plot Size", "SBUA",
-        "Rent Per Month in Lakhs", "Commission Type", "Maintenance Charges", "Security Deposit", "Configuration",
-        "Facing", "Furnishing Status", "Micromarket", "Area", "Available From", "Floor Number",
-        "Inventory Status",
-        "Lease Period", "Lock-in Period", "Amenities", "Extra details", "Restrictions",
-        "Veg/Non Veg", "Pet friendly", "Drive Link", "mapLocation", "Coordinates",
-        "Date of inventory added", "Date of Status Last Checked", "Agent Id", "Agent Number", "Agent Name", "Exact Floor"
-    ]
-    current_header = sheet.row_values(1)
-    if current_header != expected_header:
-        header_range = "A1:AG1"
-        sheet.update(values=[expected_header], range_name=header_range)
-    
+    ensure_sheet_header()
     # Mark headers as verified to avoid rechecking
     st.session_state['headers_verified'] = True
 
-@st.cache_data(ttl=300)  # Cache for 5 minutes
-def get_next_row_index():
-    values = sheet.get_all_values()
-    return len(values) + 1
-
-def append_to_google_sheet(row: list):
-    try:
-        next_row = get_next_row_index()
-        cell_range = f"A{next_row}:AG{next_row}"
-        sheet.update(values=[row], range_name=cell_range, value_input_option="USER_ENTERED")
-        logger.info(f"Row added at position {next_row}")
-        return True
-    except Exception as e:
-        st.error(f"Sheet error: {e}")
-        logger.error(f"Sheet error: {e}")
-        return False
-
-# -------------------------------------
-# HELPER FUNCTIONS
-# -------------------------------------
-def parse_coordinates(coord_str: str):
-    try:
-        parts = coord_str.split(",")
-        if len(parts) != 2:
-            return None
-        return {"lat": float(parts[0].strip()), "lng": float(parts[1].strip())}
-    except Exception:
+@st.cache_resource
+def init_journal():
+    # One journal and worker pool per server process; unfinished submissions resume on startup
+    init_backends()
+    journal = SubmissionJournal()
+    # MEDIA_WORKER_PROCESSES moves the drain to worker processes; UPLOAD_ENGINE=async
+    # drains on a shared event loop instead of a thread per file
+    start_journal_workers(journal)
+    return journal
+
+@st.cache_resource
+def init_sheet_projector():
+    # SHEET_SYNC=projector: the sheet mirrors Firestore instead of the drain appending rows;
+    # every process starts a projector but only the lease holder writes
+    if SHEET_SYNC != "projector":
         return None
+    return SheetProjector().start(init_listing_feed())
 
-def standardize_phone_number(num: str) -> str:
-    num = num.strip().replace(" ", "")
-    if not num.startswith("+91"):
-        if num.startswith("91"):
-            num = "+" + num
-        else:
-            num = "+91" + num
-    return num
-
-def strip_plus91(num: str) -> str:
-    num = num.strip()
-    return num[3:] if num.startswith("+91") else num
-
-@st.cache_data(ttl=300)  # Cache for 5 minutes
-def fetch_agent_details(agent_number: str):
-    global db
-    if db is None:
-        db, bucket, gcs_client = init_firebase()
-        
-    agent_number = standardize_phone_number(agent_number)
-    # Use filter() instead of where() to avoid deprecation warning
-    query = db.collection("agents").where(filter=firestore.FieldFilter("phonenumber", "==", agent_number)).limit(1)
-    docs = query.stream()
-    for doc in docs:
-        data = doc.to_dict()
-        return data.get("cpId"), data.get("name")
-    return None, None
-
-@st.cache_data(ttl=300)  # Cache for 5 minutes
-def generate_property_id():
-    global db
-    if db is None:
-        db, bucket, gcs_client = init_firebase()
-        
-    docs = list(db.collection("rental-inventories").stream())
-    max_id = 0
-    for doc in docs:
-        pid = doc.get("propertyId")
-        if pid and pid.startswith("RN"):
-            try:
-                num = int(pid.replace("RN", ""))
-                max_id = max(max_id, num)
-            except Exception:
-                pass
-    return f"RN{max_id + 1:03d}"
-
-def upload_media_to_firebase(property_id: str, file_obj: BytesIO, folder: str, filename: str) -> str:
-    global bucket
-    if bucket is None:
-        _, bucket, _ = init_firebase()
-        
-    path = f"rental-media-files/{property_id}/{folder}/{filename}"
-    blob = bucket.blob(path)
-    try:
-        blob.upload_from_file(file_obj, content_type="application/octet-stream")
-        blob.make_public()
-        return blob.public_url
-    except Exception as e:
-        logger.error(f"Firebase error ({filename}): {e}")
-        return ""
-
-@st.cache_data(ttl=600)  # Cache for 10 minutes
-def create_drive_folder(folder_name: str, parent_id: str) -> str:
-    global drive_service
-    if drive_service is None:
-        drive_service = init_drive_service()
-        
-    query = (
-        f"'{parent_id}' in parents and name='{folder_name}' and "
-        "mimeType='application/vnd.google-apps.folder' and trashed=false"
-    )
-    try:
-        files = drive_service.files().list(q=query, fields="files(id)").execute().get("files", [])
-    except Exception as e:
-        logger.error(f"Error querying drive folders: {e}")
-        return ""
-    if files:
-        return files[0]["id"]
-    meta = {"name": folder_name, "mimeType": "application/vnd.google-apps.folder", "parents": [parent_id]}
-    try:
-        folder = drive_service.files().create(body=meta, fields="id").execute()
-        return folder.get("id")
-    except Exception as e:
-        logger.error(f"Drive folder error ({folder_name}): {e}")
-        return ""
-
-def upload_media_to_drive(file_obj: BytesIO, filename: str, parent_folder_id: str):
-    global drive_service
-    if drive_service is None:
-        drive_service = init_drive_service()
-        
-    file_obj.seek(0)
-    meta = {"name": filename, "parents": [parent_folder_id]}
-    media = MediaIoBaseUpload(file_obj, mimetype="application/octet-stream", resumable=True)
-    try:
-        res = drive_service.files().create(body=meta, media_body=media, fields="id").execute()
-        file_id = res.get("id")
-        drive_service.permissions().create(
-            fileId=file_id, body={"type": "anyone", "role": "reader"}
-        ).execute()
-        return f"https://drive.google.com/file/d/{file_id}/view?usp=sharing"
-    except Exception as e:
-        logger.error(f"Drive upload error ({filename}): {e}")
+@st.cache_resource
+def init_sheet_sync():
+    # Ops edits to status columns in the sheet flow back into Firestore; every process
+    # starts a poller but only the lease holder polls
+    if not SHEET_REVERSE_SYNC_SECONDS:
         return None
+    init_backends()
+    return SheetStatusSync().start()
 
-# Optimized file upload with progress tracking
-def upload_single_file(file, property_id, folder, drive_folder_id, progress_callback=None):
-    filename = file.name
-    file_bytes = BytesIO(file.read())
-    fb_url = upload_media_to_firebase(property_id, file_bytes, folder, filename)
-    dlink = None
-    if drive_folder_id:
-        file_bytes.seek(0)
-        dlink = upload_media_to_drive(file_bytes, filename, drive_folder_id)
-    if progress_callback:
-        progress_callback()
-    return fb_url, dlink
-
-def process_files_concurrent(files, property_id, folder, drive_folder_id, progress_placeholder=None):
-    if not files:
-        return [], []
-    
-    firebase_urls = []
-    drive_links = []
-    file_count = len(files)
-    
-    # Create a progress bar if a placeholder is provided
-    # progress_bar = None
-    # if progress_placeholder:
-    #     progress_bar = progress_placeholder.progress(0, text=f"Uploading {file_count} files...")
-    
-    # # Track progress
-    # completed = 0
-    
-    # def update_progress():
-    #     nonlocal completed
-    #     completed += 1
-    #     if progress_bar:
-    #         progress_bar.progress(completed / file_count, text=f"Uploaded {completed}/{file_count} files")
-    
-    # Determine optimal number of workers based on file count
-    max_workers = min(4, file_count)  # Max 4 workers, but no more than needed
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [
-            executor.submit(upload_single_file, file, property_id, folder, drive_folder_id) 
-            for file in files
-        ]
-        for future in futures:
-            fb_url, dlink = future.result()
-            if fb_url:
-                firebase_urls.append(fb_url)
-            if dlink:
-                drive_links.append(dlink)
-    
-    # Complete the progress bar
-    # if progress_bar:
-    #     progress_bar.progress(1.0, text="File upload complete!")
-    #     time.sleep(0.5)  # Give users a moment to see the completion
-    
-    return firebase_urls, drive_links
+@st.fragment(run_every=JOURNAL_REFRESH_SECONDS)
+def render_submission_queue(journal):
+    recent = journal.recent(limit=20)
+    if not recent:
+        return
+    waiting = sum(1 for item in recent if item["status"] in ("pending", "running"))
+    failed = [item for item in recent if item["status"] == "failed"]
+    label = f"📤 Submission Queue ({waiting} in progress, {len(failed)} failed)"
+    with st.expander(label, expanded=bool(failed)):
+        st.dataframe([
+            {
+                "Property Id": item["property_id"],
+                "Status": item["status"],
+                "Progress": f"{item['stage']} {item['done']}/{item['total']}" if item["stage"] and item["status"] != "done" else "",
+                "Attempts": item["attempts"],
+                "Submitted": datetime.datetime.fromtimestamp(item["created_at"]).strftime("%Y-%m-%d %H:%M"),
+                "Last Error": item["last_error"],
+            }
+            for item in recent
+        ], use_container_width=True, hide_index=True)
+        for item in failed:
+            if st.button(f"Retry {item['property_id']}", key=f"retry_{item['id']}"):
+                journal.requeue(item["id"])
+                st.rerun(scope="fragment")
+
+@st.fragment
+def render_trace_summary():
+    with st.expander("⏱️ Pipeline Latency", expanded=False):
+        if st.button("Load latency summary", key="load_trace_summary"):
+            rows = summarize(read_spans())
+            if rows:
+                st.dataframe(rows, use_container_width=True, hide_index=True)
+            else:
+                st.info("No spans recorded yet.")
 
-def compute_floor_range(exact_floor):
-    try:
-        floor = float(exact_floor)
-    except Exception:
-        return "NA"
-    if floor == 0:
-        return "Ground Floor"
-    elif floor <= 5:
-        return "Lower Floor (1-5)"
-    elif floor <= 10:
-        return "Middle Floor (6-10)"
-    elif floor <= 20:
-        return "Higher Floor (10+)"
-    else:
-        return "Higher Floor (20+)"
+def profiling_enabled() -> bool:
+    return PROFILE_RERUNS or st.query_params.get("profile") == "1"
+
+def render_profile_sidebar():
+    records = recent_profiles()
+    if not records:
+        return
+    latest = records[0]
+    with st.sidebar:
+        st.subheader("🧪 Rerun Profile")
+        walls = sorted(r["wall_ms"] for r in records)
+        st.caption(f"Last {len(records)} reruns: median {walls[len(walls) // 2]} ms, max {walls[-1]} ms")
+        metric_col1, metric_col2, metric_col3 = st.columns(3)
+        metric_col1.metric("Wall", f"{latest['wall_ms']} ms")
+        metric_col2.metric("CPU", f"{latest['cpu_ms']} ms")
+        metric_col3.metric("Peak", f"{latest['peak_memory_kb']} KB")
+        if latest["cache_misses"]:
+            st.write("**Cache misses:**", ", ".join(f"{ns} ({n})" for ns, n in latest["cache_misses"].items()))
+        st.write("**Top functions**")
+        st.dataframe(latest["top_functions"], use_container_width=True, hide_index=True)
+        st.write("**Memory deltas**")
+        st.dataframe(latest["memory_deltas"], use_container_width=True, hide_index=True)
 
 def clear_form_callback():
     keys_to_clear = [
@@ -437,457 +255,466 @@ def clear_form_callback():
         "rent_per_month", "commission_type", "maintenance_charges", "security_deposit", "configuration",
         "facing", "furnishing_status", "micromarket", "available_from", "exact_floor",
         "floor_range", "lease_period", "lock_in_period", "amenities", "extra_details",
-        "restrictions", "veg_non_veg", "pet_friendly", "mapLocation", "coordinates",
-        "photos_files", "videos_files", "documents_files", "ready_to_move"
+        "restrictions", "veg_non_veg", "pet_friendly", "micromarket_query", "mapLocation", "coordinates",
+        "photos_files", "videos_files", "documents_files", "ready_to_move", "fetched_agent",
+        "duplicate_candidates", "allow_duplicate", "submission_token"
     ]
     for key in keys_to_clear:
         if key in st.session_state:
             del st.session_state[key]
     st.rerun()
 
+@st.fragment
+def render_nearby_search():
+    with st.expander("📍 Find Nearby Listings", expanded=False):
+        near_col1, near_col2 = st.columns([3, 1])
+        with near_col1:
+            near_coordinates = st.text_input("Coordinates (lat, lng)", key="nearby_coordinates", placeholder="12.9716, 77.5946").strip()
+        with near_col2:
+            near_radius = st.number_input("Radius (km)", min_value=0.1, max_value=25.0, value=2.0, step=0.5, key="nearby_radius")
+        if st.button("🔎 Search Nearby", key="nearby_search"):
+            center = parse_coordinates(near_coordinates)
+            if not center:
+                st.error("Please enter coordinates as 'lat, lng'.")
+                return
+            with st.spinner("Searching nearby listings..."):
+                listings = nearby_listings(init_backends().listings, center["lat"], center["lng"], near_radius)
+            if not listings:
+                st.info(f"No listings within {near_radius} km.")
+                return
+            st.success(f"{len(listings)} listings within {near_radius} km")
+            st.dataframe([
+                {
+                    "Distance (km)": item["distanceKm"],
+                    "Property Id": item.get("propertyId", ""),
+                    "Property Name": item.get("propertyName", ""),
+                    "Configuration": item.get("configuration", ""),
+                    "Rent (Lakhs)": item.get("rentPerMonthInLakhs", ""),
+                    "Micromarket": item.get("micromarket", ""),
+                    "Status": item.get("inventoryStatus", ""),
+                    "Agent": item.get("agentName", ""),
+                }
+                for item in listings
+            ], use_container_width=True, hide_index=True)
+
+@st.fragment
+def render_text_search():
+    with st.expander("🔤 Search Amenities & Restrictions", expanded=False):
+        query = st.text_input("Search", key="text_search_query", placeholder="gym, no bachelors, pets allowed").strip()
+        if not query:
+            return
+        index = init_text_index()
+        if not index.ready.is_set():
+            st.info("Search index is still loading listings...")
+            return
+        started = time.perf_counter()
+        results = index.search(query, k=20)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if not results:
+            st.info(f"No listings match '{query}'.")
+            return
+        st.caption(f"Top {len(results)} of {len(index)} listings in {elapsed_ms:.1f} ms")
+        for score, item in results:
+            st.markdown(
+                f"**{item['propertyId']}** · {item['propertyName']} · {item['configuration']} · "
+                f"{item['micromarket']} · ₹{item['rentPerMonthInLakhs']}L · {item['inventoryStatus']} "
+                f"(score {score})"
+            )
+            for field, label in (("amenities", "Amenities"), ("restrictions", "Restrictions"), ("extraDetails", "Details")):
+                if item[field]:
+                    st.markdown(f"&nbsp;&nbsp;{label}: {highlight(item[field], query)}")
+
+@st.fragment
+def render_facet_filter():
+    with st.expander("🧮 Filter Listings", expanded=False):
+        index = init_facet_index()
+        if not index.ready.is_set():
+            st.info("Filter index is still loading listings...")
+            return
+        # Values of one facet are ORed, facets are ANDed; counts show what each choice would add
+        filters = {field: st.session_state.get(f"facet_{field}") or [] for field in FACETS}
+        result = index.query(filters)
+        facet_columns = st.columns(3)
+        for i, (field, label) in enumerate(FACETS.items()):
+            counts = result["counts"][field]
+            options = sorted(set(counts) | set(filters[field]), key=lambda value, c=counts: (-c.get(value, 0), value))
+            with facet_columns[i % 3]:
+                st.multiselect(label, options, key=f"facet_{field}",
+                               format_func=lambda value, c=counts: f"{value} ({c.get(value, 0)})")
+        st.caption(f"{result['total']} of {len(index)} listings in {result['elapsed_ms']:.1f} ms")
+        if result["listings"]:
+            st.dataframe([
+                {
+                    "Property Id": item["propertyId"],
+                    "Property Name": item["propertyName"],
+                    "Configuration": item["configuration"],
+                    "Rent (Lakhs)": item["rentPerMonthInLakhs"],
+                    "Micromarket": item["micromarket"],
+                    "Status": item["inventoryStatus"],
+                    "Agent": item["agentName"],
+                }
+                for item in result["listings"]
+            ], use_container_width=True, hide_index=True)
+
 # -------------------------------------
-# STREAMLIT APPLICATION (Inventory Submission UI)
+# FORM SECTIONS
 # -------------------------------------
-def main():
-    # Initialize services only when needed (lazy loading)
-    global db, bucket, gcs_client, gc, sheet, drive_service
-    st.title("🏠 Rental Inventory System")
-    
-    col1, col2 = st.columns([1, 4])
-    with col1:
-        if st.button("🔄 Clear Form", use_container_width=True):
-            clear_form_callback()
-    
-    # Layout with tabs for better organization
-    # tab1, tab2 = st.tabs(["📝 Submit New Inventory",""])
-    
-# with tab1:
-    # Initialize needed services for this tab
-    if db is None:
-        db, bucket, gcs_client = init_firebase()
-    if gc is None:
-        gc = init_gspread_client()
-        sheet = gc.open_by_key(GSPREAD_SHEET_ID).worksheet("Rental Inventories")
-        ensure_sheet_headers()
-    
-    # Create a multi-column layout
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        # st.markdown("<div class='form-section'>", unsafe_allow_html=True)
-        st.subheader("Agent Details")
-        agent_number = st.text_input("Agent Number (Phone Number)", key="agent_number", placeholder="+91XXXXXXXXXX").strip()
-        
-        agent_id_final = ""
-        agent_name_final = ""
-        
-        if st.button("🔍 Fetch Agent", key="fetch_agent_details"):
-            with st.spinner("Looking up agent..."):
-                a_id, a_name = fetch_agent_details(agent_number)
-                if a_id:
-                    st.markdown(f"<div class='success-message'>Agent Found: {a_name} (ID: {a_id})</div>", unsafe_allow_html=True)
-                    agent_id_final = a_id
-                    agent_name_final = a_name
-                else:
-                    st.markdown("<div class='error-message'>Agent not found.</div>", unsafe_allow_html=True)
-        st.markdown("</div>", unsafe_allow_html=True)
-        
-        # st.markdown("<div class='form-section'>", unsafe_allow_html=True)
-        st.subheader("Property Type & Location")
-        
-        # Initialize session_state for property_type if not already set
-        if "property_type" not in st.session_state:
-            st.session_state["property_type"] = ""
-        
-        property_type = st.selectbox("Property Type", 
-            ["", "Apartment", "Studio", "Duplex", "Triplex", "Villa", "Office Space", "Retail Space", "Commercial Property", "Villament", "Plot"],
-            key="property_type")
-        
-        
-        st.markdown("</div>", unsafe_allow_html=True)
-    
-    # with col2:
-        # st.markdown("<div class='form-section'>", unsafe_allow_html=True)
+# Fields whose widgets depend on other fields live in fragments, so a change
+# reruns only that section. Everything else is in one st.form and reaches the
+# server only on submit. Values are read back from session_state.
+@st.fragment
+def render_agent_section():
+    st.subheader("Agent Details")
+    agent_number = st.text_input("Agent Number (Phone Number)", key="agent_number", placeholder="+91XXXXXXXXXX").strip()
+    if st.button("🔍 Fetch Agent", key="fetch_agent_details"):
+        with st.spinner("Looking up agent..."):
+            a_id, a_name = fetch_agent_details(agent_number)
+        st.session_state["fetched_agent"] = {"number": agent_number, "id": a_id or "", "name": a_name or ""}
+    fetched = st.session_state.get("fetched_agent")
+    if fetched and fetched["number"] == agent_number:
+        if fetched["id"]:
+            st.markdown(f"<div class='success-message'>Agent Found: {fetched['name']} (ID: {fetched['id']})</div>", unsafe_allow_html=True)
+        else:
+            st.markdown("<div class='error-message'>Agent not found.</div>", unsafe_allow_html=True)
+
+@st.fragment
+def render_type_section():
+    st.subheader("Property Type & Configuration")
+    property_type = st.selectbox("Property Type", 
+        ["", "Apartment", "Studio", "Duplex", "Triplex", "Villa", "Office Space", "Retail Space", "Commercial Property", "Villament", "Plot"],
+        key="property_type")
+    # Configuration based on property type
+    if property_type.strip().lower() in ["apartment", "duplex", "triplex", "villa"]:
+        st.selectbox("Configuration", 
+                    ["", "1 BHK", "2 BHK", "2.5 BHK", "3 BHK", "3.5 BHK", "4 BHK", 
+                    "4.5 BHK", "5 BHK", "5.5 BHK", "6 BHK", "6.5 BHK", "7 BHK", 
+                    "7.5 BHK", "8 BHK", "8.5 BHK", "9 BHK", "9.5 BHK", "10 BHK"], 
+                    key="configuration")
+    elif property_type.strip().lower() == "studio":
+        st.info("Configuration auto-set as 'Studio'")
+    else:
+        st.text_input("Configuration", key="configuration", placeholder="Enter configuration details")
+
+@st.fragment
+def render_availability_section():
+    st.subheader("Availability & Floor")
+    avail_col1, avail_col2 = st.columns(2)
+    with avail_col1:
+        if st.checkbox("Ready to Move", key="ready_to_move"):
+            st.info("Property is available immediately")
+        else:
+            st.date_input("Available From", datetime.date.today(), key="available_from")
+    with avail_col2:
+        exact_floor = st.text_input("Exact Floor (numeric)", key="exact_floor", placeholder="e.g., 5").strip().replace("'", "")
+        if exact_floor:
+            st.info(f"Floor Range: {compute_floor_range(exact_floor)}")
+        else:
+            st.selectbox("Floor Range", 
+                        ["", "NA", "Ground Floor", "Lower Floor (1-5)", 
+                        "Middle Floor (6-10)", "Higher Floor (10+)", 
+                        "Higher Floor (20+)", "Top Floor"], 
+                        key="floor_range")
+
+@st.fragment
+def render_location_section():
+    st.subheader("Location")
+    micromarket_query = st.text_input("Search Micromarket", key="micromarket_query",
+                                      placeholder="e.g., HSR, Koramangla, E City").strip()
+    micromarket_options = all_micromarkets
+    if micromarket_query:
+        # Keep any current selection in the options so the widget does not reset
+        micromarket_options = list(dict.fromkeys(
+            st.session_state.get("micromarket", []) + search_micromarkets(micromarket_query)
+        ))
+        if not micromarket_options:
+            st.warning("No matching micromarket found.")
+    micromarket_selected = st.multiselect("Select Micromarket", options=micromarket_options, 
+                                        help="Search and select one micromarket", key="micromarket")
+    micromarket = micromarket_selected[0] if micromarket_selected else ""
+    area = find_area(micromarket) if micromarket else ""
+    if area:
+        st.info(f"Selected Area: {area}")
+
+    st.text_input("Map Location", key="mapLocation", placeholder="e.g., Koramangala 6th Block")
+    coordinates = st.text_input("Coordinates (lat, lng)", key="coordinates", placeholder="12.9716, 77.5946").strip().replace("'", "")
+    coord_geoloc = parse_coordinates(coordinates) if coordinates else None
+    if coord_geoloc:
+        suggestion = suggest_micromarket(coord_geoloc)
+        if not suggestion:
+            st.warning("Coordinates are not near any known micromarket. Please check the lat, lng order.")
+        elif not micromarket:
+            st.info(f"Suggested Micromarket: {suggestion[0]} ({suggestion[1]}), {suggestion[2]} km away")
+        else:
+            location_ok, location_km = check_micromarket(micromarket, coord_geoloc)
+            if not location_ok:
+                st.warning(
+                    f"Coordinates are {location_km} km from {micromarket}. "
+                    f"Nearest micromarket is {suggestion[0]} ({suggestion[1]})."
+                )
+
+def render_details_form() -> bool:
+    """The independent fields, media and the submit button; returns True when submitted."""
+    with st.form("listing_form", border=False):
         st.subheader("Basic Property Details")
-        property_name = st.text_input("Property Name", key="property_name", placeholder="Enter property name").strip().replace("'", "")
+        st.text_input("Property Name", key="property_name", placeholder="Enter property name")
         
         # Layout for property dimensions
         dim_col1, dim_col2 = st.columns(2)
         with dim_col1:
-            plot_size = st.text_input("Plot Size", key="plot_size", placeholder="e.g., 2400 sq.ft").strip().replace("'", "")
+            st.text_input("Plot Size", key="plot_size", placeholder="e.g., 2400 sq.ft")
         with dim_col2:
-            SBUA = st.text_input("SBUA", key="SBUA", placeholder="e.g., 1800 sq.ft").strip().replace("'", "")
+            st.text_input("SBUA", key="SBUA", placeholder="e.g., 1800 sq.ft")
         
         # Layout for financial details
         fin_col1, fin_col2, fin_col3 = st.columns(3)
         with fin_col1:
-            rent_per_month = st.text_input("Rent Per Month (Lakhs)", key="rent_per_month", placeholder="e.g., 1.5").strip().replace("'", "")
+            st.text_input("Rent Per Month (Lakhs)", key="rent_per_month", placeholder="e.g., 1.5")
         with fin_col2:
-            commission_type = st.selectbox("Commission Type", ["NA", "Side by Side", "Single Side Commission Split"], key="commission_type")
+            st.selectbox("Commission Type", ["NA", "Side by Side", "Single Side Commission Split"], key="commission_type")
         with fin_col3:
-            security_deposit = st.text_input("Security Deposit", key="security_deposit", placeholder="e.g., 3 months rent").strip().replace("'", "")
-            
-        maintenance_charges = st.selectbox("Maintenance Charges", ["", "Included", "Not included"], key="maintenance_charges")
-        st.markdown("</div>", unsafe_allow_html=True)
+            st.text_input("Security Deposit", key="security_deposit", placeholder="e.g., 3 months rent")
+        st.selectbox("Maintenance Charges", ["", "Included", "Not included"], key="maintenance_charges")
         
-        # st.markdown("<div class='form-section'>", unsafe_allow_html=True)
-        st.subheader("Property Configuration")
-        # Configuration based on property type
-        if property_type.strip().lower() in ["apartment", "duplex", "triplex", "villa"]:
-            configuration = st.selectbox("Configuration", 
-                                        ["", "1 BHK", "2 BHK", "2.5 BHK", "3 BHK", "3.5 BHK", "4 BHK", 
-                                        "4.5 BHK", "5 BHK", "5.5 BHK", "6 BHK", "6.5 BHK", "7 BHK", 
-                                        "7.5 BHK", "8 BHK", "8.5 BHK", "9 BHK", "9.5 BHK", "10 BHK"], 
-                                        key="configuration")
-        elif property_type.strip().lower() == "studio":
-            configuration = "Studio"
-            st.info("Configuration auto-set as 'Studio'")
-        else:
-            configuration = st.text_input("Configuration", key="configuration", placeholder="Enter configuration details").strip().replace("'", "")
-            
         # Layout for property features
         feat_col1, feat_col2 = st.columns(2)
         with feat_col1:
-            facing = st.selectbox("Facing", 
-                                ["", "East", "North", "West", "South", 
-                                    "North-East", "North-West", "South-East", "South-West"], 
-                                key="facing")
+            st.selectbox("Facing", 
+                        ["", "East", "North", "West", "South", 
+                        "North-East", "North-West", "South-East", "South-West"], 
+                        key="facing")
         with feat_col2:
-            furnishing_status = st.selectbox("Furnishing Status", 
-                                            ["", "Fully Furnished", "Semi Furnished", "Warm Shell", 
-                                            "Bare Shell", "Plug & Play"], 
-                                            key="furnishing_status")
-        
-        st.markdown("</div>", unsafe_allow_html=True)
-    
-    # Create expanded sections for additional details
-    # with st.expander("📅 Availability & Lease Details", expanded=False):
-        # st.markdown("<div class='form-section'>", unsafe_allow_html=True)
-        avail_col1, avail_col2 = st.columns(2)
-        
-        with avail_col1:
-            st.markdown("<div style='margin-top: 44px;'>", unsafe_allow_html=True)
-            ready_to_move = st.checkbox("Ready to Move", key="ready_to_move")
-            if ready_to_move:
-                available_from_val = "Ready-to-move"
-                st.info("Property is available immediately")
-            else:
-                available_from_date = st.date_input("Available From", datetime.date.today(), key="available_from")
-                available_from_val = available_from_date.strftime("%Y-%m-%d")
-        
-        with avail_col2:
-            exact_floor = st.text_input("Exact Floor (numeric)", key="exact_floor", placeholder="e.g., 5").strip().replace("'", "")
-            if exact_floor:
-                computed_floor_range = compute_floor_range(exact_floor)
-                st.info(f"Floor Range: {computed_floor_range}")
-                floor_range = computed_floor_range
-            else:
-                floor_range = st.selectbox("Floor Range", 
-                                       ["", "NA", "Ground Floor", "Lower Floor (1-5)", 
-                                        "Middle Floor (6-10)", "Higher Floor (10+)", 
-                                        "Higher Floor (20+)", "Top Floor"], 
-                                       key="floor_range")
+            st.selectbox("Furnishing Status", 
+                        ["", "Fully Furnished", "Semi Furnished", "Warm Shell", 
+                        "Bare Shell", "Plug & Play"], 
+                        key="furnishing_status")
         
         lease_col1, lease_col2 = st.columns(2)
         with lease_col1:
-            lease_period = st.text_input("Lease Period", key="lease_period", placeholder="e.g., 11 months").strip().replace("'", "")
+            st.text_input("Lease Period", key="lease_period", placeholder="e.g., 11 months")
         with lease_col2:
-            lock_in_period = st.text_input("Lock-in Period", key="lock_in_period", placeholder="e.g., 6 months").strip().replace("'", "")
-        st.markdown("</div>", unsafe_allow_html=True)
-    
-    # with st.expander("🏠 Property Features & Restrictions", expanded=False):
-        # st.markdown("<div class='form-section'>", unsafe_allow_html=True)
-        amenities = st.text_input("Amenities", key="amenities", placeholder="e.g., Swimming pool, Gym, Club house").strip().replace("'", "")
-        extra_details = st.text_area("Extra details", key="extra_details", placeholder="Any additional information about the property").strip().replace("'", "")
-        restrictions = st.text_area("Restrictions", key="restrictions", placeholder="Any restrictions for tenants").strip().replace("'", "")
+            st.text_input("Lock-in Period", key="lock_in_period", placeholder="e.g., 6 months")
+        
+        st.text_input("Amenities", key="amenities", placeholder="e.g., Swimming pool, Gym, Club house")
+        st.text_area("Extra details", key="extra_details", placeholder="Any additional information about the property")
+        st.text_area("Restrictions", key="restrictions", placeholder="Any restrictions for tenants")
         
         rest_col1, rest_col2 = st.columns(2)
         with rest_col1:
-            veg_non_veg = st.selectbox("Veg/Non Veg", ["", "Veg Only", "Both"], key="veg_non_veg")
+            st.selectbox("Veg/Non Veg", ["", "Veg Only", "Both"], key="veg_non_veg")
         with rest_col2:
-            pet_friendly = st.selectbox("Pet friendly", ["", "Yes", "No", "Conditional"], key="pet_friendly")
+            st.selectbox("Pet friendly", ["", "Yes", "No", "Conditional"], key="pet_friendly")
         
-        # Property location details
-        micromarket_selected = st.multiselect("Select Micromarket", options=all_micromarkets, 
-                                            help="Search and select one micromarket", key="micromarket")
-        micromarket = micromarket_selected[0] if micromarket_selected else ""
-        area = find_area(micromarket) if micromarket else ""
+        st.subheader("Media")
+        st.file_uploader("Upload Photos", 
+                        type=["jpg", "jpeg", "png"], 
+                        accept_multiple_files=True, 
+                        key="photos_files",
+                        help="Upload property photos (JPG, PNG)")
+        st.file_uploader("Upload Videos", 
+                        type=["mp4", "mov", "avi"], 
+                        accept_multiple_files=True, 
+                        key="videos_files",
+                        help="Upload property videos (MP4, MOV, AVI)")
+        st.file_uploader("Upload Documents", 
+                        type=["pdf", "doc", "docx"], 
+                        accept_multiple_files=True, 
+                        key="documents_files",
+                        help="Upload property documents (PDF, DOC, DOCX)")
         
-        if area:
-            st.info(f"Selected Area: {area}")
-            
-        mapLocation = st.text_input("Map Location", key="mapLocation", placeholder="e.g., Koramangala 6th Block").strip().replace("'", "")
-        coordinates = st.text_input("Coordinates (lat, lng)", key="coordinates", placeholder="12.9716, 77.5946").strip().replace("'", "")
-        st.markdown("</div>", unsafe_allow_html=True)
+        submitted = st.form_submit_button("📝 SUBMIT INVENTORY", use_container_width=True)
+    return submitted
+
+def collect_form_fields() -> dict:
+    """Listing fields from the widget state of the sections and the form."""
+    state = st.session_state
+    available_from = state.get("available_from") or datetime.date.today()
+    micromarket_selected = state.get("micromarket") or []
+    return clean_listing_fields({
+        "propertyName": state.get("property_name"),
+        "propertyType": state.get("property_type"),
+        "plotSize": state.get("plot_size"),
+        "SBUA": state.get("SBUA"),
+        "rentPerMonthInLakhs": state.get("rent_per_month"),
+        "commissionType": state.get("commission_type"),
+        "maintenanceCharges": state.get("maintenance_charges"),
+        "securityDeposit": state.get("security_deposit"),
+        "configuration": state.get("configuration"),
+        "facing": state.get("facing"),
+        "furnishingStatus": state.get("furnishing_status"),
+        "micromarket": micromarket_selected[0] if micromarket_selected else "",
+        "availableFrom": "Ready-to-move" if state.get("ready_to_move") else available_from.strftime("%Y-%m-%d"),
+        "floorNumber": state.get("floor_range"),
+        "exactFloor": state.get("exact_floor"),
+        "leasePeriod": state.get("lease_period"),
+        "lockInPeriod": state.get("lock_in_period"),
+        "amenities": state.get("amenities"),
+        "extraDetails": state.get("extra_details"),
+        "restrictions": state.get("restrictions"),
+        "vegNonVeg": state.get("veg_non_veg"),
+        "petFriendly": state.get("pet_friendly"),
+        "mapLocation": state.get("mapLocation"),
+        "coordinates": state.get("coordinates"),
+        "agentNumber": state.get("agent_number"),
+    })
+
+def handle_submission(submission_token: str):
+    fields = collect_form_fields()
+    photos_files = st.session_state.get("photos_files") or []
+    videos_files = st.session_state.get("videos_files") or []
+    documents_files = st.session_state.get("documents_files") or []
     
-    # with st.expander("📸 Media Uploads", expanded=False):
-        # st.markdown("<div class='form-section'>", unsafe_allow_html=True)
-        photos_files = st.file_uploader("Upload Photos", 
-                                    type=["jpg", "jpeg", "png"], 
-                                    accept_multiple_files=True, 
-                                    key="photos_files",
-                                    help="Upload property photos (JPG, PNG)")
-        
-        if photos_files:
-            st.success(f"{len(photos_files)} photos selected")
-            
-        videos_files = st.file_uploader("Upload Videos", 
-                                    type=["mp4", "mov", "avi"], 
-                                    accept_multiple_files=True, 
-                                    key="videos_files",
-                                    help="Upload property videos (MP4, MOV, AVI)")
-        
-        if videos_files:
-            st.success(f"{len(videos_files)} videos selected")
-            
-        documents_files = st.file_uploader("Upload Documents", 
-                                        type=["pdf", "doc", "docx"], 
-                                        accept_multiple_files=True, 
-                                        key="documents_files",
-                                        help="Upload property documents (PDF, DOC, DOCX)")
-        
-        if documents_files:
-            st.success(f"{len(documents_files)} documents selected")
-        st.markdown("</div>", unsafe_allow_html=True)
+    # Validate required fields
+    missing_fields = missing_listing_fields(fields)
+    if missing_fields:
+        st.markdown(f"<div class='error-message'>Please fill in the following required fields: {', '.join(missing_fields)}</div>", unsafe_allow_html=True)
+        return
+    if journal_entry := init_journal().find_submission(submission_token):
+        # Replay of a form that was already submitted: report it instead of redoing any work
+        st.markdown(f"""
+        <div class='success-message'>
+            <h3>✅ Already Submitted: Property ID {journal_entry['property_id']}</h3>
+            <p>Current status: {journal_entry['status']}. Click "Add Another Property" or "Clear Form" to start a new listing.</p>
+        </div>
+        """, unsafe_allow_html=True)
+        if st.button("Add Another Property"):
+            clear_form_callback()
+        return
     
-    # Add a submit button with a clear visual style
-    # st.markdown("<div class='form-section'>", unsafe_allow_html=True)
-    submit_col1, submit_col2 = st.columns([1, 1])
-    # if st.button():
-    #     if not property_name:
-    #         st.error("Property Name is required!")
-    #         return
-    with submit_col1:
-        submit_button = st.button("📝 SUBMIT INVENTORY", use_container_width=True)
-    st.markdown("</div>", unsafe_allow_html=True)
+    # Check for an existing listing of the same flat before any upload
+    with span("duplicate_check"):
+        duplicate_index = init_duplicate_index()
+        duplicate_index.ready.wait(timeout=10)
+        duplicates = duplicate_index.find_candidates({**fields, "_geoloc": parse_coordinates(fields["coordinates"])})
+    if duplicates and not st.session_state.get("allow_duplicate"):
+        st.session_state["duplicate_candidates"] = [d["propertyId"] for d in duplicates]
+        duplicate_rows = "".join(
+            f"<li>{d['propertyId']}: {d['propertyName']}, {d['configuration']}, "
+            f"floor {d['exactFloor'] or 'NA'}, {d['micromarket']} (by {d['agentName'] or 'unknown agent'})</li>"
+            for d in duplicates
+        )
+        st.markdown(f"""
+        <div class='warning-message'>
+            <h3>⚠️ Possible Duplicate Listing</h3>
+            <ul>{duplicate_rows}</ul>
+            <p>Tick "Not a duplicate, submit anyway" and submit again if this is a different flat.</p>
+        </div>
+        """, unsafe_allow_html=True)
+        return
     
-    # Process form submission
-    if submit_button:
-        # Create a container for submission progress
-        if not property_type:
-            st.error("Property Type is required!")
-            return
-        if not rent_per_month:
-            st.error("Rent Per Month is required!")
-            return
-        submission_container = st.empty()
-        with submission_container.container():
-            # Validate required fields
-            required_fields = {
-                "Property Name": property_name,
-                "Property Type": property_type,
-                "Agent Number": agent_number,
-                "Micromarket": micromarket
-            }
-            
-            missing_fields = [field for field, value in required_fields.items() if not value]
-            
-            if missing_fields:
-                st.markdown(f"<div class='error-message'>Please fill in the following required fields: {', '.join(missing_fields)}</div>", unsafe_allow_html=True)
-            else:
-                # Create progress tracking
-                # progress_bar = st.progress(0, text="Starting submission process...")
-                
-                # Step 1: Initialize property ID (10%)
-                # progress_bar.progress(0.1, text="Generating property ID...")
-                property_id = generate_property_id()
-                st.info(f"Property ID: {property_id}")
-                time.sleep(0.5)  # Small delay for UI feedback
-                
-                # Step 2: Create Drive folder (20%)
-                # progress_bar.progress(0.2, text="Creating Drive folder...")
-                if drive_service is None:
-                    drive_service = init_drive_service()
-                if  photos_files or videos_files or documents_files:
-                    prop_drive_folder_id = create_drive_folder(property_id, PARENT_FOLDER_ID)
-                    drive_main_link = f"https://drive.google.com/drive/folders/{prop_drive_folder_id}" if prop_drive_folder_id else ""
-                    if drive_main_link:
-                        st.info(f"Drive Folder: [Open Folder]({drive_main_link})")
-                else:
-                    prop_drive_folder_id = ""
-                    drive_main_link = ""
-                # progress_bar.progress(0.3, text="Drive folder created")
-                
-                # Step 3: Fetch agent details if not already fetched (40%)
-                # progress_bar.progress(0.4, text="Verifying agent details...")
-                if not agent_id_final or not agent_name_final:
-                    agent_id_final, agent_name_final = fetch_agent_details(agent_number)
-                    agent_id_final = agent_id_final or ""
-                    agent_name_final = agent_name_final or ""
-                
-                # Step 4: Prepare basic data (50%)
-                # progress_bar.progress(0.5, text="Preparing property data...")
-                now = datetime.datetime.now()
-                timestamp = int(now.timestamp())
-                geoloc = parse_coordinates(coordinates)
-                
-                # Step 5: Upload media files (60-80%)
-                # progress_bar.progress(0.6, text="Uploading media files...")
-                
-                # Create a placeholder for the file upload progress
-                upload_progress = st.empty()
-                
-                # Process media uploads concurrently with separate progress tracking
-                photos_urls, photos_drive_links = process_files_concurrent(
-                        photos_files, property_id, "photos", prop_drive_folder_id, upload_progress
-                    )
-                videos_urls, videos_drive_links = process_files_concurrent(
-                        videos_files, property_id, "videos", prop_drive_folder_id, upload_progress
-                    )
-                documents_urls, documents_drive_links = process_files_concurrent(
-                        documents_files, property_id, "documents", prop_drive_folder_id, upload_progress
-                    )
-                drive_file_links = photos_drive_links + videos_drive_links + documents_drive_links
-                
-                # Step 6: Prepare property data dictionary (90%)
-                # progress_bar.progress(0.9, text="Saving property data...")
-                
-                # Prepare property data dictionary
-                property_data = {
-                    "propertyId": property_id,
-                    "propertyName": property_name,
-                    "propertyType": property_type,
-                    "plotSize": plot_size,
-                    "SBUA": SBUA,
-                    "rentPerMonthInLakhs": rent_per_month,
-                    "commissionType": commission_type,
-                    "maintenanceCharges": maintenance_charges,
-                    "securityDeposit": security_deposit,
-                    "configuration": configuration,
-                    "facing": facing,
-                    "furnishingStatus": furnishing_status,
-                    "micromarket": micromarket,
-                    "area": area,
-                    "availableFrom": available_from_val,
-                    "floorNumber": floor_range,
-                    "exactFloor": exact_floor,
-                    "leasePeriod": lease_period,
-                    "lockInPeriod": lock_in_period,
-                    "amenities": amenities,
-                    "extraDetails": extra_details,
-                    "restrictions": restrictions,
-                    "vegNonVeg": veg_non_veg,
-                    "petFriendly": pet_friendly,
-                    "mapLocation": mapLocation,
-                    "coordinates": coordinates,
-                    "_geoloc": geoloc,
-                    "dateOfInventoryAdded": timestamp,
-                    "dateOfStatusLastChecked": timestamp,
-                    "agentId": agent_id_final,
-                    "agentNumber": standardize_phone_number(agent_number),
-                    "agentName": agent_name_final,
-                    "driveLink": drive_main_link,
-                    "photos": photos_urls,
-                    "videos": videos_urls,
-                    "documents": documents_urls,
-                    "driveFileLinks": drive_file_links,
-                    "inventoryStatus": "Available"  # Default status for new listings
-                }
-                
-                # Prepare row for Google Sheets
-                sheet_agent_number = strip_plus91(agent_number)
-                sheet_row = [
-                    property_id,
-                    property_name,
-                    property_type,
-                    plot_size,
-                    SBUA,
-                    rent_per_month,
-                    commission_type,
-                    maintenance_charges,
-                    security_deposit,
-                    configuration,
-                    facing,
-                    furnishing_status,
-                    micromarket,
-                    area,
-                    available_from_val,
-                    floor_range,
-                    "Available",  # Default for Inventory Status column
-                    lease_period,
-                    lock_in_period,
-                    amenities,
-                    extra_details,
-                    restrictions,
-                    veg_non_veg,
-                    pet_friendly,
-                    drive_main_link,
-                    mapLocation,
-                    coordinates,
-                    now.strftime("%Y-%m-%d"),
-                    now.strftime("%Y-%m-%d"),
-                    agent_id_final,
-                    sheet_agent_number,
-                    agent_name_final,
-                    exact_floor
-                ]
-                
-                # Step 7: Save to Firebase and Google Sheets (100%)
-                firebase_success = False
-                sheet_success = False
-                
-                try:
-                    db.collection("rental-inventories").document(property_id).set(property_data)
-                    firebase_success = True
-                except Exception as e:
-                    st.error(f"Error saving data to Firebase: {e}")
-                    logger.error(f"Firebase error: {e}")
-                
-                try:
-                    sheet_success = append_to_google_sheet(sheet_row)
-                except Exception as e:
-                    st.error(f"Error appending data to Google Sheet: {e}")
-                    logger.error(f"Sheet error: {e}")
-                
-                # Final progress update
-                # progress_bar.progress(1.0, text="Submission complete!")
-                
-                # Show success or error message
-                if firebase_success and sheet_success:
-                    st.markdown("""
-                    <div class='success-message'>
-                        <h3>✅ Submission Successful!</h3>
-                        <p>Property has been added to both Firebase and Google Sheets.</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Show property summary
-                    with st.expander("View Property Summary", expanded=True):
-                        summary_col1, summary_col2 = st.columns(2)
-                        with summary_col1:
-                            st.write("**Property ID:**", property_id)
-                            st.write("**Property Name:**", property_name)
-                            st.write("**Property Type:**", property_type)
-                            st.write("**Location:**", micromarket)
-                            st.write("**Configuration:**", configuration)
-                        with summary_col2:
-                            st.write("**Rent:**", f"₹{rent_per_month} Lakhs/month")
-                            st.write("**Agent:**", agent_name_final)
-                            st.write("**Floor:**", floor_range)
-                            st.write("**Availability:**", available_from_val)
-                            if drive_main_link:
-                                st.write("**Drive Link:**", f"[Open Folder]({drive_main_link})")
-                    
-                    # Add a button to add another property
-                    if st.button("Add Another Property"):
-                        clear_form_callback()
-                else:
-                    # Show appropriate error message
-                    error_message = []
-                    if not firebase_success:
-                        error_message.append("Firebase database")
-                    if not sheet_success:
-                        error_message.append("Google Sheets")
-                        
-                    st.markdown(f"""
-                    <div class='error-message'>
-                        <h3>⚠️ Partial Submission</h3>
-                        <p>There was an issue saving to {' and '.join(error_message)}.</p>
-                        <p>Please check the logs or contact support for assistance.</p>
-                    </div>
-                    """, unsafe_allow_html=True)
+    # Perceptual hashes of the photos, checked against photos of every other listing
+    with span("photo_hash", photos=len(photos_files)):
+        photo_hashes = hash_photos(photos_files)
+        reused_photos = {}
+        if photo_hashes:
+            photo_index = init_photo_index()
+            photo_index.ready.wait(timeout=10)
+            reused_photos = find_reused_photos(photo_index, photo_hashes)
+    if reused_photos:
+        reused_rows = "".join(
+            f"<li>Photo {i + 1} ({photos_files[i].name}): also in {', '.join(pids)}</li>" for i, pids in reused_photos.items()
+        )
+        st.markdown(f"<div class='warning-message'><b>Photos already used in other listings</b><ul>{reused_rows}</ul></div>", unsafe_allow_html=True)
     
+    # Journal the submission; uploads and saving continue in the background
+    media = [
+        (folder, file.name, file.getvalue())
+        for folder, files in (("photos", photos_files), ("videos", videos_files), ("documents", documents_files))
+        for file in files
+    ]
+    fetched = st.session_state.get("fetched_agent") or {}
+    agent_known = fetched.get("number") == fields["agentNumber"]
+    try:
+        property_id, property_data = submit_listing(
+            init_journal(), fields, media, token=submission_token,
+            agent_id=fetched.get("id", "") if agent_known else "",
+            agent_name=fetched.get("name", "") if agent_known else "",
+            photo_hashes=photo_hashes,
+        )
+    except Exception as e:
+        st.error(f"Error saving submission: {e}")
+        logger.error(f"Journal error: {e}")
+        return
+    
+    st.markdown(f"""
+    <div class='success-message'>
+        <h3>✅ Submission Received! Property ID: {property_id}</h3>
+        <p>Media uploads and saving to Firebase and Google Sheets continue in the background.
+        You can add the next property now.</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Show property summary
+    with st.expander("View Property Summary", expanded=True):
+        summary_col1, summary_col2 = st.columns(2)
+        with summary_col1:
+            st.write("**Property ID:**", property_id)
+            st.write("**Property Name:**", fields["propertyName"])
+            st.write("**Property Type:**", fields["propertyType"])
+            st.write("**Location:**", fields["micromarket"])
+            st.write("**Configuration:**", fields["configuration"])
+        with summary_col2:
+            st.write("**Rent:**", f"₹{fields['rentPerMonthInLakhs']} Lakhs/month")
+            st.write("**Agent:**", property_data["agentName"])
+            st.write("**Floor:**", fields["floorNumber"])
+            st.write("**Availability:**", fields["availableFrom"])
+            st.write("**Media Files:**", len(media))
+    
+    # Add a button to add another property
+    if st.button("Add Another Property"):
+        clear_form_callback()
+
+# -------------------------------------
+# STREAMLIT APPLICATION (Inventory Submission UI)
+# -------------------------------------
+def main():
+    # Full reruns happen on load, on submit and on the buttons outside the
+    # sections; edits inside a section or the form do not come through here.
+    start_exporter()
+    st.title("🏠 Rental Inventory System")
+    
+    # One token per form instance; every pipeline step is keyed on it so reruns and double clicks are no-ops
+    if "submission_token" not in st.session_state:
+        st.session_state["submission_token"] = uuid.uuid4().hex
+    submission_token = st.session_state["submission_token"]
+    
+    col1, col2 = st.columns([1, 4])
+    with col1:
+        if st.button("🔄 Clear Form", use_container_width=True):
+            clear_form_callback()
+    
+    # Initialize needed services
+    init_backends()
+    ensure_sheet_headers()
+    
+    render_submission_queue(init_journal())
+    init_sheet_projector()
+    init_sheet_sync()
+    render_nearby_search()
+    render_text_search()
+    render_facet_filter()
+    render_trace_summary()
+    
+    # Create a multi-column layout
+    col1, col2 = st.columns(2)
+    with col1:
+        render_agent_section()
+        render_type_section()
+    with col2:
+        render_availability_section()
+        render_location_section()
+    
+    if render_details_form():
+        handle_submission(submission_token)
+    # Outside the form so ticking it is remembered before the next submit
+    if st.session_state.get("duplicate_candidates"):
+        st.checkbox("Not a duplicate, submit anyway", key="allow_duplicate")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if profiling_enabled():
+        with profile_rerun():
+            main()
+        # Rendered after the profiled block so the panel includes the rerun that just finished
+        render_profile_sidebar()
+    else:
+        main()
\ No newline at end of file
@@ -1,5 +1,7 @@
 import os
 import datetime
+import time
+import uuid
 from io import BytesIO
 import streamlit as st
 from dotenv import load_dotenv
@@ -13,9 +15,12 @@ import gspread
 from google.oauth2.service_account import Credentials as GSpreadCredentials
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseUpload
+from http_transport import pooled_session, SessionHttp
+from metrics import instrument_session, metered, start_exporter
 
 # Google Cloud Storage (for Firebase Storage)
 from google.cloud import storage as gcs
+from google.api_core.exceptions import Conflict
 
 # Import area data
 from area_data import areasData, all_micromarkets, find_area
@@ -103,6 +108,9 @@ if not firebase_admin._apps:
 db = firestore.client()
 bucket = storage.bucket()
 gcs_client = gcs.Client.from_service_account_info(firebase_sa_info)
+instrument_session(bucket.client._http, "storage")
+instrument_session(gcs_client._http, "storage")
+start_exporter()
 
 # -------------------------------------
 # Setup Google Sheets
@@ -112,7 +120,7 @@ SCOPES = [
     "https://www.googleapis.com/auth/drive",
 ]
 gs_creds = GSpreadCredentials.from_service_account_info(gspread_sa_info, scopes=SCOPES)
-gc = gspread.authorize(gs_creds)
+gc = gspread.Client(auth=gs_creds, session=pooled_session(gs_creds))
 sheet = gc.open_by_key(GSPREAD_SHEET_ID).worksheet("Sheet1")
 
 def ensure_sheet_headers():
@@ -140,7 +148,7 @@ ensure_sheet_headers()
 # Setup Google Drive API
 # -------------------------------------
 drive_creds = GSpreadCredentials.from_service_account_info(google_drive_sa_info, scopes=SCOPES)
-drive_service = build("drive", "v3", credentials=drive_creds)
+drive_service = build("drive", "v3", http=SessionHttp(pooled_session(drive_creds)), cache_discovery=False)
 
 def parse_coordinates(coord_str: str):
     try:
@@ -162,7 +170,8 @@ def standardize_phone_number(num: str) -> str:
 
 def fetch_agent_details(agent_number: str):
     agent_number = standardize_phone_number(agent_number)
-    docs = db.collection("agents").where("phonenumber", "==", agent_number).limit(1).stream()
+    with metered("firestore", "find_agent"):
+        docs = list(db.collection("agents").where("phonenumber", "==", agent_number).limit(1).stream())
     for doc in docs:
         data = doc.to_dict()
         return data.get("cpId"), data.get("name")
@@ -173,7 +182,8 @@ def generate_property_id():
     Generates a new property ID by finding the highest numeric value among existing
     property IDs and incrementing it by one.
     """
-    docs = list(db.collection("rental-inventories").stream())
+    with metered("firestore", "stream"):
+        docs = list(db.collection("rental-inventories").stream())
     max_id = 0
     for doc in docs:
         pid = doc.get("propertyId")
@@ -185,7 +195,23 @@ def generate_property_id():
             except:
                 pass
     new_id = max_id + 1
-    return f"RN{new_id:03d}"
+    return claim_property_id(new_id)
+
+def claim_property_id(number: int) -> str:
+    """
+    Reserves RN<number> (or the next free number) in Firestore, so that no other
+    session or app instance is handed the same property ID.
+    """
+    owner = uuid.uuid4().hex
+    while True:
+        property_id = f"RN{number:03d}"
+        try:
+            # Whoever creates the reservation document first owns the ID
+            with metered("firestore", "create"):
+                db.collection("rental-inventory-ids").document(property_id).create({"owner": owner, "createdAt": time.time()})
+            return property_id
+        except Conflict:
+            number += 1
 
 def upload_media_to_firebase(property_id: str, file_obj: BytesIO, folder: str, filename: str) -> str:
     path = f"rental-media-files/{property_id}/{folder}/{filename}"
@@ -461,7 +487,9 @@ if submitted:
     }
     
     try:
-        db.collection("rental-inventories").document(property_id).set(property_data)
+        # create() fails rather than overwrite another agent's listing
+        with metered("firestore", "create"):
+            db.collection("rental-inventories").document(property_id).create(property_data)
         st.success("Property saved to Firebase!")
     except Exception as e:
         st.error(f"Error saving to Firebase: {e}")
@@ -597,7 +625,9 @@ if submitted:
     }
     
     try:
-        db.collection("rental-inventories").document(property_id).set(property_data)
+        # create() fails rather than overwrite another agent's listing
+        with metered("firestore", "create"):
+            db.collection("rental-inventories").document(property_id).create(property_data)
         st.success("Property saved to Firebase!")
     except Exception as e:
         st.error(f"Error saving to Firebase: {e}")
@@ -0,0 +1,161 @@
+# rerun_profiler.py
+
+import contextlib
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+from shared_cache import cache_stats
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------------
+# Configuration
+# -------------------------------------
+# Opt-in: PROFILE_RERUNS=1 (or ?profile=1 in rent.py) profiles every script rerun.
+# Records stay in a rolling in-process window; with PROFILE_DIR set, each rerun's
+# summary (JSON) and raw stats (.prof, for snakeviz/pstats) are also written there.
+PROFILE_RERUNS = os.getenv("PROFILE_RERUNS", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")
+PROFILE_WINDOW = int(os.getenv("PROFILE_WINDOW", "20"))
+TOP_FUNCTIONS = 15
+TOP_ALLOCATIONS = 10
+TRACEMALLOC_FRAMES = 5
+
+_window = deque(maxlen=PROFILE_WINDOW)
+_window_lock = threading.Lock()
+_profile_lock = threading.Lock()     # held by the one rerun being profiled
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+
+
+def _start_tracemalloc():
+    # Overlapping reruns share one tracemalloc session; it stops when the last one ends
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            _tracemalloc_owned = True
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+
+def _top_functions(profiler: cProfile.Profile, limit: int = TOP_FUNCTIONS) -> list:
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, func), (cc, nc, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{line}({func})",
+            "calls": nc,
+            "self_ms": round(tottime * 1000, 2),
+            "cumulative_ms": round(cumtime * 1000, 2),
+        })
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:limit]
+
+
+def _memory_deltas(before, after, limit: int = TOP_ALLOCATIONS) -> list:
+    rows = []
+    for stat in after.compare_to(before, "lineno")[:limit]:
+        frame = stat.traceback[0]
+        rows.append({
+            "location": f"{os.path.basename(frame.filename)}:{frame.lineno}",
+            "size_delta_kb": round(stat.size_diff / 1024, 1),
+            "count_delta": stat.count_diff,
+        })
+    return rows
+
+
+# -------------------------------------
+# Profiling
+# -------------------------------------
+@contextlib.contextmanager
+def profile_rerun(label: str = "rerun", enabled: bool = PROFILE_RERUNS):
+    """Profiles the enclosed script run with cProfile and tracemalloc and records the result.
+
+    Only one rerun per process is profiled at a time (Python 3.12+ refuses a
+    second active profiler); reruns starting meanwhile run unprofiled.
+    tracemalloc is process-wide, so reruns of other sessions overlapping this one
+    show up in its memory deltas.
+    """
+    if not enabled or not _profile_lock.acquire(blocking=False):
+        yield
+        return
+    try:
+        with _profiled(label):
+            yield
+    finally:
+        _profile_lock.release()
+
+
+@contextlib.contextmanager
+def _profiled(label: str):
+    cache_before = dict(cache_stats)
+    _start_tracemalloc()
+    tracemalloc.reset_peak()
+    snapshot_before = tracemalloc.take_snapshot()
+    profiler = cProfile.Profile()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        wall_ms = (time.perf_counter() - wall_start) * 1000
+        cpu_ms = (time.process_time() - cpu_start) * 1000
+        snapshot_after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        _stop_tracemalloc()
+        cache_misses = {
+            ns: count - cache_before.get((ns, kind), 0)
+            for (ns, kind), count in cache_stats.items()
+            if kind == "miss" and count > cache_before.get((ns, kind), 0)
+        }
+        record = {
+            "label": label,
+            "timestamp": time.time(),
+            "wall_ms": round(wall_ms, 1),
+            "cpu_ms": round(cpu_ms, 1),
+            "peak_memory_kb": round(peak / 1024, 1),
+            "cache_misses": cache_misses,
+            "top_functions": _top_functions(profiler),
+            "memory_deltas": _memory_deltas(snapshot_before, snapshot_after),
+        }
+        with _window_lock:
+            _window.append(record)
+        if PROFILE_DIR:
+            _dump(record, profiler)
+
+
+def _dump(record: dict, profiler: cProfile.Profile):
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stem = os.path.join(PROFILE_DIR, f"{record['label']}-{int(record['timestamp'] * 1000)}")
+        profiler.dump_stats(stem + ".prof")
+        with open(stem + ".json", "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2)
+    except OSError as e:
+        logger.error(f"Profile dump error: {e}")
+
+
+def recent_profiles() -> list:
+    """Most recent rerun records, newest first."""
+    with _window_lock:
+        return list(reversed(_window))
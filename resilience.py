@@ -0,0 +1,355 @@
+# resilience.py
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from backends import Backends, BackendError, RateLimitError
+from metrics import is_rate_limited, record_retry, registry
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------------
+# Configuration
+# -------------------------------------
+# Every backend call goes through call() (call_async() for the coroutine
+# methods): a circuit breaker per service, a deadline per attempt, retries with
+# full-jitter backoff for errors that can succeed on retry, and (for idempotent
+# reads) a hedged second request when the first one is slower than usual.
+# resilient_backends() applies POLICIES to the four backend objects.
+RESILIENCE_ENABLED = os.getenv("RESILIENCE_ENABLED", "1") == "1"
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))           # consecutive failures that open a breaker
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))        # seconds open before one trial call
+RETRY_BASE = float(os.getenv("RETRY_BASE", "0.5"))
+RETRY_MAX = float(os.getenv("RETRY_MAX", "8"))
+CALL_THREADS = int(os.getenv("RESILIENCE_THREADS", "256"))    # calls run here so a deadline can be enforced
+
+class DeadlineExceeded(BackendError):
+    pass
+
+
+class CircuitOpenError(BackendError):
+    pass
+
+
+# -------------------------------------
+# Error Classes
+# -------------------------------------
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def _status_code(error: Exception):
+    for attr in ("status_code", "code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+            return int(value)
+    for holder in ("resp", "response"):
+        response = getattr(error, holder, None)
+        value = getattr(response, "status", getattr(response, "status_code", None)) if response is not None else None
+        if value is not None and str(value).isdigit():
+            return int(value)
+    return None
+
+
+def classify(error: Exception) -> str:
+    """"rate_limited", "transient" (worth retrying) or "permanent"."""
+    if isinstance(error, RateLimitError) or is_rate_limited(error):
+        return "rate_limited"
+    if isinstance(error, (DeadlineExceeded, TimeoutError, ConnectionError)):
+        return "transient"
+    status = _status_code(error)
+    if status is not None:
+        return "transient" if status in TRANSIENT_STATUS else "permanent"
+    # requests/urllib3/grpc transport failures carry no status
+    name = type(error).__name__
+    if any(word in name for word in ("Timeout", "Connection", "Unavailable", "DeadlineExceeded", "ServiceUnavailable")):
+        return "transient"
+    # The in-memory fakes raise plain BackendError for injected outages
+    if type(error) is BackendError:
+        return "transient"
+    return "permanent"
+
+
+# -------------------------------------
+# Circuit Breaker
+# -------------------------------------
+class CircuitBreaker:
+    """Opens after `failures` consecutive transient failures; after `cooldown` s lets one trial call through."""
+
+    def __init__(self, service: str, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.service = service
+        self.failures = failures
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self._opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"Circuit for {self.service} closed")
+            self._consecutive = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self._trial_running or (self._opened_at is None and self._consecutive >= self.failures):
+                if self._opened_at is None:
+                    logger.error(f"Circuit for {self.service} opened after {self._consecutive} failures")
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def release(self):
+        # A permanent error says nothing about the service's health; just end any trial
+        with self._lock:
+            self._trial_running = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(service: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if service not in _breakers:
+            _breakers[service] = CircuitBreaker(service)
+        return _breakers[service]
+
+
+def breaker_states() -> dict:
+    with _breakers_lock:
+        return {service: b.state for service, b in _breakers.items()}
+
+
+# -------------------------------------
+# Calls
+# -------------------------------------
+Policy = namedtuple("Policy", ["timeout", "attempts", "hedge_after"])
+Policy.__new__.__defaults__ = (None,)
+
+_pool = ThreadPoolExecutor(max_workers=CALL_THREADS, thread_name_prefix="backend-call")
+
+
+def _submit(func, *args, **kwargs):
+    # Runs in the caller's trace context
+    ctx = contextvars.copy_context()
+    return _pool.submit(ctx.run, func, *args, **kwargs)
+
+
+def _attempt(func, args, kwargs, policy: Policy):
+    """One attempt under the deadline; with hedge_after, a second identical request races the first."""
+    if not policy.timeout:
+        return func(*args, **kwargs)
+    deadline = time.monotonic() + policy.timeout
+    futures = [_submit(func, *args, **kwargs)]
+    if policy.hedge_after is not None:
+        done, _ = wait(futures, timeout=policy.hedge_after)
+        if not done:
+            futures.append(_submit(func, *args, **kwargs))
+    error = None
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            if future.exception() is None:
+                # The loser keeps running in the pool and its result is dropped
+                return future.result()
+            error = future.exception()
+    if error is not None and not pending:
+        raise error
+    # Threads cannot be interrupted; the late call finishes in the background
+    raise DeadlineExceeded(f"No response within {policy.timeout}s")
+
+
+def _admit(circuit: CircuitBreaker, service: str, op: str):
+    if not circuit.allow():
+        registry.inc("backend_circuit_rejections_total", {"service": service, "op": op})
+        raise CircuitOpenError(f"{service} is unavailable (circuit open); {op} not attempted")
+
+
+def _record_error(circuit: CircuitBreaker, error: Exception) -> str:
+    """Feeds a failed attempt to the breaker; returns its classify() kind."""
+    kind = classify(error)
+    if kind == "permanent":
+        circuit.release()
+    else:
+        circuit.record_failure()
+    return kind
+
+
+def _backoff(service: str, op: str, attempt: int, kind: str, error: Exception) -> float:
+    delay = random.uniform(0, min(RETRY_MAX, RETRY_BASE * 2 ** (attempt - 1)))
+    if kind == "rate_limited":
+        delay = max(delay, RETRY_BASE * 2)
+    record_retry(service, op)
+    logger.info(f"{service}.{op} attempt {attempt} failed ({kind}: {error}); retrying in {delay:.2f}s")
+    return delay
+
+
+def call(service: str, op: str, func, *args, policy: Policy = None, **kwargs):
+    """Calls func(*args, **kwargs) with the service's breaker, deadline, retries and hedging."""
+    policy = policy or Policy(timeout=None, attempts=1)
+    circuit = breaker(service)
+    for attempt in range(1, policy.attempts + 1):
+        _admit(circuit, service, op)
+        try:
+            result = _attempt(func, args, kwargs, policy)
+        except Exception as e:
+            kind = _record_error(circuit, e)
+            if kind == "permanent" or attempt == policy.attempts:
+                raise
+            time.sleep(_backoff(service, op, attempt, kind, e))
+            continue
+        circuit.record_success()
+        return result
+
+
+async def call_async(service: str, op: str, func, *args, policy: Policy = None, **kwargs):
+    """call() for a coroutine function: the deadline cancels the attempt, backoff does not block the loop.
+
+    Not hedged; the coroutine methods are uploads and writes.
+    """
+    policy = policy or Policy(timeout=None, attempts=1)
+    circuit = breaker(service)
+    for attempt in range(1, policy.attempts + 1):
+        _admit(circuit, service, op)
+        try:
+            try:
+                result = await asyncio.wait_for(func(*args, **kwargs), policy.timeout)
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded(f"No response within {policy.timeout}s") from None
+        except Exception as e:
+            kind = _record_error(circuit, e)
+            if kind == "permanent" or attempt == policy.attempts:
+                raise
+            await asyncio.sleep(_backoff(service, op, attempt, kind, e))
+            continue
+        circuit.record_success()
+        return result
+
+
+def _gated(service: str, op: str, func, *args, **kwargs):
+    """Iterates a generator method behind the breaker; its first fetch is the attempt it records."""
+    circuit = breaker(service)
+    _admit(circuit, service, op)
+    try:
+        items = iter(func(*args, **kwargs))
+        first = next(items)
+    except StopIteration:
+        circuit.record_success()
+        return
+    except Exception as e:
+        _record_error(circuit, e)
+        raise
+    circuit.record_success()
+    yield first
+    yield from items
+
+
+# -------------------------------------
+# Backend Policies
+# -------------------------------------
+READ = Policy(timeout=20.0, attempts=4)
+HEDGED_READ = Policy(timeout=10.0, attempts=3, hedge_after=1.0)
+IDEMPOTENT_WRITE = Policy(timeout=60.0, attempts=4)
+UPLOAD = Policy(timeout=300.0, attempts=3)
+# Creates are not idempotent (a retry after a lost response duplicates the
+# folder or file); they get the breaker and deadline only, the journal retries
+CREATE = Policy(timeout=300.0, attempts=1)
+
+# backend field -> (service, {method: policy}); None gates a generator method by the breaker only.
+# Coroutine methods (the async upload engine's) go through call_async().
+POLICIES = {
+    "listings": ("firestore", {
+        "find_agent": HEDGED_READ, "get": READ, "get_many": READ, "query_range": READ,
+        "set": IDEMPOTENT_WRITE, "update": IDEMPOTENT_WRITE, "update_many": IDEMPOTENT_WRITE,
+        "delete": IDEMPOTENT_WRITE, "stream": None,
+        # A retried create or reservation sees its own earlier write; callers check the owner
+        "create": IDEMPOTENT_WRITE, "reserve_id": IDEMPOTENT_WRITE,
+        "reserved_ids": READ, "acquire_lease": IDEMPOTENT_WRITE, "release_lease": IDEMPOTENT_WRITE,
+    }),
+    "media": ("storage", {
+        "upload": UPLOAD, "download": READ, "delete": IDEMPOTENT_WRITE, "list": None, "list_objects": None,
+        "upload_async": UPLOAD,
+    }),
+    "drive": ("drive", {
+        "find_folder": HEDGED_READ, "create_folder": CREATE, "upload_public": CREATE,
+        "delete": IDEMPOTENT_WRITE, "trash": IDEMPOTENT_WRITE, "list_folders": None,
+        "upload_public_async": CREATE,
+    }),
+    "sheet": ("sheets", {
+        "row_values": READ, "get_all_values": READ, "update": IDEMPOTENT_WRITE,
+        "batch_update": IDEMPOTENT_WRITE, "batch_get": READ, "last_modified": READ,
+        "update_async": IDEMPOTENT_WRITE,
+    }),
+}
+
+
+class ResilientStore:
+    """Wraps a backend object; methods in `policies` go through call(), everything else passes through."""
+
+    def __init__(self, store, service: str, policies: dict):
+        self._store = store
+        self._service = service
+        self._policies = policies
+
+    def __getattr__(self, name):
+        attr = getattr(self._store, name)
+        if name not in self._policies or not callable(attr):
+            return attr
+        policy = self._policies[name]
+        service = self._service
+        if policy is None:
+            @functools.wraps(attr)
+            def gated(*args, **kwargs):
+                return _gated(service, name, attr, *args, **kwargs)
+            return gated
+
+        if inspect.iscoroutinefunction(attr):
+            @functools.wraps(attr)
+            async def async_wrapper(*args, **kwargs):
+                return await call_async(service, name, attr, *args, policy=policy, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(attr)
+        def wrapper(*args, **kwargs):
+            return call(service, name, attr, *args, policy=policy, **kwargs)
+        return wrapper
+
+
+def resilient_backends(backends: Backends) -> Backends:
+    if not RESILIENCE_ENABLED:
+        return backends
+    return Backends(**{
+        field: ResilientStore(store, *POLICIES[field])
+        for field, store in backends._asdict().items()
+    })
@@ -0,0 +1,310 @@
+# shared_cache.py
+
+import functools
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from urllib.parse import urlparse
+
+# -------------------------------------
+# Cache Backends
+# -------------------------------------
+# Values are stored as JSON bytes; get() returns None on a miss or expiry.
+# Never pickle: anyone able to write to a shared cache could run code in every
+# process reading it.
+# CACHE_BACKEND selects the backend shared by every @cached function:
+#   lru     - in-process (default, same scope as st.cache_data)
+#   sqlite  - on-disk file shared by all server processes on one host (CACHE_URL = path)
+#   redis   - any Redis-protocol server shared across hosts (CACHE_URL = redis://host:port/db)
+
+
+class LRUBackend:
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires and expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float = 0):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else 0)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_prefix(self, prefix: str):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+
+class SQLiteBackend:
+    def __init__(self, path: str = ".cache/shared_cache.sqlite3"):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires REAL)"
+        )
+
+    def _conn(self):
+        # sqlite3 connections cannot be shared between threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA mmap_size=67108864")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        row = self._conn().execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires and expires < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key: str, value: bytes, ttl: float = 0):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl if ttl else 0),
+        )
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix: str):
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        self._conn().execute("DELETE FROM cache WHERE key LIKE ? ESCAPE '\\'", (escaped + "%",))
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisBackend:
+    """Minimal RESP client; works with Redis, Valkey, KeyDB or any local stand-in server."""
+
+    def __init__(self, url: str = "redis://localhost:6379/0", timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._file = self._sock.makefile("rb")
+        if self.password:
+            self._send("AUTH", self.password)
+        if self.db:
+            self._send("SELECT", self.db)
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._file = None
+
+    def _send(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._sock.sendall(b"".join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._file.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(payload)
+            if count < 0:
+                return None
+            return [self._read_reply() for _ in range(count)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    def command(self, *args):
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._send(*args)
+                except OSError:  # Includes ConnectionError
+                    self._close()
+                    if attempt:
+                        raise
+
+    def get(self, key: str):
+        return self.command("GET", key)
+
+    def set(self, key: str, value: bytes, ttl: float = 0):
+        if ttl:
+            self.command("SET", key, value, "PX", int(ttl * 1000))
+        else:
+            self.command("SET", key, value)
+
+    def delete(self, key: str):
+        self.command("DEL", key)
+
+    def delete_prefix(self, prefix: str):
+        pattern = "".join("\\" + c if c in "*?[]\\" else c for c in prefix) + "*"
+        cursor = "0"
+        while True:
+            cursor, keys = self.command("SCAN", cursor, "MATCH", pattern, "COUNT", 500)
+            if keys:
+                self.command("DEL", *keys)
+            cursor = cursor.decode() if isinstance(cursor, bytes) else str(cursor)
+            if cursor == "0":
+                break
+
+
+def backend_from_env():
+    kind = os.getenv("CACHE_BACKEND", "lru").lower()
+    url = os.getenv("CACHE_URL", "")
+    if kind == "sqlite":
+        return SQLiteBackend(url or ".cache/shared_cache.sqlite3")
+    if kind == "redis":
+        return RedisBackend(url or "redis://localhost:6379/0")
+    return LRUBackend()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = backend_from_env()
+    return _backend
+
+
+def set_backend(backend):
+    """Swaps the backend used by every @cached function (e.g. for a local stand-in)."""
+    global _backend
+    _backend = backend
+
+
+# -------------------------------------
+# Decorator
+# -------------------------------------
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "rental-inventory")
+
+# Per-process hit/miss counts keyed by (namespace, "hit" | "miss")
+cache_stats = Counter()
+
+
+def _make_key(namespace: str, args, kwargs) -> str:
+    digest = hashlib.sha1(repr((args, sorted(kwargs.items()))).encode()).hexdigest()
+    return f"{CACHE_PREFIX}:{namespace}:{digest}"
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def _loads(raw: bytes):
+    # Cached results are scalars and tuples; JSON arrays come back as tuples
+    def restore(value):
+        if isinstance(value, list):
+            return tuple(restore(item) for item in value)
+        if isinstance(value, dict):
+            return {key: restore(item) for key, item in value.items()}
+        return value
+    return restore(json.loads(raw))
+
+
+def cached(ttl: float = 300, namespace: str = None, cache_empty: bool = True):
+    """Caches a function's result in the shared backend for `ttl` seconds.
+
+    Falsy results are not stored when cache_empty is False, so transient
+    failures (e.g. a Drive folder lookup returning "") are retried next call.
+    Results must be JSON-serializable; lists are returned as tuples.
+    The wrapper gains .invalidate(*args, **kwargs) and .clear().
+    """
+    def decorator(func):
+        ns = namespace or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            backend = get_backend()
+            key = _make_key(ns, args, kwargs)
+            try:
+                raw = backend.get(key)
+                if raw is not None:
+                    result = _loads(raw)
+                    cache_stats[(ns, "hit")] += 1
+                    return result
+            except Exception:
+                # Unreachable backend, or a value that is not ours to decode: recompute it
+                pass
+            cache_stats[(ns, "miss")] += 1
+            result = func(*args, **kwargs)
+            if result or cache_empty:
+                try:
+                    backend.set(key, _dumps(result), ttl)
+                except Exception:
+                    pass
+            return result
+
+        def invalidate(*args, **kwargs):
+            get_backend().delete(_make_key(ns, args, kwargs))
+
+        def clear():
+            get_backend().delete_prefix(f"{CACHE_PREFIX}:{ns}:")
+
+        wrapper.invalidate = invalidate
+        wrapper.clear = clear
+        return wrapper
+
+    return decorator
@@ -0,0 +1,296 @@
+# sheet_projector.py
+#
+# Keeps the "Rental Inventories" sheet a mirror of the Firestore listings,
+# off the submission path. The projector watches the listing store, queues
+# the changed property IDs and writes them in batched batch_update calls:
+# only the cells that changed are rewritten in rows it already knows, new
+# listings are appended. When anyone else wrote the sheet since the last flush
+# (or every VERIFY_SECONDS), column A is re-read first, so rows that ops
+# sorted or inserted are re-indexed rather than overwritten. On taking over
+# the watch delivers every listing, so missing or stale rows are repaired too.
+#
+# Exactly one projector may write the sheet (it allocates the appended rows).
+# Every process may start one, but only the holder of the "sheet-projector"
+# lease watches and writes (see backends.Lease); the others stand by:
+#
+#   SHEET_SYNC=projector streamlit run rent.py     # in the app processes
+#   SHEET_SYNC=external streamlit run rent.py      # app skips the sheet...
+#   python sheet_projector.py                      # ...and this mirrors it
+
+import logging
+import threading
+import time
+
+from backends import BackendError, Lease, get_backends, set_backends
+from sheet_sync import column_letter
+from submission_pipeline import (
+    build_sheet_row, ensure_sheet_header, get_next_row_index, sheet_append_lock,
+)
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------------
+# Configuration
+# -------------------------------------
+BATCH_INTERVAL = 2.0        # seconds between flushes while changes are pending
+BATCH_RANGES = 200          # ranges per batch_update request
+RETRY_DELAY = 10.0
+STATUS_COLUMN = "Q"         # "Inventory Status"; set to REMOVED_STATUS when a listing is deleted
+REMOVED_STATUS = "Removed"
+LAST_COLUMN = "AG"
+LEASE_NAME = "sheet-projector"
+LEASE_SECONDS = 30.0
+VERIFY_SECONDS = 300.0      # column A is re-read at least this often even if nobody else wrote the sheet
+
+
+def _cells(row: list) -> tuple:
+    # Compared as the sheet returns them: strings, without trailing blanks
+    cells = ["" if value is None else str(value) for value in row]
+    while cells and cells[-1] == "":
+        cells.pop()
+    return tuple(cells)
+
+
+def _changed_ranges(number: int, row: list, old: tuple, new: tuple) -> list:
+    """One range per run of cells in row `number` that differ between `old` and `new`."""
+    width = max(len(old), len(new))
+    values = ["" if value is None else value for value in row] + [""] * (width - len(row))
+    ranges, start = [], None
+    for col in range(width + 1):
+        differs = col < width and (old[col] if col < len(old) else "") != (new[col] if col < len(new) else "")
+        if differs and start is None:
+            start = col
+        elif not differs and start is not None:
+            cells = f"{column_letter(start)}{number}:{column_letter(col - 1)}{number}"
+            ranges.append({"range": cells, "values": [values[start:col]]})
+            start = None
+    return ranges
+
+
+class SheetProjector:
+    """Mirrors listing store changes into the sheet, one row per property ID."""
+
+    def __init__(self, batch_interval: float = BATCH_INTERVAL, batch_ranges: int = BATCH_RANGES):
+        self.batch_interval = batch_interval
+        self.batch_ranges = batch_ranges
+        self._lock = threading.Lock()
+        self._pending = {}          # property ID -> (change type, data), latest change wins
+        self._row_of = {}           # property ID -> sheet row number
+        self._cells = {}            # property ID -> cells last read or written; writes are diffed against it
+        self._next_row = 2
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._idle = threading.Event()
+        self._watch = None
+        self._listings = None
+        self._sheet_version = None  # last_modified() right after this projector's last flush
+        self._verified_at = 0.0
+        self.lease = Lease(LEASE_NAME, LEASE_SECONDS)
+        self.rows_written = 0
+        self.ready = threading.Event()
+
+    # --- Sheet state ---
+    def load_sheet(self):
+        """Indexes the rows already in the sheet by property ID (column A)."""
+        values = get_backends().sheet.get_all_values()
+        with self._lock:
+            row_of, cells = {}, {}
+            for number, row in enumerate(values[1:], start=2):
+                property_id = str(row[0]).strip() if row else ""
+                if property_id:
+                    row_of[property_id] = number
+                    # Keep what was last written: cells ops edited since are not ours to revert
+                    cells[property_id] = self._cells.get(property_id) or _cells(row)
+            self._row_of, self._cells = row_of, cells
+            self._next_row = len(values) + 1
+
+    def verify_rows(self) -> bool:
+        """Re-indexes the sheet if column A no longer matches the row index; True if it did."""
+        ids = get_backends().sheet.batch_get(["A2:A"])[0]
+        row_of = {}
+        for number, id_cell in enumerate(ids, start=2):
+            property_id = str(id_cell[0]).strip() if id_cell else ""
+            if property_id:
+                row_of[property_id] = number
+        with self._lock:
+            if row_of == self._row_of and len(ids) + 2 <= self._next_row:
+                return False
+        # Ops sorted, inserted or deleted rows since they were indexed
+        logger.warning("Sheet rows moved since they were indexed; re-indexing the sheet")
+        self.load_sheet()
+        return True
+
+    def _verify_if_written(self):
+        """verify_rows() unless only this projector wrote the sheet since its last flush."""
+        modified = get_backends().sheet.last_modified()
+        if modified is not None and modified == self._sheet_version and time.time() - self._verified_at < VERIFY_SECONDS:
+            return
+        self.verify_rows()
+        self._verified_at = time.time()
+
+    def _keep_lease(self):
+        # A long flush (e.g. repairing a large sheet on takeover) renews as it goes; a lost lease stops writing
+        if self.lease.held and time.time() - self.lease.renewed_at > self.lease.ttl / 3 and not self.lease.renew():
+            raise BackendError("Sheet projector lease lost")
+
+    # --- Listing store sync ---
+    def _on_changes(self, changes):
+        with self._lock:
+            for change_type, property_id, data in changes:
+                self._pending[property_id] = (change_type, data)
+            self._idle.clear()
+        self._wakeup.set()
+
+    def _plan(self, batch: dict) -> tuple:
+        """Returns (ranges for batch_update, {property ID: cells written}, property IDs appended)."""
+        updates, appends, written = [], [], {}
+        with self._lock:
+            for property_id, (change_type, data) in sorted(batch.items()):
+                if change_type == "REMOVED":
+                    if property_id in self._row_of:
+                        cell = f"{STATUS_COLUMN}{self._row_of[property_id]}"
+                        updates.append({"range": f"{cell}:{cell}", "values": [[REMOVED_STATUS]]})
+                    continue
+                try:
+                    row = build_sheet_row(data)
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.error(f"Listing {property_id} cannot be projected to the sheet: {e}")
+                    continue
+                cells = _cells(row)
+                if self._cells.get(property_id) == cells:
+                    continue
+                written[property_id] = cells
+                if property_id in self._row_of:
+                    # Only the cells Firestore changed, so ops edits to the others survive
+                    updates.extend(_changed_ranges(self._row_of[property_id], row, self._cells.get(property_id, ()), cells))
+                else:
+                    appends.append((property_id, row))
+            if appends:
+                # New listings go below the last row as one contiguous range
+                start = self._next_row
+                end = start + len(appends) - 1
+                updates.append({"range": f"A{start}:{LAST_COLUMN}{end}", "values": [row for _, row in appends]})
+        return updates, written, [property_id for property_id, _ in appends]
+
+    def flush(self) -> int:
+        """Writes every pending change; returns the number of ranges written."""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        with sheet_append_lock:
+            try:
+                self._verify_if_written()
+                updates, written, appended = self._plan(batch)
+                for i in range(0, len(updates), self.batch_ranges):
+                    self._keep_lease()
+                    get_backends().sheet.batch_update(updates[i:i + self.batch_ranges])
+                self._sheet_version = get_backends().sheet.last_modified()
+            except Exception:
+                with self._lock:
+                    # Re-queue unless a newer change arrived meanwhile
+                    for property_id, change in batch.items():
+                        self._pending.setdefault(property_id, change)
+                raise
+            with self._lock:
+                for offset, property_id in enumerate(appended):
+                    self._row_of[property_id] = self._next_row + offset
+                self._next_row += len(appended)
+                self._cells.update(written)
+            if appended:
+                get_next_row_index.clear()
+        self.rows_written += len(written)
+        if written:
+            logger.info(f"Projected {len(written)} listings to the sheet ({len(appended)} appended)")
+        return len(updates)
+
+    def _lead(self) -> bool:
+        """Renews the lease; watches the listings while this process holds it."""
+        if self.lease.renew():
+            if self._watch is None:
+                logger.info("Took the sheet projector lease; projecting from this process")
+                self.load_sheet()
+                self._sheet_version = None
+                self._watch = (self._listings or get_backends().listings).watch(self._on_changes)
+            return True
+        if self._watch is not None:
+            logger.warning("Lost the sheet projector lease; standing by")
+            self._unwatch()
+        return False
+
+    def _unwatch(self):
+        unsubscribe, self._watch = self._watch, None
+        if unsubscribe is not None:
+            unsubscribe()
+        with self._lock:
+            self._pending = {}
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                leading = self._lead()
+            except Exception as e:
+                logger.error(f"Sheet projector lease error: {e}")
+                leading = False
+            if not leading:
+                self._stop_event.wait(self.batch_interval)
+                continue
+            self._wakeup.wait(timeout=self.batch_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Sheet projection error: {e}")
+                self._stop_event.wait(RETRY_DELAY)
+                continue
+            with self._lock:
+                if not self._pending:
+                    self._idle.set()
+            self.ready.set()
+            # Coalesce bursts of changes into one batch
+            self._stop_event.wait(self.batch_interval)
+        self._unwatch()
+        try:
+            self.lease.release()
+        except Exception as e:
+            logger.error(f"Sheet projector lease release failed: {e}")
+
+    def start(self, listings=None):
+        """Projects from this process whenever it holds the lease (every listing first arrives as ADDED)."""
+        ensure_sheet_header()
+        self._listings = listings
+        threading.Thread(target=self._run, daemon=True, name="sheet-projector").start()
+        return self
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """True once every change received so far has been written."""
+        return self._idle.wait(timeout)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def stop(self):
+        self._stop_event.set()
+        self._wakeup.set()
+        if not self.lease.held:
+            # Not started, or standing by: nothing else will drop the watch
+            self._unwatch()
+
+
+def main():
+    from google_clients import backends_from_env
+
+    logging.basicConfig(level=logging.INFO)
+    set_backends(backends_from_env())
+    projector = SheetProjector().start()
+    try:
+        while True:
+            time.sleep(60)
+            logger.info(f"{projector.rows_written} rows projected, {projector.pending()} pending")
+    except KeyboardInterrupt:
+        projector.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# sheet_sync.py
+#
+# Brings edits made directly in the "Rental Inventories" sheet back into
+# Firestore. Ops staff maintain two columns by hand, "Inventory Status" and
+# "Date of Status Last Checked"; everything else is owned by Firestore and
+# mirrored into the sheet (sheet_projector.py or the drain's append).
+#
+# Each poll first asks whether the spreadsheet changed at all, then reads only
+# the ID and the two ops columns in one batchGet and hashes every row. Rows
+# whose hash moved since the last poll are compared with their listings and
+# only the fields that really differ are written, in batched updates. The
+# first poll compares every row, so edits made while no poller was running
+# (restart, deploy, crash) are synced too.
+#
+# Every process may start the poller, but only the holder of the
+# "sheet-status-sync" lease polls (see backends.Lease); the others stand by.
+#
+#   SHEET_REVERSE_SYNC_SECONDS=60 streamlit run rent.py
+#   python sheet_sync.py
+
+import datetime
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from backends import Lease, get_backends, set_backends
+from submission_pipeline import SHEET_HEADER
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------------
+# Configuration
+# -------------------------------------
+SHEET_REVERSE_SYNC_SECONDS = float(os.getenv("SHEET_REVERSE_SYNC_SECONDS", "0"))    # 0 disables it in the app
+GET_MANY_CHUNK = 300
+LEASE_NAME = "sheet-status-sync"
+SHEETS_EPOCH = datetime.datetime(1899, 12, 30)
+
+# Sheet column -> Firestore field, for the columns ops edit by hand
+SYNCED_COLUMNS = {
+    "Inventory Status": "inventoryStatus",
+    "Date of Status Last Checked": "dateOfStatusLastChecked",
+}
+
+
+def column_letter(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def parse_sheet_date(value):
+    """Local-midnight timestamp for a sheet date (serial number or text), or None."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        day = SHEETS_EPOCH + datetime.timedelta(days=int(value))
+        return int(datetime.datetime(day.year, day.month, day.day).timestamp())
+    text = str(value or "").strip()
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d %b %Y"):
+        try:
+            return int(datetime.datetime.strptime(text, fmt).timestamp())
+        except ValueError:
+            continue
+    return None
+
+
+def _same_day(ts_a, ts_b) -> bool:
+    try:
+        return datetime.date.fromtimestamp(ts_a) == datetime.date.fromtimestamp(ts_b)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return False
+
+
+def _row_hash(cells: tuple) -> str:
+    return hashlib.blake2b(repr(cells).encode(), digest_size=16).hexdigest()
+
+
+class SheetStatusSync:
+    """Polls the sheet's ops columns and writes changed values back to the listings."""
+
+    def __init__(self, interval: float = SHEET_REVERSE_SYNC_SECONDS or 60):
+        self.interval = interval
+        self._ranges = ["A2:A"] + [
+            f"{column_letter(SHEET_HEADER.index(name))}2:{column_letter(SHEET_HEADER.index(name))}"
+            for name in SYNCED_COLUMNS
+        ]
+        self._hashes = None             # property ID -> hash of its synced cells at the last poll
+        self._duplicates = set()        # property IDs found in more than one row, skipped
+        self._last_modified = None
+        self._stop_event = threading.Event()
+        # A holder that stops polling is replaced after a few missed intervals
+        self.lease = Lease(LEASE_NAME, ttl=3 * interval)
+        self.updates_written = 0
+
+    def _read_rows(self) -> dict:
+        """{property ID: (cell per synced column)} from one column-projected batchGet."""
+        columns = get_backends().sheet.batch_get(self._ranges)
+        ids, synced = columns[0], columns[1:]
+        rows, duplicates = {}, set()
+        for i, id_cell in enumerate(ids):
+            if not id_cell or not str(id_cell[0]).strip():
+                continue
+            property_id = str(id_cell[0]).strip()
+            if property_id in rows:
+                duplicates.add(property_id)
+            rows[property_id] = tuple(
+                column[i][0] if i < len(column) and column[i] else "" for column in synced
+            )
+        # Which of the rows ops meant is unknowable, so neither is synced until one goes
+        for property_id in sorted(duplicates - self._duplicates):
+            logger.error(f"Property ID {property_id} is in more than one sheet row; not syncing it")
+        self._duplicates = duplicates
+        for property_id in duplicates:
+            del rows[property_id]
+        return rows
+
+    def _field_updates(self, cells: tuple, listing: dict) -> dict:
+        """Only the Firestore fields whose sheet value differs from the listing."""
+        fields = {}
+        for (name, field), value in zip(SYNCED_COLUMNS.items(), cells):
+            if field == "dateOfStatusLastChecked":
+                ts = parse_sheet_date(value)
+                # The sheet holds a date; keep the stored time of day when the day matches
+                if ts is not None and not _same_day(ts, listing.get(field)):
+                    fields[field] = ts
+            else:
+                value = str(value).strip()
+                if value and value != str(listing.get(field, "")):
+                    fields[field] = value
+        return fields
+
+    def poll(self) -> int:
+        """One sync pass; returns the number of listings updated."""
+        sheet = get_backends().sheet
+        modified = sheet.last_modified()
+        if modified is not None and modified == self._last_modified:
+            return 0
+        rows = self._read_rows()
+        hashes = {pid: _row_hash(cells) for pid, cells in rows.items()}
+        if self._hashes is None:
+            # Nothing to compare with yet: every row is checked against its listing
+            changed = list(hashes)
+        else:
+            changed = [pid for pid, value in hashes.items() if self._hashes.get(pid) != value]
+
+        listings = get_backends().listings
+        updates = {}
+        for i in range(0, len(changed), GET_MANY_CHUNK):
+            chunk = changed[i:i + GET_MANY_CHUNK]
+            for pid, listing in listings.get_many(chunk).items():
+                fields = self._field_updates(rows[pid], listing)
+                if fields:
+                    updates[pid] = fields
+        if updates:
+            listings.update_many(updates)
+            logger.info(f"Synced {len(updates)} sheet edits to Firestore")
+        # Only advance the snapshot once the writes went through
+        self._hashes = hashes
+        self._last_modified = modified
+        self.updates_written += len(updates)
+        return len(updates)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                if self.lease.renew():
+                    self.poll()
+                else:
+                    # Another process polls; start from a full comparison if this one takes over
+                    self._hashes = self._last_modified = None
+            except Exception as e:
+                logger.error(f"Sheet reverse sync error: {e}")
+            self._stop_event.wait(self.interval)
+        try:
+            self.lease.release()
+        except Exception as e:
+            logger.error(f"Sheet reverse sync lease release failed: {e}")
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True, name="sheet-sync").start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def main():
+    from google_clients import backends_from_env
+
+    logging.basicConfig(level=logging.INFO)
+    set_backends(backends_from_env())
+    sync = SheetStatusSync().start()
+    try:
+        while True:
+            time.sleep(600)
+            logger.info(f"{sync.updates_written} sheet edits synced")
+    except KeyboardInterrupt:
+        sync.stop()
+
+
+if __name__ == "__main__":
+    main()
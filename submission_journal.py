@@ -0,0 +1,439 @@
+# submission_journal.py
+
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+from metrics import record_retry
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------------
+# Configuration
+# -------------------------------------
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", ".journal")
+JOURNAL_WORKERS = int(os.getenv("JOURNAL_WORKERS", "2"))
+MAX_ATTEMPTS = int(os.getenv("JOURNAL_MAX_ATTEMPTS", "8"))
+LEASE_SECONDS = 600          # a claimed entry is re-claimable after this if its worker died
+LEASE_RENEW_SECONDS = LEASE_SECONDS / 3     # a live worker extends its lease this often
+BACKOFF_BASE = 5.0
+BACKOFF_MAX = 600.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id TEXT PRIMARY KEY,
+    property_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    media TEXT NOT NULL,
+    status TEXT NOT NULL,            -- pending | running | done | failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS submissions_ready ON submissions (status, next_attempt_at);
+CREATE TABLE IF NOT EXISTS steps (
+    submission_id TEXT NOT NULL,
+    step TEXT NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (submission_id, step)
+);
+CREATE TABLE IF NOT EXISTS reserved_ids (
+    prefix TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    PRIMARY KEY (prefix, number)
+);
+CREATE TABLE IF NOT EXISTS progress (
+    submission_id TEXT PRIMARY KEY,
+    stage TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tokens (
+    token TEXT PRIMARY KEY,
+    property_id TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class SpooledFile:
+    """A journaled media file; duck-types the .name/.read() of a Streamlit UploadedFile."""
+
+    def __init__(self, folder: str, name: str, path: str):
+        self.folder = folder
+        self.name = name
+        self.path = path
+
+    def read(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def getvalue(self) -> bytes:
+        return self.read()
+
+
+# -------------------------------------
+# Journal
+# -------------------------------------
+class SubmissionJournal:
+    """Durable local queue of submissions: form fields in SQLite, media spooled to disk.
+
+    A submission is acknowledged once enqueue() returns; workers then drain it
+    to the remote services, recording each completed step so a retry skips it.
+    """
+
+    def __init__(self, journal_dir: str = JOURNAL_DIR):
+        self.journal_dir = journal_dir
+        self.spool_dir = os.path.join(journal_dir, "media")
+        self.upload_dir = os.path.join(journal_dir, "uploads")
+        os.makedirs(self.spool_dir, exist_ok=True)
+        os.makedirs(self.upload_dir, exist_ok=True)
+        self.path = os.path.join(journal_dir, "submissions.sqlite3")
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    # --- Writing ---
+    def reserve_property_id(self, min_number: int, prefix: str = "RN", token: str = None) -> str:
+        """Reserves the next free ID >= min_number that this journal has never handed out.
+
+        With a submission token, repeated calls return the ID reserved the first time.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if token:
+                row = conn.execute("SELECT property_id FROM tokens WHERE token = ?", (token,)).fetchone()
+                if row is not None:
+                    conn.execute("COMMIT")
+                    return row["property_id"]
+            property_id = self._reserve_locked(conn, min_number, prefix)
+            if token:
+                conn.execute(
+                    "INSERT INTO tokens (token, property_id, created_at) VALUES (?, ?, ?)",
+                    (token, property_id, time.time()),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return property_id
+
+    def _reserve_locked(self, conn, min_number: int, prefix: str) -> str:
+        row = conn.execute("SELECT MAX(number) FROM reserved_ids WHERE prefix = ?", (prefix,)).fetchone()
+        number = max(min_number, (row[0] or 0) + 1)
+        conn.execute("INSERT INTO reserved_ids (prefix, number) VALUES (?, ?)", (prefix, number))
+        return f"{prefix}{number:03d}"
+
+    def reassign_property_id(self, submission_id: str, min_number: int, prefix: str = "RN") -> str:
+        """Moves a submission (or a token not journaled yet) to a new ID >= min_number,
+        e.g. when another instance claimed its ID. Returns the new ID.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            property_id = self._reserve_locked(conn, min_number, prefix)
+            conn.execute("UPDATE submissions SET property_id = ? WHERE id = ?", (property_id, submission_id))
+            conn.execute("UPDATE tokens SET property_id = ? WHERE token = ?", (property_id, submission_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return property_id
+
+    def find_submission(self, token: str):
+        """Returns {"id", "property_id", "status", "stage", "done", "total"} for a token that was
+        already journaled, else None."""
+        row = self._conn().execute(
+            "SELECT s.id, s.property_id, s.status, "
+            "COALESCE(p.stage, '') AS stage, COALESCE(p.done, 0) AS done, COALESCE(p.total, 0) AS total "
+            "FROM submissions s LEFT JOIN progress p ON p.submission_id = s.id WHERE s.id = ?",
+            (token,),
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def enqueue(self, property_id: str, payload: dict, media: list, token: str = None) -> str:
+        """Spools media [(folder, filename, bytes or path), ...] and journals the submission. Returns its ID.
+
+        A path is moved into the spool rather than copied, so it must be an fsynced
+        file on the journal's filesystem (e.g. under upload_dir).
+        The token (if given) becomes the submission ID, so replaying the same
+        submission returns the existing entry instead of journaling it twice.
+        """
+        submission_id = token or uuid.uuid4().hex
+        if token and self.find_submission(token) is not None:
+            return submission_id
+        spooled = []
+        for index, (folder, filename, data) in enumerate(media):
+            folder_dir = os.path.join(self.spool_dir, submission_id, folder)
+            os.makedirs(folder_dir, exist_ok=True)
+            # Prefix with the position so identical filenames in one submission do not collide
+            path = os.path.join(folder_dir, f"{index:04d}_{os.path.basename(filename)}")
+            if isinstance(data, (str, os.PathLike)):
+                os.replace(data, path)
+            else:
+                with open(path, "wb") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+            spooled.append({"folder": folder, "name": filename, "path": path})
+        now = time.time()
+        # A concurrent replay that got here first wins; its spooled files are identical
+        self._conn().execute(
+            "INSERT OR IGNORE INTO submissions (id, property_id, payload, media, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, 'pending', ?, ?)",
+            (submission_id, property_id, json.dumps(payload), json.dumps(spooled), now, now),
+        )
+        return submission_id
+
+    # --- Draining ---
+    def claim(self):
+        """Leases the oldest ready submission to the calling worker, or returns None."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM submissions WHERE status IN ('pending', 'running') AND next_attempt_at <= ? "
+                "ORDER BY created_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE submissions SET status = 'running', attempts = attempts + 1, "
+                "next_attempt_at = ?, updated_at = ? WHERE id = ?",
+                (now + LEASE_SECONDS, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return {
+            "id": row["id"],
+            "property_id": row["property_id"],
+            "payload": json.loads(row["payload"]),
+            "media": [SpooledFile(m["folder"], m["name"], m["path"]) for m in json.loads(row["media"])],
+            "attempts": row["attempts"] + 1,
+        }
+
+    def renew_lease(self, entry: dict) -> bool:
+        """Extends the lease of a claimed entry; False if it was re-claimed or finished meanwhile."""
+        cursor = self._conn().execute(
+            "UPDATE submissions SET next_attempt_at = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+            (time.time() + LEASE_SECONDS, entry["id"], entry["attempts"]),
+        )
+        return cursor.rowcount == 1
+
+    @contextlib.contextmanager
+    def lease(self, entry: dict):
+        """Keeps renewing the entry's lease while the block runs, so a slow drain is not claimed twice."""
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(LEASE_RENEW_SECONDS):
+                try:
+                    if not self.renew_lease(entry):
+                        logger.warning(f"Lease on submission {entry['property_id']} was lost")
+                        return
+                except Exception as e:
+                    logger.error(f"Lease renewal error: {e}")
+
+        thread = threading.Thread(target=renew, daemon=True, name="journal-lease")
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+
+    def _recorded_step(self, entry: dict, name: str):
+        row = self._conn().execute(
+            "SELECT result FROM steps WHERE submission_id = ? AND step = ?", (entry["id"], name)
+        ).fetchone()
+        return (True, json.loads(row["result"])) if row is not None else (False, None)
+
+    def _record_step(self, entry: dict, name: str, result):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO steps (submission_id, step, result) VALUES (?, ?, ?)",
+            (entry["id"], name, json.dumps(result)),
+        )
+
+    def step(self, entry: dict, name: str, func):
+        """Runs func() once per submission; later calls return the recorded result."""
+        done, result = self._recorded_step(entry, name)
+        if done:
+            return result
+        result = func()
+        self._record_step(entry, name, result)
+        return result
+
+    async def step_async(self, entry: dict, name: str, func):
+        """step() for a coroutine function; the SQLite reads and writes are short enough to run on the loop."""
+        done, result = self._recorded_step(entry, name)
+        if done:
+            return result
+        result = await func()
+        self._record_step(entry, name, result)
+        return result
+
+    def complete(self, entry: dict):
+        self._conn().execute(
+            "UPDATE submissions SET status = 'done', last_error = '', updated_at = ? WHERE id = ?",
+            (time.time(), entry["id"]),
+        )
+        shutil.rmtree(os.path.join(self.spool_dir, entry["id"]), ignore_errors=True)
+
+    def retry_later(self, entry: dict, error: str):
+        """Schedules another attempt with jittered exponential backoff, or parks the entry as failed."""
+        now = time.time()
+        if entry["attempts"] >= MAX_ATTEMPTS:
+            status, next_at = "failed", now
+        else:
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (entry["attempts"] - 1))
+            status, next_at = "pending", now + random.uniform(delay / 2, delay)
+            record_retry("journal", "drain_submission")
+        self._conn().execute(
+            "UPDATE submissions SET status = ?, next_attempt_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+            (status, next_at, error[:2000], now, entry["id"]),
+        )
+
+    def requeue(self, submission_id: str):
+        """Puts a failed submission back in the queue with a fresh attempt budget."""
+        self._conn().execute(
+            "UPDATE submissions SET status = 'pending', attempts = 0, next_attempt_at = 0, updated_at = ? "
+            "WHERE id = ? AND status = 'failed'",
+            (time.time(), submission_id),
+        )
+
+    # --- Status ---
+    def pending_property_ids(self) -> list:
+        rows = self._conn().execute(
+            "SELECT property_id FROM submissions WHERE status IN ('pending', 'running')"
+        ).fetchall()
+        return [r["property_id"] for r in rows]
+
+    def unfinished_property_ids(self) -> list:
+        # Failed entries can be requeued; their completed uploads are reused, so they still own their media
+        rows = self._conn().execute(
+            "SELECT property_id FROM submissions WHERE status IN ('pending', 'running', 'failed')"
+        ).fetchall()
+        return [r["property_id"] for r in rows]
+
+    def report_progress(self, entry: dict, stage: str, done: int = 0, total: int = 0):
+        """Records how far a worker (in any process) has got with a submission."""
+        self._conn().execute(
+            "INSERT OR REPLACE INTO progress (submission_id, stage, done, total, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (entry["id"], stage, done, total, time.time()),
+        )
+
+    def recent(self, limit: int = 20) -> list:
+        rows = self._conn().execute(
+            "SELECT s.id, s.property_id, s.status, s.attempts, s.last_error, s.created_at, s.updated_at, "
+            "COALESCE(p.stage, '') AS stage, COALESCE(p.done, 0) AS done, COALESCE(p.total, 0) AS total "
+            "FROM submissions s LEFT JOIN progress p ON p.submission_id = s.id "
+            "ORDER BY s.created_at DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+
+# -------------------------------------
+# Cross-process Lock
+# -------------------------------------
+class FileLock:
+    """threading.Lock-compatible lock that also excludes other processes on this host (flock)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._fd = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if not self._thread_lock.acquire(blocking):
+            return False
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BaseException as e:
+            os.close(fd)
+            self._thread_lock.release()
+            if isinstance(e, BlockingIOError):
+                return False
+            raise
+        self._fd = fd
+        return True
+
+    def release(self):
+        fd, self._fd = self._fd, None
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+# -------------------------------------
+# Workers
+# -------------------------------------
+class JournalWorker(threading.Thread):
+    def __init__(self, journal: SubmissionJournal, drain, poll_interval: float = 1.0):
+        super().__init__(daemon=True, name="journal-worker")
+        self.journal = journal
+        self.drain = drain
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                entry = self.journal.claim()
+            except Exception as e:
+                logger.error(f"Journal claim error: {e}")
+                entry = None
+            if entry is None:
+                self._stop_event.wait(self.poll_interval)
+                continue
+            try:
+                with self.journal.lease(entry):
+                    self.drain(self.journal, entry)
+                self.journal.complete(entry)
+                logger.info(f"Submission {entry['property_id']} drained")
+            except Exception as e:
+                logger.error(f"Submission {entry['property_id']} attempt {entry['attempts']} failed: {e}")
+                self.journal.retry_later(entry, str(e))
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_workers(journal: SubmissionJournal, drain, count: int = JOURNAL_WORKERS) -> list:
+    workers = [JournalWorker(journal, drain) for _ in range(count)]
+    for worker in workers:
+        worker.start()
+    return workers
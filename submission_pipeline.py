@@ -0,0 +1,479 @@
+# submission_pipeline.py
+
+import os
+import datetime
+import logging
+import threading
+import uuid
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from area_data import find_area, micromarket_to_area
+from backends import BackendError, get_backends
+from geo_search import geohash_for
+from photo_hash import photo_dhash, hash_to_hex
+from shared_cache import cached
+from submission_journal import FileLock
+from tracing import span, traced, bind_context
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------------
+# CONFIGURATION
+# -------------------------------------
+# Everything below talks to the services only through backends.get_backends(),
+# so it runs the same against Google (rent.py) or the in-memory fakes.
+PARENT_FOLDER_ID = os.getenv("PARENT_FOLDER_ID", "")
+MEDIA_PREFIX = "rental-media-files"
+# "inline": the journal drain appends the sheet row itself. "projector": a
+# sheet_projector.SheetProjector in this process mirrors Firestore into the
+# sheet. "external": the drain skips the sheet; sheet_projector.py runs elsewhere.
+SHEET_SYNC = os.getenv("SHEET_SYNC", "inline")
+
+SHEET_HEADER = [
+    "Property Id", "Property Name", "Property Type", "Plot Size", "SBUA",
+    "Rent Per Month in Lakhs", "Commission Type", "Maintenance Charges", "Security Deposit", "Configuration",
+    "Facing", "Furnishing Status", "Micromarket", "Area", "Available From", "Floor Number",
+    "Inventory Status",
+    "Lease Period", "Lock-in Period", "Amenities", "Extra details", "Restrictions",
+    "Veg/Non Veg", "Pet friendly", "Drive Link", "mapLocation", "Coordinates",
+    "Date of inventory added", "Date of Status Last Checked", "Agent Id", "Agent Number", "Agent Name", "Exact Floor"
+]
+
+# Form fields of a listing, as stored in Firestore
+LISTING_FIELDS = [
+    "propertyName", "propertyType", "plotSize", "SBUA", "rentPerMonthInLakhs", "commissionType",
+    "maintenanceCharges", "securityDeposit", "configuration", "facing", "furnishingStatus",
+    "micromarket", "area", "availableFrom", "floorNumber", "exactFloor", "leasePeriod",
+    "lockInPeriod", "amenities", "extraDetails", "restrictions", "vegNonVeg", "petFriendly",
+    "mapLocation", "coordinates", "agentNumber",
+]
+# The four the form always listed, plus Rent Per Month, which it checked on its own before them
+REQUIRED_FIELDS = {
+    "propertyName": "Property Name",
+    "propertyType": "Property Type",
+    "agentNumber": "Agent Number",
+    "micromarket": "Micromarket",
+    "rentPerMonthInLakhs": "Rent Per Month",
+}
+
+# -------------------------------------
+# HELPER FUNCTIONS
+# -------------------------------------
+def parse_coordinates(coord_str: str):
+    try:
+        parts = coord_str.split(",")
+        if len(parts) != 2:
+            return None
+        return {"lat": float(parts[0].strip()), "lng": float(parts[1].strip())}
+    except Exception:
+        return None
+
+def standardize_phone_number(num: str) -> str:
+    num = num.strip().replace(" ", "")
+    if not num.startswith("+91"):
+        if num.startswith("91"):
+            num = "+" + num
+        else:
+            num = "+91" + num
+    return num
+
+def strip_plus91(num: str) -> str:
+    num = num.strip()
+    return num[3:] if num.startswith("+91") else num
+
+def compute_floor_range(exact_floor):
+    try:
+        floor = float(exact_floor)
+    except Exception:
+        return "NA"
+    if floor == 0:
+        return "Ground Floor"
+    elif floor <= 5:
+        return "Lower Floor (1-5)"
+    elif floor <= 10:
+        return "Middle Floor (6-10)"
+    elif floor <= 20:
+        return "Higher Floor (10+)"
+    else:
+        return "Higher Floor (20+)"
+
+# -------------------------------------
+# VALIDATION
+# -------------------------------------
+def missing_listing_fields(fields: dict) -> list:
+    """Labels of required fields that are empty, in form order."""
+    return [label for key, label in REQUIRED_FIELDS.items() if not str(fields.get(key) or "").strip()]
+
+def clean_listing_fields(fields: dict) -> dict:
+    """Applies the form's input rules to fields from another source (e.g. the ingestion API).
+
+    Unknown keys are dropped; text is stripped of whitespace and quotes as the form
+    inputs do; area, floor range and studio configuration are derived as in the form.
+    """
+    cleaned = {key: str(fields.get(key) or "").strip().replace("'", "") for key in LISTING_FIELDS}
+    if cleaned["propertyType"].lower() == "studio":
+        cleaned["configuration"] = "Studio"
+    if cleaned["exactFloor"]:
+        cleaned["floorNumber"] = compute_floor_range(cleaned["exactFloor"])
+    cleaned["area"] = find_area(cleaned["micromarket"]) if cleaned["micromarket"] else ""
+    if not cleaned["availableFrom"]:
+        cleaned["availableFrom"] = "Ready-to-move"
+    return cleaned
+
+def validate_listing_fields(fields: dict) -> list:
+    """Error messages for a cleaned listing; empty when it can be submitted."""
+    errors = [f"{label} is required" for label in missing_listing_fields(fields)]
+    if fields.get("micromarket") and fields["micromarket"] not in micromarket_to_area:
+        errors.append(f"Unknown micromarket: {fields['micromarket']}")
+    if fields.get("coordinates") and not parse_coordinates(fields["coordinates"]):
+        errors.append("Coordinates must be 'lat, lng'")
+    return errors
+
+# -------------------------------------
+# SHEETS
+# -------------------------------------
+def ensure_sheet_header():
+    sheet = get_backends().sheet
+    if sheet.row_values(1) != SHEET_HEADER:
+        sheet.update("A1:AG1", [SHEET_HEADER])
+
+@cached(ttl=300)  # Shared across server processes; invalidated after every append
+def get_next_row_index():
+    values = get_backends().sheet.get_all_values()
+    return len(values) + 1
+
+def sheet_inline() -> bool:
+    return SHEET_SYNC == "inline"
+
+# Journal workers append concurrently; serialize so two rows never get the same index.
+# Media worker processes (media_workers.py) set SHEET_LOCK_FILE to serialize across processes.
+SHEET_LOCK_FILE = os.getenv("SHEET_LOCK_FILE", "")
+sheet_append_lock = FileLock(SHEET_LOCK_FILE) if SHEET_LOCK_FILE else threading.Lock()
+
+@traced("sheet_append")
+def append_to_google_sheet(row: list):
+    try:
+        with sheet_append_lock:
+            next_row = get_next_row_index()
+            get_backends().sheet.update(f"A{next_row}:AG{next_row}", [row])
+            get_next_row_index.clear()
+        logger.info(f"Row added at position {next_row}")
+        return True
+    except Exception as e:
+        logger.error(f"Sheet error: {e}")
+        return False
+
+# -------------------------------------
+# FIRESTORE
+# -------------------------------------
+@traced("agent_lookup")
+@cached(ttl=300)  # Cache for 5 minutes
+def fetch_agent_details(agent_number: str):
+    data = get_backends().listings.find_agent(standardize_phone_number(agent_number))
+    if data:
+        return data.get("cpId"), data.get("name")
+    return None, None
+
+# Not cached: a shared value would hand every process the same candidate; the reservations decide
+@traced("id_generation")
+def generate_property_id():
+    max_id = 0
+    # Only the propertyId field is fetched, not whole listings
+    for _, data in get_backends().listings.stream(fields=["propertyId"]):
+        pid = data.get("propertyId")
+        if pid and pid.startswith("RN"):
+            try:
+                num = int(pid.replace("RN", ""))
+                max_id = max(max_id, num)
+            except Exception:
+                pass
+    return f"RN{max_id + 1:03d}"
+
+# -------------------------------------
+# MEDIA (Storage & Drive)
+# -------------------------------------
+@traced("storage_upload")
+def upload_media_to_firebase(property_id: str, file_obj: BytesIO, folder: str, filename: str) -> str:
+    path = f"{MEDIA_PREFIX}/{property_id}/{folder}/{filename}"
+    try:
+        return get_backends().media.upload(path, file_obj.getvalue())
+    except Exception as e:
+        logger.error(f"Firebase error ({filename}): {e}")
+        return ""
+
+@traced("drive_folder")
+@cached(ttl=600, cache_empty=False)  # Cache for 10 minutes; failed lookups are retried
+def create_drive_folder(folder_name: str, parent_id: str) -> str:
+    drive = get_backends().drive
+    try:
+        folder_id = drive.find_folder(folder_name, parent_id)
+    except Exception as e:
+        logger.error(f"Error querying drive folders: {e}")
+        return ""
+    if folder_id:
+        return folder_id
+    try:
+        return drive.create_folder(folder_name, parent_id)
+    except Exception as e:
+        logger.error(f"Drive folder error ({folder_name}): {e}")
+        return ""
+
+@traced("drive_upload")
+def upload_media_to_drive(file_obj: BytesIO, filename: str, parent_folder_id: str):
+    try:
+        file_id = get_backends().drive.upload_public(file_obj.getvalue(), filename, parent_folder_id)
+        return f"https://drive.google.com/file/d/{file_id}/view?usp=sharing"
+    except Exception as e:
+        logger.error(f"Drive upload error ({filename}): {e}")
+        return None
+
+# Optimized file upload with progress tracking
+def upload_single_file(file, property_id, folder, drive_folder_id, progress_callback=None):
+    filename = file.name
+    file_bytes = BytesIO(file.read())
+    fb_url = upload_media_to_firebase(property_id, file_bytes, folder, filename)
+    dlink = None
+    if drive_folder_id:
+        dlink = upload_media_to_drive(file_bytes, filename, drive_folder_id)
+    if progress_callback:
+        progress_callback()
+    return fb_url, dlink
+
+def hash_uploaded_photo(file):
+    try:
+        return photo_dhash(file.getvalue())
+    except Exception as e:
+        logger.error(f"Photo hash error ({file.name}): {e}")
+        return None
+
+def hash_photos_concurrent(files) -> dict:
+    # Keyed by position: two photos may share a filename
+    if not files:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(4, len(files))) as executor:
+        hashes = executor.map(hash_uploaded_photo, files)
+        return {i: value for i, value in enumerate(hashes) if value is not None}
+
+def traced_upload(upload_func, file, property_id, folder, drive_folder_id):
+    with span("upload_file", folder=folder, filename=file.name):
+        return upload_func(file, property_id, folder, drive_folder_id)
+
+def process_files_concurrent(files, property_id, folder, drive_folder_id, progress_placeholder=None, upload_func=upload_single_file):
+    if not files:
+        return [], []
+
+    firebase_urls = []
+    drive_links = []
+    file_count = len(files)
+
+    # Determine optimal number of workers based on file count
+    max_workers = min(4, file_count)  # Max 4 workers, but no more than needed
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(bind_context(traced_upload), upload_func, file, property_id, folder, drive_folder_id)
+            for file in files
+        ]
+        for future in futures:
+            fb_url, dlink = future.result()
+            if fb_url:
+                firebase_urls.append(fb_url)
+            if dlink:
+                drive_links.append(dlink)
+
+    return firebase_urls, drive_links
+
+# -------------------------------------
+# SUBMISSION
+# -------------------------------------
+def new_property_data(fields: dict, property_id: str, agent_id: str, agent_name: str, photo_hashes: dict = None) -> dict:
+    """Completes the form fields into a listing; media links are filled in when the journal is drained."""
+    timestamp = int(datetime.datetime.now().timestamp())
+    geoloc = parse_coordinates(fields.get("coordinates", ""))
+    return {
+        "propertyId": property_id,
+        **fields,
+        "_geoloc": geoloc,
+        "geohash": geohash_for(geoloc),
+        "dateOfInventoryAdded": timestamp,
+        "dateOfStatusLastChecked": timestamp,
+        "agentId": agent_id,
+        "agentNumber": standardize_phone_number(fields["agentNumber"]),
+        "agentName": agent_name,
+        "driveLink": "",
+        "photos": [],
+        "photoHashes": [hash_to_hex(value) for value in (photo_hashes or {}).values()],
+        "videos": [],
+        "documents": [],
+        "driveFileLinks": [],
+        "inventoryStatus": "Available"  # Default status for new listings
+    }
+
+def submit_listing(journal, fields: dict, media: list, token: str = None, agent_id: str = "", agent_name: str = "", photo_hashes: dict = None):
+    """Reserves a property ID and journals the listing with its media [(folder, filename, bytes), ...].
+
+    Returns (property_id, property_data); uploads and saving happen when the journal is drained.
+    The ID is claimed in Firestore before returning, so the one shown to the agent is final.
+    """
+    token = token or uuid.uuid4().hex
+    # Reserve a property ID (never reused while earlier submissions are still queued)...
+    property_id = journal.reserve_property_id(int(generate_property_id()[2:]), token=token)
+    # ...and claim it across instances; a replayed token gets its own claim back
+    with span("id_claim", propertyId=property_id):
+        property_id = claim_free_property_id(journal, token, property_id)
+
+    # Fetch agent details if not already fetched
+    if not agent_id or not agent_name:
+        agent_id, agent_name = fetch_agent_details(fields["agentNumber"])
+        agent_id = agent_id or ""
+        agent_name = agent_name or ""
+
+    property_data = new_property_data(fields, property_id, agent_id, agent_name, photo_hashes)
+    with span("journal_enqueue", propertyId=property_id, files=len(media)):
+        journal.enqueue(property_id, {"property_data": property_data}, media, token=token)
+    return property_id, property_data
+
+# -------------------------------------
+# SUBMISSION JOURNAL (background draining)
+# -------------------------------------
+def build_sheet_row(property_data: dict) -> list:
+    # Tolerates listings written before a field existed (the sheet projector replays every listing)
+    def date(field):
+        ts = property_data.get(field)
+        return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d") if ts else ""
+    added, checked = date("dateOfInventoryAdded"), date("dateOfStatusLastChecked")
+    return [
+        property_data.get("propertyId", ""),
+        property_data.get("propertyName", ""),
+        property_data.get("propertyType", ""),
+        property_data.get("plotSize", ""),
+        property_data.get("SBUA", ""),
+        property_data.get("rentPerMonthInLakhs", ""),
+        property_data.get("commissionType", ""),
+        property_data.get("maintenanceCharges", ""),
+        property_data.get("securityDeposit", ""),
+        property_data.get("configuration", ""),
+        property_data.get("facing", ""),
+        property_data.get("furnishingStatus", ""),
+        property_data.get("micromarket", ""),
+        property_data.get("area", ""),
+        property_data.get("availableFrom", ""),
+        property_data.get("floorNumber", ""),
+        property_data.get("inventoryStatus", ""),
+        property_data.get("leasePeriod", ""),
+        property_data.get("lockInPeriod", ""),
+        property_data.get("amenities", ""),
+        property_data.get("extraDetails", ""),
+        property_data.get("restrictions", ""),
+        property_data.get("vegNonVeg", ""),
+        property_data.get("petFriendly", ""),
+        property_data.get("driveLink", ""),
+        property_data.get("mapLocation", ""),
+        property_data.get("coordinates", ""),
+        added,
+        checked,
+        property_data.get("agentId", ""),
+        strip_plus91(property_data.get("agentNumber", "")),
+        property_data.get("agentName", ""),
+        property_data.get("exactFloor", "")
+    ]
+
+def _require(value, what: str):
+    # The service helpers log and return ""/None/False on failure; the journal needs an exception to retry
+    if not value:
+        raise RuntimeError(f"{what} failed")
+    return value
+
+def upload_journaled_file(journal, entry, file, property_id, folder, drive_folder_id, progress_callback=None):
+    step_key = f"{folder}/{os.path.basename(file.path)}"
+    fb_url = journal.step(entry, f"storage:{step_key}", lambda: _require(
+        upload_media_to_firebase(property_id, BytesIO(file.read()), folder, file.name), f"Firebase upload of {file.name}"
+    ))
+    dlink = None
+    if drive_folder_id:
+        dlink = journal.step(entry, f"drive:{step_key}", lambda: _require(
+            upload_media_to_drive(BytesIO(file.read()), file.name, drive_folder_id), f"Drive upload of {file.name}"
+        ))
+    if progress_callback:
+        progress_callback()
+    return fb_url, dlink
+
+def claim_free_property_id(journal, submission_id: str, property_id: str) -> str:
+    """Claims property_id in Firestore for the submission, moving on to a new ID while it is taken.
+
+    IDs are reserved per journal, so another app instance (or the ingest API on
+    another host) can hold the same number; the later claimant moves on.
+    """
+    listings = get_backends().listings
+    while True:
+        if listings.reserve_id(property_id, submission_id) == submission_id:
+            existing = listings.get(property_id)
+            # A listing without a reservation was written by an older app version
+            if existing is None or existing.get("submissionId") == submission_id:
+                return property_id
+        taken = property_id
+        property_id = journal.reassign_property_id(submission_id, max(int(generate_property_id()[2:]), int(taken[2:]) + 1))
+        logger.warning(f"Property ID {taken} is taken; submission {submission_id} moved to {property_id}")
+
+def claim_property_id(journal, entry) -> str:
+    """Confirms the submission's claim before anything is stored under its ID.
+
+    submit_listing claims it already; this covers submissions journaled before it did.
+    """
+    entry["property_id"] = claim_free_property_id(journal, entry["id"], entry["property_id"])
+    return entry["property_id"]
+
+def save_listing(entry, property_id: str, property_data: dict) -> bool:
+    """Creates the listing document; never overwrites a listing of another submission."""
+    listings = get_backends().listings
+    with span("firestore_write", propertyId=property_id):
+        if not listings.create(property_id, {**property_data, "submissionId": entry["id"]}):
+            # Our own write that went through before the step was recorded is fine
+            existing = listings.get(property_id) or {}
+            if existing.get("submissionId") != entry["id"]:
+                raise BackendError(f"Property ID {property_id} already holds another listing")
+    return True
+
+def drain_submission(journal, entry):
+    with span("drain_submission", propertyId=entry["property_id"], attempt=entry["attempts"]):
+        drain_submission_steps(journal, entry)
+
+def drain_submission_steps(journal, entry):
+    """Pushes one journaled submission to Drive, Storage, Firestore and Sheets; completed steps are skipped on retry."""
+    property_id = journal.step(entry, "property_id", lambda: claim_property_id(journal, entry))
+    property_data = dict(entry["payload"]["property_data"], propertyId=property_id)
+
+    drive_folder_id = ""
+    if entry["media"]:
+        drive_folder_id = journal.step(entry, "drive_folder", lambda: _require(
+            create_drive_folder(property_id, PARENT_FOLDER_ID), "Drive folder creation"
+        ))
+        property_data["driveLink"] = f"https://drive.google.com/drive/folders/{drive_folder_id}"
+
+    total = len(entry["media"])
+    uploaded = [0]
+    progress_lock = threading.Lock()
+
+    def file_done():
+        with progress_lock:
+            uploaded[0] += 1
+            journal.report_progress(entry, "uploading", uploaded[0], total)
+
+    journal.report_progress(entry, "uploading", 0, total)
+    drive_file_links = []
+    for folder in ("photos", "videos", "documents"):
+        files = [file for file in entry["media"] if file.folder == folder]
+        urls, links = process_files_concurrent(
+            files, property_id, folder, drive_folder_id,
+            upload_func=partial(upload_journaled_file, journal, entry, progress_callback=file_done),
+        )
+        property_data[folder] = urls
+        drive_file_links += links
+    property_data["driveFileLinks"] = drive_file_links
+
+    journal.report_progress(entry, "saving", total, total)
+    journal.step(entry, "firestore", lambda: save_listing(entry, property_id, property_data))
+    if sheet_inline():
+        journal.step(entry, "sheet", lambda: _require(append_to_google_sheet(build_sheet_row(property_data)), "Google Sheet append"))
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("TRACE_ENABLED", "0")
+
+from backends import memory_backends, set_backends  # noqa: E402
+from shared_cache import LRUBackend, set_backend  # noqa: E402
+
+
+@pytest.fixture
+def backends():
+    """Fresh in-memory backends (no simulated latency) and an empty shared cache."""
+    fakes = memory_backends()
+    set_backends(fakes)
+    set_backend(LRUBackend())
+    yield fakes
+    set_backends(None)
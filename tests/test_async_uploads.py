@@ -0,0 +1,90 @@
+import asyncio
+import threading
+
+import pytest
+
+from async_uploads import _gather_all, drain_submission_bridged, run_sync
+from submission_journal import SubmissionJournal
+from submission_pipeline import submit_listing
+
+FIELDS = {
+    "propertyName": "Test Residency",
+    "propertyType": "Apartment",
+    "agentNumber": "9876543210",
+    "micromarket": "HSR Layout",
+    "rentPerMonthInLakhs": "0.5",
+}
+MEDIA = [("photos", "a.jpg", b"photo a"), ("photos", "b.jpg", b"photo b"), ("documents", "lease.pdf", b"lease")]
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return SubmissionJournal(str(tmp_path / "journal"))
+
+
+def test_drain_uploads_every_file_and_saves_the_listing(backends, journal):
+    property_id, _ = submit_listing(journal, FIELDS, MEDIA, token="t1")
+    entry = journal.claim()
+    drain_submission_bridged(journal, entry)
+    doc = backends.listings.docs[property_id]
+    assert [url.rsplit("/", 1)[1] for url in doc["photos"]] == ["a.jpg", "b.jpg"]
+    assert len(doc["documents"]) == 1 and len(doc["driveFileLinks"]) == 3
+    assert len(backends.media.objects) == 3
+    assert backends.sheet.rows[-1][0] == property_id
+    assert journal.find_submission("t1")["stage"] == "saving"
+
+
+def test_failed_upload_is_retried_without_repeating_finished_ones(backends, journal, monkeypatch):
+    submit_listing(journal, FIELDS, MEDIA, token="t1")
+    entry = journal.claim()
+    upload = backends.media.upload_async
+    failures = []
+
+    async def flaky(path, source, *args):
+        if path.endswith("b.jpg") and not failures:
+            failures.append(path)
+            raise RuntimeError("storage unavailable")
+        return await upload(path, source, *args)
+
+    monkeypatch.setattr(backends.media, "upload_async", flaky)
+    with pytest.raises(RuntimeError, match="storage unavailable"):
+        drain_submission_bridged(journal, entry)
+    # The other transfers of the failed attempt still finished and were recorded
+    assert backends.media.network.calls["storage.upload"] == 2
+    assert backends.drive.network.calls["drive.upload"] == 3
+    drain_submission_bridged(journal, entry)
+    assert backends.media.network.calls["storage.upload"] == 3
+    assert backends.drive.network.calls["drive.upload"] == 3
+
+
+def test_gather_all_waits_for_every_transfer_before_raising():
+    finished = []
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        finished.append("slow")
+        return "slow"
+
+    async def failing():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError, match="boom"):
+        run_sync(_gather_all(failing(), slow()))
+    assert finished == ["slow"]
+    assert run_sync(_gather_all(slow(), slow())) == ["slow", "slow"]
+
+
+def test_run_sync_shares_one_loop_across_threads():
+    loops = []
+
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    threads = [threading.Thread(target=lambda: loops.append(run_sync(current_loop()))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(loops)) == 1
+    with pytest.raises(asyncio.TimeoutError):
+        run_sync(asyncio.sleep(1), timeout=0.01)
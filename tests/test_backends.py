@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from backends import BackendError, FakeNetwork, ListingFeed, MemoryListingStore, RateLimitError
+
+
+def run(network: FakeNetwork, count: int) -> list:
+    """Outcome of each of `count` calls."""
+    outcomes = []
+    for _ in range(count):
+        try:
+            network.call("firestore.get")
+            outcomes.append("ok")
+        except BackendError:
+            outcomes.append("error")
+    return outcomes
+
+
+def profile(seed: int):
+    sleeps = []
+    network = FakeNetwork(latency_ms=20, jitter_ms=10, error_rate=0.3, seed=seed, sleep=sleeps.append)
+    return sleeps, run(network, 50)
+
+
+def test_same_seed_sees_the_same_delays_and_failures():
+    assert profile(1) == profile(1)
+    assert profile(1) != profile(2)
+    sleeps, outcomes = profile(1)
+    assert all(0.010 <= delay <= 0.030 for delay in sleeps)
+    assert 0 < outcomes.count("error") < 50
+
+
+def test_bandwidth_adds_transfer_time():
+    sleeps = []
+    network = FakeNetwork(latency_ms=5, bandwidth_mbps=8, sleep=sleeps.append)
+    network.call("gcs.upload", nbytes=1_000_000)
+    assert sleeps == [pytest.approx(1.005)]
+
+
+def test_counters_track_calls_errors_and_bytes():
+    network = FakeNetwork(error_rate=1.0, sleep=lambda _: None)
+    with pytest.raises(BackendError):
+        network.call("drive.create", nbytes=10)
+    assert (network.calls["drive.create"], network.errors["drive.create"], network.bytes["drive.create"]) == (1, 1, 10)
+    network.reset_counters()
+    assert not network.calls and not network.errors and not network.bytes
+
+
+def test_calls_beyond_the_rate_limit_are_throttled():
+    network = FakeNetwork(rate_limit_per_s=3)
+    for _ in range(3):
+        network.call("sheets.update")
+    with pytest.raises(RateLimitError):
+        network.call("sheets.update")
+    assert network.throttled["sheets.update"] == 1
+    # Throttled calls are still counted
+    assert network.calls["sheets.update"] == 4
+
+
+def test_async_calls_inject_failures_too():
+    network = FakeNetwork(latency_ms=1, error_rate=1.0)
+    with pytest.raises(BackendError):
+        asyncio.run(network.acall("gcs.upload"))
+    assert network.errors["gcs.upload"] == 1
+
+
+def test_feed_opens_one_watch_for_every_subscriber():
+    store = MemoryListingStore(FakeNetwork())
+    store.set("RN001", {"propertyId": "RN001"})
+    feed = ListingFeed(store)
+    first, second = [], []
+    feed.watch(first.extend)
+    store.set("RN002", {"propertyId": "RN002"})
+    # A late subscriber starts from the current listings
+    unsubscribe = feed.watch(second.extend)
+    assert len(store._watchers) == 1
+    assert sorted(pid for _, pid, _ in second) == ["RN001", "RN002"]
+    store.delete("RN001")
+    assert first[-1][:2] == second[-1][:2] == ("REMOVED", "RN001")
+    unsubscribe()
+    store.set("RN003", {"propertyId": "RN003"})
+    assert first[-1][1] == "RN003" and second[-1][1] == "RN001"
+    assert len(feed) == 2
+
+
+def test_feed_keeps_delivering_after_a_subscriber_fails():
+    store = MemoryListingStore(FakeNetwork())
+    feed = ListingFeed(store)
+    received = []
+
+    def broken(changes):
+        if changes:
+            raise ValueError("index bug")
+
+    feed.watch(broken)
+    feed.watch(received.extend)
+    store.set("RN001", {"propertyId": "RN001"})
+    assert received == [("ADDED", "RN001", {"propertyId": "RN001"})]
+    feed.stop()
+    store.set("RN002", {})
+    assert len(received) == 1
@@ -0,0 +1,42 @@
+from duplicate_index import DuplicateIndex, normalize_name
+
+FLAT = {
+    "propertyId": "RN001", "propertyName": "Prestige Lakeside Apartments", "micromarket": "Whitefield",
+    "configuration": "3 BHK", "exactFloor": "4", "_geoloc": {"lat": 12.96812, "lng": 77.74985},
+}
+
+
+def test_normalize_name_drops_filler_words():
+    assert normalize_name("The Prestige Lakeside Apts.") == "prestige lakeside"
+
+
+def test_same_flat_is_found_by_name_or_location():
+    index = DuplicateIndex()
+    index.upsert(FLAT)
+    renamed = {**FLAT, "propertyId": None, "propertyName": "Lakeside"}
+    respelled = {**FLAT, "propertyId": None, "propertyName": "prestige lakeside", "exactFloor": "4.0", "_geoloc": None}
+    assert [c["propertyId"] for c in index.find_candidates(renamed)] == ["RN001"]
+    assert [c["propertyId"] for c in index.find_candidates(respelled)] == ["RN001"]
+
+
+def test_nearby_point_across_a_cell_boundary_matches():
+    index = DuplicateIndex()
+    index.upsert({**FLAT, "_geoloc": {"lat": 12.9685, "lng": 77.7495}})
+    probe = {**FLAT, "propertyId": None, "propertyName": "", "_geoloc": {"lat": 12.96849, "lng": 77.74949}}
+    assert index.find_candidates(probe)
+
+
+def test_other_floor_or_configuration_is_not_a_duplicate():
+    index = DuplicateIndex()
+    index.upsert(FLAT)
+    assert index.find_candidates({**FLAT, "propertyId": None, "exactFloor": "5"}) == []
+    assert index.find_candidates({**FLAT, "propertyId": None, "configuration": "2 BHK"}) == []
+
+
+def test_a_listing_never_matches_itself_and_removal_is_followed():
+    index = DuplicateIndex()
+    index._on_changes([("ADDED", "RN001", FLAT)])
+    assert index.find_candidates(FLAT) == []
+    index._on_changes([("REMOVED", "RN001", {})])
+    assert index.find_candidates({**FLAT, "propertyId": None}) == []
+    assert len(index) == 0
@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+import facet_index
+from facet_index import BLANK, FacetIndex, facet_value
+
+MICROMARKETS = ["HSR Layout", "Koramangala", "Whitefield", "Indiranagar"]
+CONFIGURATIONS = ["1 BHK", "2 BHK", "3 BHK"]
+
+
+def make_listings(count: int, seed: int = 5) -> dict:
+    rng = random.Random(seed)
+    return {
+        f"RN{n:03d}": {
+            "propertyId": f"RN{n:03d}",
+            "micromarket": rng.choice(MICROMARKETS),
+            "configuration": rng.choice(CONFIGURATIONS),
+            "petFriendly": rng.choice(["", "Yes", "No"]),
+        }
+        for n in range(1, count + 1)
+    }
+
+
+def matches(data: dict, filters: dict) -> bool:
+    return all(facet_value(data, field) in values for field, values in filters.items() if values)
+
+
+def brute_counts(listings: dict, filters: dict) -> dict:
+    counts = {}
+    for field in facet_index.FACETS:
+        others = {f: v for f, v in filters.items() if f != field}
+        field_counts = counts[field] = {}
+        for data in listings.values():
+            if matches(data, others):
+                value = facet_value(data, field)
+                field_counts[value] = field_counts.get(value, 0) + 1
+    return counts
+
+
+@pytest.fixture
+def listings():
+    return make_listings(500)
+
+
+@pytest.fixture
+def index(listings):
+    index = FacetIndex()
+    index._on_changes([("ADDED", pid, data) for pid, data in listings.items()])
+    return index
+
+
+def test_facet_value_of_missing_or_list_fields():
+    assert facet_value({}, "micromarket") == BLANK
+    assert facet_value({"amenities": ["Gym", "Pool"]}, "amenities") == "Gym"
+
+
+@pytest.mark.parametrize("filters", [
+    {},
+    {"configuration": ["2 BHK", "3 BHK"]},
+    {"micromarket": ["HSR Layout"], "petFriendly": ["Yes"]},
+    {"micromarket": ["Whitefield"], "configuration": ["1 BHK"], "petFriendly": [BLANK]},
+])
+def test_query_matches_brute_force(index, listings, filters):
+    result = index.query(filters, limit=1000)
+    expected = sorted(pid for pid, data in listings.items() if matches(data, filters))
+    assert sorted(row["propertyId"] for row in result["listings"]) == expected
+    assert result["total"] == len(expected)
+    assert result["counts"] == brute_counts(listings, filters)
+
+
+def test_sparse_and_dense_counts_agree(index, listings, monkeypatch):
+    filters = {"micromarket": ["Koramangala"]}
+    monkeypatch.setattr(facet_index, "SPARSE_RATIO", 0)
+    dense = index.query(filters)["counts"]
+    monkeypatch.setattr(facet_index, "SPARSE_RATIO", 10 ** 6)
+    assert index.query(filters)["counts"] == dense == brute_counts(listings, filters)
+
+
+def test_expressions(index, listings):
+    expr = ("or", {"micromarket": ["HSR Layout"]}, ("and", ("configuration", "3 BHK"), ("not", ("petFriendly", "No"))))
+    expected = sorted(
+        pid for pid, data in listings.items()
+        if data["micromarket"] == "HSR Layout" or (data["configuration"] == "3 BHK" and data["petFriendly"] != "No")
+    )
+    assert sorted(index.property_ids(expr)) == expected
+
+
+def test_updates_and_removals_reuse_document_numbers(index, listings):
+    index._on_changes([("MODIFIED", "RN001", {**listings["RN001"], "micromarket": "Nowhere"})])
+    assert index.property_ids(("micromarket", "Nowhere")) == ["RN001"]
+    index._on_changes([("REMOVED", "RN002", {})])
+    assert "RN002" not in index.property_ids({})
+    index.upsert("RN900", {"micromarket": "Nowhere"})
+    # The freed number is reused, so the bitmaps do not grow
+    assert index._docno["RN900"] == 1
+    assert sorted(index.property_ids(("micromarket", "Nowhere"))) == ["RN001", "RN900"]
+    assert len(index) == len(listings)
@@ -0,0 +1,42 @@
+import pytest
+
+from area_data import micromarket_to_area
+from gazetteer import area_for, normalize, resolve_micromarket, search_micromarkets
+
+
+def test_normalize_strips_punctuation_and_case():
+    assert normalize("  J. P.  Nagar ") == "j p nagar"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("HSR Layout", "HSR Layout"),
+    ("hsr layout", "HSR Layout"),
+    ("HSR", "HSR Layout"),
+    ("J.P. Nagar", "JP Nagar"),
+    ("Kormangala", "Koramangala"),
+    ("Ecity", "Electronic City"),
+    ("Nowhere", ""),
+])
+def test_resolve_exact_names_and_aliases(text, expected):
+    assert resolve_micromarket(text) == expected
+
+
+def test_area_for_alias():
+    assert area_for("WF") == micromarket_to_area["Whitefield"]
+    assert area_for("Nowhere") == ""
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("hsr", "HSR Layout"),
+    ("koramangla", "Koramangala"),
+    ("ecity", "Electronic City"),
+    ("white", "Whitefield"),
+])
+def test_typeahead_ranks_the_intended_micromarket_first(query, expected):
+    assert search_micromarkets(query)[0] == expected
+
+
+def test_typeahead_limits_and_rejects_noise():
+    assert len(search_micromarkets("nagar", limit=5)) == 5
+    assert search_micromarkets("") == []
+    assert search_micromarkets("zzqx") == []
@@ -0,0 +1,63 @@
+import random
+from collections import defaultdict
+
+import pytest
+
+import geo_locator
+from area_data import micromarketCentroids
+from geo_locator import check_micromarket, haversine_km, nearest_micromarkets, suggest_micromarket
+
+HSR = {"lat": 12.9121, "lng": 77.6446}
+
+
+class CountingGrid(defaultdict):
+    def __init__(self, grid):
+        super().__init__(list, grid)
+        self.lookups = 0
+
+    def get(self, key, default=None):
+        self.lookups += 1
+        return super().get(key, default)
+
+
+def brute_force(lat: float, lng: float, k: int, max_km: float = None) -> list:
+    ranked = sorted((haversine_km(lat, lng, m_lat, m_lng), name) for name, (m_lat, m_lng) in micromarketCentroids.items())
+    return [name for dist, name in ranked[:k] if max_km is None or dist <= max_km]
+
+
+@pytest.mark.parametrize("max_km", [None, 1.0, 5.0])
+def test_nearest_matches_brute_force(max_km):
+    rng = random.Random(5)
+    for _ in range(200):
+        lat, lng = 12.9 + rng.uniform(-0.15, 0.15), 77.6 + rng.uniform(-0.15, 0.15)
+        assert [name for name, _, _ in nearest_micromarkets(lat, lng, k=3, max_km=max_km)] == brute_force(lat, lng, 3, max_km)
+
+
+def test_max_km_bounds_the_ring_search(monkeypatch):
+    grid = CountingGrid(geo_locator._grid)
+    monkeypatch.setattr(geo_locator, "_grid", grid)
+    # Mumbai: no centroid within reach, so only the rings inside max_km are visited
+    assert nearest_micromarkets(19.076, 72.8777, k=1, max_km=5.0) == []
+    assert grid.lookups == 9 ** 2
+
+
+def test_swapped_coordinates_get_no_suggestion():
+    swapped = {"lat": HSR["lng"], "lng": HSR["lat"]}
+    assert suggest_micromarket(swapped) is None
+    ok, dist = check_micromarket("HSR Layout", swapped)
+    assert not ok and dist > 1000
+
+
+def test_out_of_city_point_is_flagged():
+    mysuru = {"lat": 12.2958, "lng": 76.6394}
+    assert suggest_micromarket(mysuru) is None
+    assert check_micromarket("HSR Layout", mysuru)[0] is False
+
+
+def test_point_inside_a_micromarket_is_accepted():
+    name, _, dist = suggest_micromarket(HSR)
+    assert name == "HSR Layout" and dist < 1
+    assert check_micromarket("HSR Layout", HSR) == (True, dist)
+    # Unknown micromarkets and missing coordinates are not checked
+    assert check_micromarket("Nowhere", HSR) == (True, None)
+    assert check_micromarket("HSR Layout", None) == (True, None)
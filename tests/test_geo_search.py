@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from geo_locator import haversine_km
+from geo_search import backfill_geohashes, covering_cells, geohash_encode, geohash_for, nearby_listings
+
+CENTRE = (12.9121, 77.6446)     # HSR Layout
+
+
+def test_geohash_encode_known_value():
+    assert geohash_encode(57.64911, 10.40744) == "u4pruydqq"
+    assert geohash_for({"lat": 57.64911, "lng": 10.40744}) == "u4pruydqq"
+    assert geohash_for(None) == ""
+
+
+@pytest.mark.parametrize("radius_km", [0.2, 1.0, 2.0, 5.0, 25.0])
+def test_cover_holds_every_point_in_the_circle(radius_km):
+    cells = covering_cells(*CENTRE, radius_km)
+    assert len(cells) <= 9
+    rng = random.Random(int(radius_km * 10))
+    for _ in range(2000):
+        lat = CENTRE[0] + rng.uniform(-1, 1) * radius_km / 111.32
+        lng = CENTRE[1] + rng.uniform(-1, 1) * radius_km / 108.5
+        if haversine_km(*CENTRE, lat, lng) <= radius_km:
+            assert geohash_encode(lat, lng).startswith(tuple(cells))
+
+
+@pytest.fixture
+def placed(backends):
+    rng = random.Random(3)
+    points = {}
+    for number in range(1, 301):
+        lat, lng = CENTRE[0] + rng.uniform(-0.05, 0.05), CENTRE[1] + rng.uniform(-0.05, 0.05)
+        property_id = f"RN{number:03d}"
+        points[property_id] = (lat, lng)
+        geoloc = {"lat": lat, "lng": lng}
+        backends.listings.set(property_id, {"propertyId": property_id, "_geoloc": geoloc, "geohash": geohash_for(geoloc)})
+    return points
+
+
+@pytest.mark.parametrize("radius_km", [0.5, 2.0, 4.0])
+def test_nearby_listings_match_brute_force(backends, placed, radius_km):
+    expected = sorted(pid for pid, point in placed.items() if haversine_km(*CENTRE, *point) <= radius_km)
+    found = nearby_listings(backends.listings, *CENTRE, radius_km)
+    assert sorted(data["propertyId"] for data in found) == expected
+    distances = [data["distanceKm"] for data in found]
+    assert distances == sorted(distances)
+
+
+def test_backfill_writes_missing_geohashes(backends, placed):
+    backends.listings.update("RN001", {"geohash": ""})
+    assert backfill_geohashes(backends.listings) == 1
+    assert backends.listings.docs["RN001"]["geohash"] == geohash_encode(*placed["RN001"])
@@ -0,0 +1,74 @@
+import importlib.util
+import os
+
+import pytest
+
+pytest.importorskip("httplib2")
+pytest.importorskip("google.auth.transport.requests")
+
+from google.auth.credentials import AnonymousCredentials  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load(relative_path: str):
+    name = relative_path.replace("/", "_").removesuffix(".py")
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(params=["http_transport.py", "v2/http_transport.py"])
+def transport(request):
+    return load(request.param)
+
+
+class Response:
+    def __init__(self, status_code: int, headers: dict, content: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+
+class Session:
+    def __init__(self, response: Response):
+        self.response = response
+        self.calls = []
+        self.closed = False
+
+    def request(self, method, uri, **kwargs):
+        self.calls.append((method, uri, kwargs))
+        return self.response
+
+    def close(self):
+        self.closed = True
+
+
+def test_response_maps_status_and_headers(transport):
+    session = Session(Response(200, {"Content-Type": "application/json", "ETag": "abc"}, b'{"id": "1"}'))
+    http = transport.SessionHttp(session, timeout=7)
+    resp, content = http.request("https://www.googleapis.com/drive/v3/files", "POST", body=b"{}",
+                                 headers={"Authorization": "Bearer x"})
+    assert resp.status == 200 and resp["etag"] == "abc" and resp["content-type"] == "application/json"
+    assert content == b'{"id": "1"}'
+    method, uri, kwargs = session.calls[0]
+    assert (method, kwargs["data"], kwargs["headers"], kwargs["timeout"]) == ("POST", b"{}", {"Authorization": "Bearer x"}, 7)
+    http.close()
+    assert session.closed
+
+
+def test_redirects_are_returned_as_is(transport):
+    # Drive's resumable uploads answer each chunk with 308 Resume Incomplete
+    session = Session(Response(308, {"Range": "bytes=0-262143"}, b""))
+    resp, _ = transport.SessionHttp(session).request("https://www.googleapis.com/upload/drive/v3/files", "PUT")
+    assert resp.status == 308 and resp["range"] == "bytes=0-262143"
+    assert session.calls[0][2]["allow_redirects"] is False
+
+
+def test_pooled_session_mounts_one_pool_and_records_calls(transport):
+    session = transport.pooled_session(AnonymousCredentials(), pool_maxsize=32)
+    adapter = session.get_adapter("https://sheets.googleapis.com")
+    assert adapter is session.get_adapter("http://example.com")
+    assert adapter._pool_maxsize == 32 and adapter.max_retries.total == 0
+    assert len(session.hooks["response"]) == 1
@@ -0,0 +1,157 @@
+import http.client
+import io
+import json
+import os
+import threading
+
+import pytest
+
+import ingest_api
+from duplicate_index import DuplicateIndex
+from ingest_api import ApiError, IngestHandler, IngestService, PooledHTTPServer
+from submission_journal import SubmissionJournal
+
+FIELDS = {
+    "propertyName": "Test Residency",
+    "propertyType": "Apartment",
+    "agentNumber": "9876543210",
+    "micromarket": "HSR Layout",
+    "rentPerMonthInLakhs": "0.5",
+    "configuration": "2 BHK",
+    "exactFloor": "3",
+}
+
+
+class Stream(io.BytesIO):
+    """Request body that records how it was read."""
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+
+@pytest.fixture
+def service(backends, tmp_path):
+    journal = SubmissionJournal(str(tmp_path / "journal"))
+    return IngestService(journal, duplicate_index=DuplicateIndex().watch(backends.listings))
+
+
+def upload(service, data: bytes = b"lease", folder: str = "documents", filename: str = "lease.pdf") -> str:
+    return service.store_upload(io.BytesIO(data), len(data), folder, filename)["uploadId"]
+
+
+def test_upload_is_streamed_to_disk_in_chunks(service, monkeypatch):
+    monkeypatch.setattr(ingest_api, "CHUNK_SIZE", 4)
+    stream = Stream(b"0123456789")
+    meta = service.store_upload(stream, 10, "videos", "../walkthrough.mp4")
+    assert stream.reads == [4, 4, 2]
+    assert meta["filename"] == "walkthrough.mp4" and meta["bytes"] == 10
+    with open(os.path.join(service.journal.upload_dir, meta["uploadId"] + ".bin"), "rb") as f:
+        assert f.read() == b"0123456789"
+
+
+@pytest.mark.parametrize("data, length, folder, status", [
+    (b"short", 10, "photos", 400),
+    (b"x", 1, "secrets", 400),
+    (b"", ingest_api.MAX_UPLOAD_BYTES + 1, "photos", 413),
+])
+def test_bad_uploads_are_rejected_and_leave_nothing(service, data, length, folder, status):
+    with pytest.raises(ApiError) as error:
+        service.store_upload(io.BytesIO(data), length, folder, "a.jpg")
+    assert error.value.status == status
+    assert os.listdir(service.journal.upload_dir) == []
+
+
+def test_invalid_listing_lists_every_error(service):
+    with pytest.raises(ApiError) as error:
+        service.create_listing({"fields": {**FIELDS, "propertyName": "", "micromarket": "Atlantis"}}, "t1")
+    assert error.value.status == 422
+    assert error.value.body["details"] == ["Property Name is required", "Unknown micromarket: Atlantis"]
+    with pytest.raises(ApiError) as error:
+        service.create_listing({"fields": FIELDS, "uploads": ["not-an-id"]}, "t1")
+    assert error.value.status == 400
+
+
+def test_possible_duplicate_needs_allow_duplicate(service, backends):
+    backends.listings.set("RN001", {**FIELDS, "propertyId": "RN001"})
+    with pytest.raises(ApiError) as error:
+        service.create_listing({"fields": FIELDS}, "t1")
+    assert error.value.status == 409
+    assert [c["propertyId"] for c in error.value.body["candidates"]] == ["RN001"]
+    status, body = service.create_listing({"fields": FIELDS, "allowDuplicate": True}, "t1")
+    assert status == 202 and body["propertyId"] != "RN001"
+
+
+def test_repeated_key_replays_the_first_submission(service):
+    upload_id = upload(service)
+    status, first = service.create_listing({"fields": FIELDS, "uploads": [upload_id]}, "t1")
+    assert status == 202
+    status, again = service.create_listing({"fields": FIELDS, "uploads": [upload_id]}, "t1")
+    assert status == 200 and again["replayed"]
+    assert again["propertyId"] == first["propertyId"]
+    # The upload now belongs to the journal
+    with pytest.raises(ApiError) as error:
+        service.create_listing({"fields": FIELDS, "uploads": [upload_id]}, "t2")
+    assert error.value.status == 404
+
+
+def test_concurrent_requests_with_one_key_journal_once(service):
+    upload_id = upload(service)
+    results = []
+    barrier = threading.Barrier(4)
+
+    def post():
+        barrier.wait()
+        results.append(service.create_listing({"fields": FIELDS, "uploads": [upload_id]}, "t1"))
+
+    threads = [threading.Thread(target=post) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(status for status, _ in results) == [200, 200, 200, 202]
+    assert len({body["propertyId"] for _, body in results}) == 1
+    assert service._inflight == {}
+
+
+def test_uploads_moved_by_another_process_get_the_replay(service, monkeypatch):
+    submit = ingest_api.submit_listing
+
+    def lose_the_race(journal, *args, **kwargs):
+        # The other process journals the same key and moves the uploads first
+        submit(journal, *args, **kwargs)
+        raise FileNotFoundError("upload already moved")
+
+    monkeypatch.setattr(ingest_api, "submit_listing", lose_the_race)
+    status, body = service.create_listing({"fields": FIELDS, "uploads": [upload(service)]}, "t1")
+    assert status == 200 and body["replayed"] and body["status"] == "pending"
+
+
+def test_http_round_trip(service):
+    server = PooledHTTPServer(("127.0.0.1", 0), IngestHandler, service, workers=2)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    connection = http.client.HTTPConnection(*server.server_address)
+
+    def request(method, path, body=b"", headers=None):
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    try:
+        status, meta = request("POST", "/v1/uploads?folder=documents&filename=lease.pdf", b"lease")
+        assert status == 201
+        listing = json.dumps({"fields": FIELDS, "uploads": [meta["uploadId"]]}).encode()
+        status, body = request("POST", "/v1/listings", listing, {"Idempotency-Key": "k1"})
+        assert status == 202
+        status, replay = request("POST", "/v1/listings", listing, {"Idempotency-Key": "k1"})
+        assert status == 200 and replay["propertyId"] == body["propertyId"]
+        assert request("GET", "/v1/listings/k1")[1]["status"] == "pending"
+        assert request("GET", "/v1/listings/nope")[0] == 404
+    finally:
+        connection.close()
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,84 @@
+import time
+
+import pytest
+
+from media_gc import Checkpoint, MediaReconciler
+from submission_journal import SubmissionJournal
+from submission_pipeline import MEDIA_PREFIX
+
+OLD = time.time() - 7 * 24 * 3600
+
+
+def add_media(backends, property_id: str, updated: float = OLD):
+    for name in ("photos/a.jpg", "photos/b.jpg"):
+        path = f"{MEDIA_PREFIX}/{property_id}/{name}"
+        backends.media.upload(path, b"jpeg")
+        backends.media.updated[path] = updated
+    folder_id = backends.drive.create_folder(property_id, "parent")
+    backends.drive.files[folder_id]["created"] = updated
+
+
+@pytest.fixture
+def bucket(backends, tmp_path):
+    for property_id in ("RN001", "RN002"):
+        backends.listings.set(property_id, {"propertyId": property_id})
+        add_media(backends, property_id)
+    add_media(backends, "RN120")                    # orphan, old
+    add_media(backends, "RN121", updated=time.time())   # orphan, still recent
+    add_media(backends, "RN122")                    # orphan on paper, but its submission is still draining
+    journal = SubmissionJournal(str(tmp_path / "journal"))
+    journal.enqueue("RN122", {}, [], token="t")
+    return journal
+
+
+def reconciler(tmp_path, journal, **kwargs):
+    checkpoint = Checkpoint(str(tmp_path / "media_gc.json"))
+    return MediaReconciler(min_age_hours=24, checkpoint=checkpoint, journal=journal, parent_folder_id="parent", **kwargs)
+
+
+def orphan_ids(report, kind):
+    return sorted(o["propertyId"] for o in report["orphans"] if o["kind"] == kind)
+
+
+def test_report_only_finds_old_orphans(backends, bucket, tmp_path):
+    objects = dict(backends.media.objects)
+    report = reconciler(tmp_path, bucket).run()
+    assert orphan_ids(report, "storage") == ["RN120"]
+    assert orphan_ids(report, "drive") == ["RN120"]
+    assert report["skipped_recent"] == 2
+    assert report["deleted"] == 0
+    assert backends.media.objects == objects
+
+
+def test_delete_removes_only_orphans(backends, bucket, tmp_path):
+    report = reconciler(tmp_path, bucket, delete=True).run()
+    assert report["deleted"] == 3
+    owners = {name.split("/")[1] for name in backends.media.objects}
+    assert owners == {"RN001", "RN002", "RN121", "RN122"}
+    trashed = {meta["name"] for meta in backends.drive.files.values() if meta.get("trashed")}
+    assert trashed == {"RN120"}
+
+
+def test_resumes_after_the_checkpoint(backends, bucket, tmp_path):
+    add_media(backends, "RN150")
+    checkpoint = Checkpoint(str(tmp_path / "media_gc.json"))
+    checkpoint.advance("storage:RN1", "RN120")
+    checkpoint.advance("drive", "RN120")
+    report = reconciler(tmp_path, bucket).run()
+    # RN120 was done before the interruption
+    assert orphan_ids(report, "storage") == ["RN150"]
+    assert orphan_ids(report, "drive") == ["RN150"]
+    # A completed run starts over next time
+    assert Checkpoint(str(tmp_path / "media_gc.json")).positions == {}
+
+
+def test_ids_reserved_by_other_hosts_are_live_until_the_reservation_expires(backends, bucket, tmp_path):
+    # Reserved by submissions on other hosts' journals, never saved
+    add_media(backends, "RN130")
+    add_media(backends, "RN131")
+    backends.listings.reserve_id("RN130", "draining-elsewhere")
+    backends.listings.reserve_id("RN131", "abandoned")
+    backends.listings.reserved_at["RN131"] = time.time() - 60 * 24 * 3600
+    report = reconciler(tmp_path, bucket, reservation_ttl_hours=30 * 24).run()
+    assert orphan_ids(report, "storage") == ["RN120", "RN131"]
+    assert orphan_ids(report, "drive") == ["RN120", "RN131"]
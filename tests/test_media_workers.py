@@ -0,0 +1,86 @@
+import random
+import time
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import media_workers
+from media_workers import MediaWorkerPool, hash_photos, process_mode
+from submission_pipeline import hash_photos_concurrent
+
+
+class Upload:
+    def __init__(self, name: str, data: bytes):
+        self.name = name
+        self._data = data
+
+    def getvalue(self) -> bytes:
+        return self._data
+
+
+def jpeg(seed: int, size=(64, 48)) -> bytes:
+    rng = random.Random(seed)
+    image = Image.new("RGB", size)
+    image.putdata([tuple(rng.randrange(256) for _ in range(3)) for _ in range(size[0] * size[1])])
+    out = BytesIO()
+    image.save(out, "JPEG")
+    return out.getvalue()
+
+
+def exit_at_once(*args):
+    """Worker process target that dies straight away, as a crashed worker would."""
+
+
+class CrashingPool(MediaWorkerPool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spawned = 0
+
+    def _spawn(self):
+        self.spawned += 1
+        proc = media_workers._mp.Process(target=exit_at_once, daemon=True)
+        proc.start()
+        return proc
+
+
+@pytest.fixture
+def process_hashing(monkeypatch):
+    monkeypatch.setattr(media_workers, "MEDIA_WORKER_PROCESSES", 1)
+    monkeypatch.setattr(media_workers, "MEDIA_HASH_PROCESSES", 1)
+    monkeypatch.setattr(media_workers, "BACKEND", "google")
+    monkeypatch.setattr(media_workers, "_hash_pool", None)
+    yield
+    if media_workers._hash_pool is not None:
+        media_workers._hash_pool.shutdown()
+
+
+def test_exited_workers_are_restarted(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_workers, "RESTART_DELAY", 0.05)
+    # start() points the children at a lock file; restored after the test
+    monkeypatch.setenv("SHEET_LOCK_FILE", "")
+    pool = CrashingPool(str(tmp_path), processes=2, threads=1).start()
+    try:
+        deadline = time.monotonic() + 30
+        while pool.spawned < 4 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert pool.spawned >= 4
+    finally:
+        pool.stop()
+    assert pool.alive() == 0
+
+
+def test_photos_are_hashed_in_worker_processes(process_hashing):
+    photos = [Upload("a.jpg", jpeg(1)), Upload("broken.jpg", b"not a photo"), Upload("b.jpg", jpeg(2))]
+    assert process_mode()
+    hashes = hash_photos(photos)
+    assert media_workers._hash_pool is not None
+    # Unreadable photos are skipped; positions match the threaded hashing
+    assert hashes == hash_photos_concurrent(photos) and sorted(hashes) == [0, 2]
+
+
+def test_memory_backends_keep_hashing_in_process(process_hashing, monkeypatch):
+    monkeypatch.setattr(media_workers, "BACKEND", "memory")
+    assert not process_mode()
+    assert hash_photos([Upload("a.jpg", jpeg(1))]) == hash_photos_concurrent([Upload("a.jpg", jpeg(1))])
+    assert media_workers._hash_pool is None
@@ -0,0 +1,29 @@
+import os
+import urllib.request
+
+from metrics import Registry, process_path, start_http_server
+
+
+def test_render_adds_const_labels_to_every_sample():
+    registry = Registry(buckets=(1.0,))
+    registry.inc("backend_calls_total", {"service": "sheets"})
+    registry.observe("backend_call_seconds", {"service": "sheets"}, 0.5)
+    lines = [line for line in registry.render((("pid", "7"),)).splitlines() if not line.startswith("#")]
+    assert lines and all('pid="7"' in line for line in lines)
+
+
+def test_each_process_dumps_to_its_own_file():
+    assert process_path("/var/metrics/app.prom") == f"/var/metrics/app.{os.getpid()}.prom"
+
+
+def test_second_server_takes_the_next_free_port():
+    first = start_http_server(0)
+    port = first.server_address[1]
+    second = start_http_server(port, tries=4)
+    try:
+        assert port < second.server_address[1] < port + 4
+        with urllib.request.urlopen(f"http://127.0.0.1:{second.server_address[1]}/metrics") as response:
+            assert response.status == 200
+    finally:
+        first.shutdown()
+        second.shutdown()
@@ -0,0 +1,81 @@
+import random
+from io import BytesIO
+
+from PIL import Image
+
+from photo_hash import BKTree, PhotoIndex, find_reused_photos, hamming, hash_to_hex, photo_dhash
+from submission_pipeline import hash_photos_concurrent
+
+
+class Upload:
+    def __init__(self, name: str, data: bytes):
+        self.name = name
+        self._data = data
+
+    def getvalue(self) -> bytes:
+        return self._data
+
+
+def jpeg(seed: int, size=(64, 48)) -> bytes:
+    rng = random.Random(seed)
+    image = Image.new("RGB", size)
+    image.putdata([tuple(rng.randrange(256) for _ in range(3)) for _ in range(size[0] * size[1])])
+    out = BytesIO()
+    image.save(out, "JPEG")
+    return out.getvalue()
+
+
+def test_dhash_survives_resizing():
+    original = jpeg(1, (128, 96))
+    resized = BytesIO()
+    Image.open(BytesIO(original)).resize((64, 48)).save(resized, "JPEG")
+    assert hamming(photo_dhash(original), photo_dhash(resized.getvalue())) <= 6
+    assert hamming(photo_dhash(original), photo_dhash(jpeg(2, (128, 96)))) > 6
+
+
+def test_bk_tree_search_matches_brute_force():
+    rng = random.Random(7)
+    values = [rng.getrandbits(64) for _ in range(500)]
+    tree = BKTree()
+    for i, value in enumerate(values):
+        tree.add(value, i)
+    query = values[10] ^ 0b1011
+    expected = sorted((hamming(query, value), i) for i, value in enumerate(values) if hamming(query, value) <= 6)
+    assert sorted(tree.search(query, 6)) == expected
+
+
+def test_removed_listing_stops_matching():
+    index = PhotoIndex()
+    index._on_changes([("ADDED", "RN001", {"photoHashes": ["00000000000000ff"]})])
+    assert find_reused_photos(index, {0: 0xFF}) == {0: ["RN001"]}
+    index._on_changes([("REMOVED", "RN001", {})])
+    assert find_reused_photos(index, {0: 0xFF}) == {}
+
+
+def test_hashes_dropped_on_update_stop_matching():
+    index = PhotoIndex()
+    index.add_listing("RN001", ["00000000000000ff", "ffffffff00000000"])
+    index.add_listing("RN001", ["ffffffff00000000"])
+    assert index.find_matches(0xFF) == []
+    assert index.find_matches(0xFFFFFFFF00000000) == [(0, "RN001")]
+    # Restored hashes match again, once
+    index.add_listing("RN001", ["00000000000000ff", "ffffffff00000000"])
+    assert index.find_matches(0xFF) == [(0, "RN001")]
+
+
+def test_rebuild_drops_tombstones(monkeypatch):
+    monkeypatch.setattr("photo_hash.REBUILD_MIN", 10)
+    index = PhotoIndex()
+    for i in range(20):
+        index.add_listing(f"RN{i:03d}", [hash_to_hex(i << 8)])
+    for i in range(10):
+        index.remove_listing(f"RN{i:03d}")
+    assert len(index._tree) == 10
+    assert index.find_matches(15 << 8, 0) == [(0, "RN015")]
+
+
+def test_photos_with_the_same_filename_keep_their_own_hash():
+    photos = [Upload("IMG_0001.jpg", jpeg(1)), Upload("IMG_0001.jpg", jpeg(2))]
+    hashes = hash_photos_concurrent(photos)
+    assert sorted(hashes) == [0, 1]
+    assert hashes[0] != hashes[1]
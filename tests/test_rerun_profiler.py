@@ -0,0 +1,38 @@
+import threading
+
+import rerun_profiler
+from rerun_profiler import profile_rerun, recent_profiles
+
+
+def test_overlapping_reruns_profile_only_one():
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def session():
+        try:
+            with profile_rerun("first", enabled=True):
+                started.set()
+                release.wait(5)
+        except Exception as e:
+            errors.append(e)
+
+    before = len(recent_profiles())
+    thread = threading.Thread(target=session)
+    thread.start()
+    started.wait(5)
+    # A second session's rerun while the first is profiled runs unprofiled, without error
+    with profile_rerun("second", enabled=True):
+        ran = True
+    release.set()
+    thread.join()
+    assert ran and not errors
+    assert [record["label"] for record in recent_profiles()[:len(recent_profiles()) - before]] == ["first"]
+    assert not rerun_profiler._profile_lock.locked()
+
+
+def test_profile_records_timings():
+    with profile_rerun("timed", enabled=True):
+        sum(range(10000))
+    record = recent_profiles()[0]
+    assert record["label"] == "timed"
+    assert record["wall_ms"] >= 0 and record["top_functions"]
@@ -0,0 +1,167 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import resilience
+from backends import BackendError, RateLimitError
+from resilience import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceeded, Policy, ResilientStore, breaker, call, classify,
+)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(resilience, "RETRY_BASE", 0.0)
+
+
+class HttpError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class Flaky:
+    """Fails `failures` times with `error`, then returns "ok"."""
+
+    def __init__(self, failures: int, error: Exception):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return "ok"
+
+
+@pytest.mark.parametrize("error, kind", [
+    (RateLimitError("slow down"), "rate_limited"),
+    (HttpError(429), "rate_limited"),
+    (HttpError(503), "transient"),
+    (TimeoutError(), "transient"),
+    (BackendError("injected outage"), "transient"),
+    (HttpError(404), "permanent"),
+    (ValueError("bad input"), "permanent"),
+])
+def test_classify(error, kind):
+    assert classify(error) == kind
+
+
+def test_transient_errors_are_retried():
+    func = Flaky(2, HttpError(503))
+    assert call("svc-retry", "get", func, policy=Policy(timeout=5, attempts=3)) == "ok"
+    assert func.calls == 3
+
+
+def test_permanent_errors_are_not_retried():
+    func = Flaky(1, HttpError(404))
+    with pytest.raises(HttpError):
+        call("svc-permanent", "get", func, policy=Policy(timeout=5, attempts=3))
+    assert func.calls == 1
+    assert breaker("svc-permanent").state == "closed"
+
+
+def test_deadline_bounds_a_hung_call():
+    release = threading.Event()
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        call("svc-deadline", "get", release.wait, 5, policy=Policy(timeout=0.1, attempts=1))
+    release.set()
+    assert time.monotonic() - started < 1
+
+
+def test_hedged_request_returns_the_faster_answer():
+    calls = []
+
+    def slow_then_fast():
+        calls.append(None)
+        time.sleep(1.0 if len(calls) == 1 else 0.0)
+        return len(calls)
+
+    started = time.monotonic()
+    assert call("svc-hedge", "get", slow_then_fast, policy=Policy(timeout=5, attempts=1, hedge_after=0.05)) == 2
+    assert time.monotonic() - started < 0.5
+
+
+def test_breaker_opens_then_lets_one_trial_through():
+    circuit = CircuitBreaker("svc-breaker", failures=2, cooldown=0.1)
+    circuit.record_failure()
+    assert circuit.state == "closed"
+    circuit.record_failure()
+    assert circuit.state == "open" and not circuit.allow()
+    time.sleep(0.12)
+    assert circuit.state == "half_open"
+    assert circuit.allow() and not circuit.allow()
+    circuit.record_failure()
+    assert circuit.state == "open"
+    time.sleep(0.12)
+    assert circuit.allow()
+    circuit.record_success()
+    assert circuit.state == "closed"
+
+
+def test_open_circuit_rejects_calls_without_running_them(monkeypatch):
+    monkeypatch.setitem(resilience._breakers, "svc-open", CircuitBreaker("svc-open", failures=1, cooldown=60))
+    with pytest.raises(BackendError):
+        call("svc-open", "get", Flaky(5, BackendError("down")), policy=Policy(timeout=5, attempts=1))
+    func = Flaky(0, None)
+    with pytest.raises(CircuitOpenError):
+        call("svc-open", "get", func, policy=Policy(timeout=5, attempts=1))
+    assert func.calls == 0
+
+
+def test_resilient_store_wraps_only_listed_methods():
+    class Store:
+        name = "store"
+
+        def __init__(self):
+            self.get = Flaky(1, HttpError(503))
+
+    store = ResilientStore(Store(), "svc-store", {"get": Policy(timeout=5, attempts=2)})
+    assert store.get() == "ok"
+    assert store.name == "store"
+
+
+def test_coroutine_methods_get_deadline_and_retries():
+    class Store:
+        def __init__(self):
+            self.calls = 0
+
+        async def upload_async(self, hang: bool):
+            self.calls += 1
+            if self.calls == 1:
+                raise HttpError(503)
+            if hang:
+                await asyncio.sleep(5)
+            return "ok"
+
+    inner = Store()
+    store = ResilientStore(inner, "svc-async", {"upload_async": Policy(timeout=0.1, attempts=2)})
+    assert asyncio.run(store.upload_async(False)) == "ok"
+    assert inner.calls == 2
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(store.upload_async(True))
+    assert time.monotonic() - started < 1
+
+
+def test_generator_outcome_closes_a_half_open_circuit(monkeypatch):
+    circuit = CircuitBreaker("svc-gen", failures=1, cooldown=0)
+    monkeypatch.setitem(resilience._breakers, "svc-gen", circuit)
+
+    class Store:
+        def stream(self, fail: bool):
+            if fail:
+                raise HttpError(503)
+            yield from (1, 2)
+
+    store = ResilientStore(Store(), "svc-gen", {"stream": None})
+    with pytest.raises(HttpError):
+        list(store.stream(True))
+    assert circuit.state == "half_open"
+    # The trial is the first fetch: its success closes the circuit
+    assert list(store.stream(False)) == [1, 2]
+    assert circuit.state == "closed"
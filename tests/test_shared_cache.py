@@ -0,0 +1,67 @@
+import pickle
+
+import pytest
+
+from shared_cache import LRUBackend, SQLiteBackend, _make_key, cached, set_backend
+
+
+class Evil:
+    def __reduce__(self):
+        return (pytest.fail, ("pickle payload was executed",))
+
+
+@pytest.fixture(params=["lru", "sqlite"])
+def backend(request, tmp_path):
+    backend = LRUBackend() if request.param == "lru" else SQLiteBackend(str(tmp_path / "cache.sqlite3"))
+    set_backend(backend)
+    yield backend
+    set_backend(LRUBackend())
+
+
+def counting(func):
+    calls = []
+
+    def wrapper(*args):
+        calls.append(args)
+        return func(*args)
+    wrapper.calls = calls
+    return wrapper
+
+
+def test_results_round_trip_with_their_types(backend):
+    inner = counting(lambda number: ("CP1", f"Agent {number}"))
+    fetch = cached(ttl=60, namespace="agents")(inner)
+    assert fetch("98") == ("CP1", "Agent 98")
+    assert fetch("98") == ("CP1", "Agent 98")
+    assert isinstance(fetch("98"), tuple)
+    assert len(inner.calls) == 1
+
+
+def test_values_are_stored_as_json(backend):
+    cached(ttl=60, namespace="rows")(lambda: 42)()
+    assert backend.get(_make_key("rows", (), {})) == b"42"
+
+
+def test_pickled_values_are_never_loaded(backend):
+    backend.set(_make_key("rows", (), {}), pickle.dumps(Evil()), 60)
+    assert cached(ttl=60, namespace="rows")(lambda: 7)() == 7
+
+
+def test_empty_results_are_retried_when_asked(backend):
+    inner = counting(lambda: "")
+    lookup = cached(ttl=60, namespace="folders", cache_empty=False)(inner)
+    lookup()
+    lookup()
+    assert len(inner.calls) == 2
+
+
+def test_invalidate_and_clear(backend):
+    inner = counting(lambda n: n * 2)
+    double = cached(ttl=60, namespace="double")(inner)
+    double(1), double(2)
+    double.invalidate(1)
+    double(1), double(2)
+    assert len(inner.calls) == 3
+    double.clear()
+    double(1), double(2)
+    assert len(inner.calls) == 5
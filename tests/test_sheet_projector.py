@@ -0,0 +1,117 @@
+import time
+
+import pytest
+
+from sheet_projector import SheetProjector
+from submission_pipeline import SHEET_HEADER, ensure_sheet_header
+
+STATUS = SHEET_HEADER.index("Inventory Status")
+
+
+def listing(number: int, **fields) -> dict:
+    property_id = f"RN{number:03d}"
+    return {"propertyId": property_id, "propertyName": f"Listing {number}", "inventoryStatus": "Available", **fields}
+
+
+@pytest.fixture
+def projector(backends):
+    for number in range(1, 6):
+        backends.listings.set(f"RN{number:03d}", listing(number))
+    ensure_sheet_header()
+    projector = SheetProjector()
+    projector.load_sheet()
+    projector._watch = backends.listings.watch(projector._on_changes)
+    projector.flush()
+    yield projector
+    projector.stop()
+
+
+def rows_by_id(backends) -> dict:
+    rows = {}
+    for row in backends.sheet.rows[1:]:
+        assert row[0] not in rows, f"{row[0]} appears twice"
+        rows[row[0]] = row
+    return rows
+
+
+def test_new_listings_are_appended_once(backends, projector):
+    rows = rows_by_id(backends)
+    assert sorted(rows) == [f"RN{n:03d}" for n in range(1, 6)]
+    assert rows["RN003"][1] == "Listing 3"
+    assert projector.flush() == 0
+
+
+def test_update_finds_its_row_after_ops_reorder_the_sheet(backends, projector):
+    backends.sheet.rows[1:] = backends.sheet.rows[:0:-1]
+    backends.sheet.version += 1
+    backends.listings.set("RN001", listing(1, propertyName="Renamed"))
+    projector.flush()
+    rows = rows_by_id(backends)
+    assert rows["RN001"][1] == "Renamed"
+    assert rows["RN005"][1] == "Listing 5"
+    assert len(rows) == 5
+
+
+def test_appends_go_below_rows_ops_inserted(backends, projector):
+    backends.sheet.rows.insert(3, ["RN900", "Added by hand"])
+    backends.sheet.version += 1
+    backends.listings.set("RN006", listing(6))
+    projector.flush()
+    rows = rows_by_id(backends)
+    assert rows["RN900"][1] == "Added by hand"
+    assert rows["RN006"][1] == "Listing 6"
+    assert rows["RN005"][1] == "Listing 5"
+
+
+def test_only_changed_cells_are_written(backends, projector):
+    row = backends.sheet.rows[2]
+    row[STATUS] = "Rented"          # ops edit not yet synced to Firestore
+    backends.sheet.version += 1
+    backends.listings.set(row[0], listing(int(row[0][2:]), propertyName="Renamed"))
+    projector.flush()
+    assert row[1] == "Renamed"
+    assert row[STATUS] == "Rented"
+
+
+def test_removed_listing_is_marked_in_place(backends, projector):
+    backends.listings.delete("RN002")
+    projector.flush()
+    assert rows_by_id(backends)["RN002"][STATUS] == "Removed"
+
+
+def test_column_a_is_only_reread_after_other_writes(backends, projector):
+    backends.sheet.network.reset_counters()
+    backends.listings.set("RN001", listing(1, propertyName="Renamed"))
+    projector.flush()
+    assert "sheets.batch_get" not in backends.sheet.network.calls
+    backends.sheet.update("Z40", [["ops note"]])
+    backends.listings.set("RN002", listing(2, propertyName="Renamed"))
+    projector.flush()
+    assert backends.sheet.network.calls["sheets.batch_get"] == 1
+
+
+def test_only_the_lease_holder_writes_the_sheet(backends):
+    for number in range(1, 4):
+        backends.listings.set(f"RN{number:03d}", listing(number))
+    projectors = [SheetProjector(batch_interval=0.05).start() for _ in range(3)]
+    try:
+        deadline = time.time() + 5
+        while not any(projector.ready.is_set() for projector in projectors) and time.time() < deadline:
+            time.sleep(0.05)
+        assert [projector.lease.held for projector in projectors].count(True) == 1
+        backends.listings.set("RN004", listing(4))
+        holder = next(projector for projector in projectors if projector.lease.held)
+        assert holder.wait_idle(5)
+        time.sleep(0.2)
+        assert sorted(rows_by_id(backends)) == [f"RN{n:03d}" for n in range(1, 5)]
+        assert sum(projector.rows_written for projector in projectors) == holder.rows_written == 4
+        # The next holder re-indexes the sheet and appends nothing twice
+        holder.stop()
+        backends.listings.set("RN005", listing(5))
+        deadline = time.time() + 5
+        while "RN005" not in rows_by_id(backends) and time.time() < deadline:
+            time.sleep(0.05)
+        assert sorted(rows_by_id(backends)) == [f"RN{n:03d}" for n in range(1, 6)]
+    finally:
+        for projector in projectors:
+            projector.stop()
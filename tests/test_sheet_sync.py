@@ -0,0 +1,83 @@
+import logging
+import time
+
+import pytest
+
+from sheet_sync import SheetStatusSync, column_letter, parse_sheet_date
+from submission_pipeline import SHEET_HEADER
+
+STATUS = column_letter(SHEET_HEADER.index("Inventory Status"))
+
+
+@pytest.fixture
+def sheet(backends):
+    backends.sheet.update("A1:AG1", [SHEET_HEADER])
+    for number in range(1, 4):
+        property_id = f"RN{number:03d}"
+        backends.listings.set(property_id, {"propertyId": property_id, "inventoryStatus": "Available"})
+        backends.sheet.update(f"A{number + 1}", [[property_id]])
+        backends.sheet.update(f"{STATUS}{number + 1}", [["Available"]])
+    backends.listings.network.reset_counters()
+    return backends.sheet
+
+
+def test_first_poll_syncs_edits_made_while_no_poller_ran(backends, sheet):
+    # An edit left in the sheet while no process was running
+    sheet.update(f"{STATUS}2", [["Rented"]])
+    sync = SheetStatusSync()
+    assert sync.poll() == 1
+    assert backends.listings.docs["RN001"]["inventoryStatus"] == "Rented"
+    # Rows that match their listings are not written
+    assert backends.listings.network.calls["firestore.update"] == 1
+
+
+def test_only_the_lease_holder_polls(backends, sheet):
+    syncs = [SheetStatusSync(interval=0.05).start() for _ in range(3)]
+    try:
+        time.sleep(0.3)
+        assert sum(sync.lease.held for sync in syncs) == 1
+        holder = next(sync for sync in syncs if sync.lease.held)
+        sheet.update(f"{STATUS}3", [["On Hold"]])
+        time.sleep(0.3)
+        assert backends.listings.docs["RN002"]["inventoryStatus"] == "On Hold"
+        assert sum(sync.updates_written for sync in syncs) == holder.updates_written == 1
+        # A stopped holder hands the lease over
+        holder.stop()
+        time.sleep(0.3)
+        assert sum(sync.lease.held for sync in syncs if sync is not holder) == 1
+    finally:
+        for sync in syncs:
+            sync.stop()
+
+
+def test_edits_after_the_snapshot_are_synced(backends, sheet):
+    sync = SheetStatusSync()
+    sync.poll()
+    backends.listings.network.reset_counters()
+    sheet.update(f"{STATUS}3", [["Rented"]])
+    assert sync.poll() == 1
+    assert backends.listings.docs["RN002"]["inventoryStatus"] == "Rented"
+    assert backends.listings.network.calls["firestore.get_many"] == 1
+    # Nothing changed since
+    assert sync.poll() == 0
+
+
+def test_duplicate_property_ids_are_skipped(backends, sheet, caplog):
+    sync = SheetStatusSync()
+    sync.poll()
+    sheet.update("A5", [["RN001"]])
+    sheet.update(f"{STATUS}5", [["Rented"]])
+    with caplog.at_level(logging.ERROR, logger="sheet_sync"):
+        assert sync.poll() == 0
+    assert "RN001" in caplog.text
+    assert backends.listings.docs["RN001"]["inventoryStatus"] == "Available"
+    # Once the extra row is gone the remaining one syncs again
+    sheet.update("A5", [[""]])
+    sheet.update(f"{STATUS}2", [["On Hold"]])
+    assert sync.poll() == 1
+    assert backends.listings.docs["RN001"]["inventoryStatus"] == "On Hold"
+
+
+def test_parse_sheet_date_accepts_serials_and_text():
+    assert parse_sheet_date(45292) == parse_sheet_date("2024-01-01") == parse_sheet_date("01/01/2024")
+    assert parse_sheet_date("soon") is None
@@ -0,0 +1,133 @@
+import time
+
+import pytest
+
+import submission_journal
+from backends import BackendError
+from submission_journal import SubmissionJournal
+from submission_pipeline import drain_submission, save_listing, submit_listing
+
+FIELDS = {
+    "propertyName": "Test Residency",
+    "propertyType": "Apartment",
+    "agentNumber": "9876543210",
+    "micromarket": "HSR Layout",
+    "rentPerMonthInLakhs": "0.5",
+}
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return SubmissionJournal(str(tmp_path / "journal"))
+
+
+def drain_all(journal):
+    while (entry := journal.claim()) is not None:
+        drain_submission(journal, entry)
+        journal.complete(entry)
+
+
+def test_token_returns_the_same_reservation(journal):
+    first = journal.reserve_property_id(10, token="t1")
+    assert journal.reserve_property_id(10, token="t1") == first
+    assert journal.reserve_property_id(10, token="t2") != first
+
+
+def test_enqueue_keeps_identical_filenames_apart(journal):
+    journal.enqueue("RN001", {}, [("photos", "a.jpg", b"one"), ("photos", "a.jpg", b"two")], token="t")
+    entry = journal.claim()
+    assert [file.read() for file in entry["media"]] == [b"one", b"two"]
+
+
+def test_two_instances_never_share_a_property_id(backends, tmp_path):
+    # Separate journals reserve IDs independently; the Firestore claim keeps them apart before acknowledging
+    journals = [SubmissionJournal(str(tmp_path / name)) for name in ("a", "b")]
+    submitted = [
+        submit_listing(journal, dict(FIELDS, propertyName=f"Listing {i}"), [("photos", "p.jpg", b"x")], token=f"tok{i}")[0]
+        for i, journal in enumerate(journals)
+    ]
+    assert submitted[0] != submitted[1]
+    # A replay is handed the same ID again
+    assert submit_listing(journals[1], FIELDS, [], token="tok1")[0] == submitted[1]
+
+    for journal in journals:
+        drain_all(journal)
+
+    final = [journal.find_submission(f"tok{i}")["property_id"] for i, journal in enumerate(journals)]
+    # The acknowledged IDs are final
+    assert final == submitted
+    for i, property_id in enumerate(final):
+        doc = backends.listings.docs[property_id]
+        assert doc["propertyName"] == f"Listing {i}"
+        assert doc["propertyId"] == property_id
+        assert all(f"/{property_id}/" in url for url in doc["photos"])
+
+
+def test_submit_skips_ids_taken_by_older_writers(backends, journal):
+    # Written directly, without a reservation (an app version that predates them)
+    backends.listings.docs["RN001"] = {"propertyId": "RN001", "propertyName": "Someone else"}
+    backends.listings.reservations["RN002"] = "another-instance"
+    property_id, _ = submit_listing(journal, FIELDS, [], token="tok")
+    assert property_id == "RN003"
+    assert journal.find_submission("tok")["property_id"] == "RN003"
+
+
+def test_claim_skips_ids_taken_by_older_writers(backends, journal):
+    property_id, _ = submit_listing(journal, FIELDS, [], token="tok")
+    # Written after the claim, without a reservation
+    backends.listings.docs[property_id] = {"propertyId": property_id, "propertyName": "Someone else"}
+    drain_all(journal)
+    final = journal.find_submission("tok")["property_id"]
+    assert final != property_id
+    assert backends.listings.docs[property_id]["propertyName"] == "Someone else"
+    assert backends.listings.docs[final]["propertyName"] == FIELDS["propertyName"]
+
+
+def test_save_listing_refuses_to_overwrite(backends):
+    backends.listings.docs["RN001"] = {"propertyName": "Existing", "submissionId": "other"}
+    with pytest.raises(BackendError):
+        save_listing({"id": "mine"}, "RN001", {"propertyName": "New"})
+    assert backends.listings.docs["RN001"]["propertyName"] == "Existing"
+
+
+def test_save_listing_accepts_its_own_unrecorded_write(backends):
+    entry = {"id": "mine"}
+    save_listing(entry, "RN001", {"propertyName": "New"})
+    # A retry after a crash between the write and recording the step
+    assert save_listing(entry, "RN001", {"propertyName": "New"})
+
+
+def test_lease_renewal_keeps_a_slow_drain_from_being_claimed_twice(journal, monkeypatch):
+    monkeypatch.setattr(submission_journal, "LEASE_SECONDS", 0.3)
+    monkeypatch.setattr(submission_journal, "LEASE_RENEW_SECONDS", 0.05)
+    journal.enqueue("RN001", {}, [], token="t")
+    entry = journal.claim()
+    with journal.lease(entry):
+        time.sleep(0.6)
+        assert journal.claim() is None
+    time.sleep(0.4)
+    # Without renewal the lease runs out and the entry is claimable again
+    assert journal.claim()["id"] == "t"
+
+
+def test_renew_lease_fails_once_reclaimed(journal, monkeypatch):
+    monkeypatch.setattr(submission_journal, "LEASE_SECONDS", 0)
+    journal.enqueue("RN001", {}, [], token="t")
+    first = journal.claim()
+    second = journal.claim()
+    assert second["attempts"] == first["attempts"] + 1
+    assert not journal.renew_lease(first)
+    assert journal.renew_lease(second)
+
+
+def test_workers_drain_concurrently_without_duplicates(backends, journal):
+    for i in range(10):
+        submit_listing(journal, dict(FIELDS, propertyName=f"Listing {i}"), [], token=f"tok{i}")
+    workers = submission_journal.start_workers(journal, drain_submission, count=3)
+    deadline = time.time() + 10
+    while journal.pending_property_ids() and time.time() < deadline:
+        time.sleep(0.05)
+    for worker in workers:
+        worker.stop()
+    names = sorted(doc["propertyName"] for doc in backends.listings.docs.values())
+    assert names == sorted(f"Listing {i}" for i in range(10))
@@ -0,0 +1,119 @@
+import random
+import threading
+import time
+
+import pytest
+
+from text_search import TextIndex, highlight, index_terms
+
+AMENITIES = ["Gym", "Swimming Pool", "Power Backup", "Lift", "Clubhouse", "Park", "Security", "Metro nearby"]
+RESTRICTIONS = ["No bachelors", "Family only", "No pets", "No non-veg"]
+WORDS = ["sunlight", "quiet", "spacious", "balcony", "metro", "park", "view", "new", "pets", "gym"]
+
+
+def listing(rng) -> dict:
+    return {
+        "amenities": ", ".join(rng.sample(AMENITIES, rng.randint(1, 5))),
+        "restrictions": ", ".join(rng.sample(RESTRICTIONS, rng.randint(0, 2))),
+        "extraDetails": " ".join(rng.choices(WORDS, k=rng.randint(2, 12))),
+    }
+
+
+def changes(count: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    return [("ADDED", f"RN{n:03d}", listing(rng)) for n in range(1, count + 1)]
+
+
+def exhaustive(index: TextIndex, query: str, k: int) -> list:
+    """Scores every listing; the threshold algorithm must agree with it."""
+    scores = {}
+    for score, summary in index.search(query, k=len(index)):
+        scores[summary["propertyId"]] = score
+    return sorted(scores.values(), reverse=True)[:k]
+
+
+@pytest.fixture
+def index():
+    index = TextIndex()
+    index._on_changes(changes(2000))
+    return index
+
+
+def test_index_terms_keep_bigrams_within_items():
+    assert index_terms("Gym, Swimming Pools") == ["gym", "swimming", "pool", "swimming pool"]
+
+
+def test_first_query_after_load_does_not_sort(index):
+    # Every term's postings are sorted when the snapshot loads, not by the first query
+    assert set(index._sorted) == set(index._postings)
+    sorted_before = dict(index._sorted)
+    index.search("family only no pets")
+    assert all(index._sorted[term] is ranked for term, ranked in sorted_before.items())
+
+
+@pytest.mark.parametrize("query", ["gym", "no bachelors", "swimming pool gym", "family only no pets", "metro sunlight"])
+def test_top_k_matches_exhaustive_scoring(index, query):
+    assert [score for score, _ in index.search(query, k=10)] == exhaustive(index, query, 10)
+
+
+def test_sorted_postings_follow_updates_and_removals(index):
+    rng = random.Random(2)
+    for n in range(1, 300):
+        index.upsert(f"RN{n:03d}", listing(rng))
+    for n in range(300, 400):
+        index.remove(f"RN{n:03d}")
+    for term, (docnos, impacts) in index._sorted.items():
+        postings = index._postings[term]
+        assert sorted(docnos) == sorted(postings)
+        assert impacts == sorted(impacts, reverse=True)
+        assert impacts == [postings[docno] for docno in docnos]
+    assert [score for score, _ in index.search("no pets gym", k=10)] == exhaustive(index, "no pets gym", 10)
+
+
+def test_reweight_resorts_postings(index):
+    # Much longer listings move the average length past the reweight threshold
+    long_text = " ".join(WORDS * 20)
+    for n in range(1, 801):
+        index.upsert(f"RN{n:03d}", {"extraDetails": long_text, "amenities": "Gym"})
+    assert index._impact_avgdl == pytest.approx(index._avgdl(), rel=index.REWEIGHT_DRIFT)
+    for term, (docnos, impacts) in index._sorted.items():
+        assert impacts == sorted(impacts, reverse=True)
+        assert impacts == [index._postings[term][docno] for docno in docnos]
+
+
+def test_removed_listing_is_not_found(index):
+    top = index.search("gym", k=1)[0][1]["propertyId"]
+    index._on_changes([("REMOVED", top, {})])
+    assert all(summary["propertyId"] != top for _, summary in index.search("gym", k=50))
+
+
+def test_highlight_marks_stemmed_matches():
+    assert highlight("Pets allowed", "pet") == "**Pets** allowed"
+
+
+def test_rebuild_runs_off_the_lock_and_replays_changes(index, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_sort(postings):
+        started.set()
+        release.wait(5)
+        return TextIndex._sort_term(postings)
+
+    monkeypatch.setattr(index, "_sort_term", slow_sort)
+    rebuild = threading.Thread(target=index._rebuild)
+    rebuild.start()
+    assert started.wait(5)
+    # Searches and updates carry on while the postings are rebuilt
+    started_at = time.monotonic()
+    assert index.search("gym", k=5)
+    index.upsert("RN9999", {"amenities": "Gym, Sauna", "extraDetails": "sauna"})
+    index.remove("RN001")
+    assert time.monotonic() - started_at < 1
+    release.set()
+    rebuild.join()
+    monkeypatch.undo()
+    assert index.search("sauna", k=1)[0][1]["propertyId"] == "RN9999"
+    assert all(summary["propertyId"] != "RN001" for _, summary in index.search("gym", k=len(index)))
+    for term, (docnos, impacts) in index._sorted.items():
+        assert impacts == [index._postings[term][docno] for docno in docnos]
+        assert impacts == sorted(impacts, reverse=True)
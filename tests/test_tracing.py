@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+import tracing
+from tracing import read_spans, span, summarize, traced
+
+
+@pytest.fixture
+def trace_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "spans.jsonl")
+    monkeypatch.setattr(tracing, "TRACE_ENABLED", True)
+    monkeypatch.setattr(tracing, "TRACE_FILE", path)
+    return path
+
+
+def test_nested_spans_share_a_trace(trace_file):
+    @traced()
+    def upload():
+        pass
+
+    with span("submit", listing="RN001"):
+        upload()
+    child, parent = read_spans(trace_file)
+    assert (child["name"], parent["name"]) == ("upload", "submit")
+    assert child["traceId"] == parent["traceId"]
+    assert child["parentSpanId"] == parent["spanId"] and parent["parentSpanId"] == ""
+    assert parent["attributes"] == {"listing": "RN001"}
+
+
+def test_failed_spans_are_summarised_as_errors(trace_file):
+    with pytest.raises(ValueError):
+        with span("drive.upload"):
+            raise ValueError("quota")
+    with span("drive.upload"):
+        pass
+    [row] = summarize(read_spans(trace_file))
+    assert (row["stage"], row["count"], row["errors"]) == ("drive.upload", 2, 1)
+
+
+def test_file_rotates_past_the_size_limit(trace_file, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_MAX_BYTES", 2000)
+    for n in range(100):
+        with span("step", n=n):
+            pass
+    with open(trace_file) as f:
+        assert len(f.read()) <= 2000 + 400
+    # The summary still reaches back into the rotated file
+    spans = read_spans(trace_file, max_spans=10)
+    assert [record["attributes"]["n"] for record in spans] == list(range(90, 100))
+
+
+def test_read_spans_tails_the_file(trace_file, monkeypatch):
+    monkeypatch.setattr(tracing, "TAIL_BLOCK", 64)
+    with open(trace_file, "w") as f:
+        for n in range(1000):
+            f.write(json.dumps({"name": "step", "n": n, "durationMs": 1.0}) + "\n")
+        f.write("not json\n")
+    reads = []
+    real_open = open
+
+    def counting_open(*args, **kwargs):
+        handle = real_open(*args, **kwargs)
+        original = handle.read
+        handle.read = lambda size=-1: reads.append(size) or original(size)
+        return handle
+
+    monkeypatch.setattr("builtins.open", counting_open)
+    spans = read_spans(trace_file, max_spans=5)
+    assert [record["n"] for record in spans] == [996, 997, 998, 999]
+    assert sum(reads) < 64 * 8
+    assert read_spans(trace_file + ".missing") == []
@@ -0,0 +1,367 @@
+# text_search.py
+
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import defaultdict
+from operator import neg
+
+# -------------------------------------
+# Tokenizer
+# -------------------------------------
+# Lowercased alphanumeric words with a light plural stem ("pets" -> "pet",
+# "facilities" -> "facility"), plus adjacent-word bigrams so phrases such as
+# "no bachelors" outrank listings that merely contain both words.
+# Negations are deliberately not stopwords.
+SEARCH_FIELDS = {"amenities": 1.5, "restrictions": 1.5, "extraDetails": 1.0}    # field -> weight
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "in", "on", "at", "for", "with", "to", "is", "are",
+    "be", "by", "from", "as", "it", "this", "that", "has", "have", "will",
+}
+_WORD = re.compile(r"[a-z0-9]+")
+_CLAUSE = re.compile(r"[,;.\n|/]+")
+
+
+def stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us")):
+        return word[:-1]
+    return word
+
+
+def tokenize(text) -> list:
+    if isinstance(text, (list, tuple)):
+        text = " ".join(str(t) for t in text)
+    return [stem(w) for w in _WORD.findall(str(text or "").lower()) if w not in STOPWORDS]
+
+
+def index_terms(text) -> list:
+    """Words and adjacent-word bigrams of `text`, with repeats (term frequency counts).
+
+    Bigrams never span punctuation: "Gym, Pool" is two separate items.
+    """
+    if isinstance(text, (list, tuple)):
+        text = ", ".join(str(t) for t in text)
+    terms = []
+    for clause in _CLAUSE.split(str(text or "")):
+        words = tokenize(clause)
+        terms += words
+        terms += [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return terms
+
+
+# -------------------------------------
+# Inverted Index
+# -------------------------------------
+class TextIndex:
+    """BM25 over the free-text listing fields, kept current from the listing store.
+
+    Postings hold each document's precomputed BM25 term weight ("impact"), so
+    a query only multiplies by IDF and adds. Listings are numbered internally
+    and impacts are quantized to shared float objects, which keeps the
+    postings compact and their lookups cheap. Queries are answered top-k with
+    the threshold algorithm over the impact-sorted postings of the query
+    terms: each step reads the next block of the list whose bound on unseen
+    listings drops the most, every listing met is scored in full, and the walk
+    stops once the k-th best score reaches the sum of those bounds.
+
+    The impact-sorted postings are built once a batch of listings has
+    loaded and again after a reweight, never on the query path. Both rebuild
+    off the lock from a snapshot and swap the result in, so searches carry
+    on meanwhile with the previous impacts.
+    """
+
+    K1 = 1.2
+    B = 0.75
+    REWEIGHT_DRIFT = 0.1        # impacts are recomputed when the average length moves by 10%
+    IMPACT_SCALE = 1024         # impacts are rounded to 1/1024
+    RESULT_CACHE = 256          # recent (query, k) results, dropped on any index change
+    BULK_CHANGES = 256          # watch batches this large are loaded with one rebuild at the end
+    BLOCK = 64                  # postings read per step of a query
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._docno = {}                        # property ID -> document number
+        self._next_docno = 0
+        self._postings = defaultdict(dict)      # term -> {document number: impact}
+        self._doc_terms = {}                    # document number -> {term: weighted tf}
+        self._doc_len = {}
+        self._total_len = 0.0
+        self._impact_avgdl = 1.0                # average length the impacts were computed with
+        self._impacts = {}                      # quantized level -> shared float
+        self._sorted = {}                       # term -> ([document number], [impact]), highest impact first
+        self._loading = False                   # postings are sorted after the load, not per listing
+        self._rebuild_lock = threading.Lock()   # one rebuild at a time; it runs outside _lock
+        self._rebuilding = False
+        self._removed_meanwhile = []            # document numbers removed while a rebuild runs
+        self._summaries = {}                    # document number -> result row
+        self._results = {}                      # (query, k) -> results; Streamlit reruns repeat queries
+        self._watch = None
+        self.ready = threading.Event()
+
+    # --- Updates ---
+    def _norm(self, length: float, avgdl: float) -> float:
+        return self.K1 * (1 - self.B + self.B * length / avgdl)
+
+    def _impact(self, tf: float, norm: float) -> float:
+        level = round(tf * (self.K1 + 1) / (tf + norm) * self.IMPACT_SCALE)
+        impact = self._impacts.get(level)
+        if impact is None:
+            impact = self._impacts[level] = level / self.IMPACT_SCALE
+        return impact
+
+    def upsert(self, property_id: str, data: dict):
+        terms = defaultdict(float)
+        for field, weight in SEARCH_FIELDS.items():
+            for term in index_terms(data.get(field)):
+                terms[term] += weight
+        length = sum(terms.values())
+        with self._lock:
+            self._remove_locked(property_id)
+            self._results.clear()
+            if not terms:
+                return
+            docno = self._docno[property_id] = self._next_docno
+            self._next_docno += 1
+            self._doc_terms[docno] = dict(terms)
+            self._doc_len[docno] = length
+            self._total_len += length
+            self._add_postings_locked(docno)
+            self._summaries[docno] = {
+                "propertyId": property_id,
+                "propertyName": data.get("propertyName", ""),
+                "micromarket": data.get("micromarket", ""),
+                "configuration": data.get("configuration", ""),
+                "rentPerMonthInLakhs": data.get("rentPerMonthInLakhs", ""),
+                "inventoryStatus": data.get("inventoryStatus", ""),
+                **{field: data.get(field) or "" for field in SEARCH_FIELDS},
+            }
+            reweight = not self._loading and not self._rebuilding and self._drifted()
+        if reweight:
+            self._rebuild()
+
+    def _add_postings_locked(self, docno: int):
+        norm = self._norm(self._doc_len[docno], self._impact_avgdl)
+        for term, tf in self._doc_terms[docno].items():
+            impact = self._impact(tf, norm)
+            postings = self._postings[term]
+            postings[docno] = impact
+            if term in self._sorted:
+                docnos, impacts = self._sorted[term]
+                # Ties keep no particular order, so the new listing goes after its equals
+                i = bisect.bisect_right(impacts, -impact, key=neg)
+                docnos.insert(i, docno)
+                impacts.insert(i, impact)
+            elif not self._loading and len(postings) == 1:
+                self._sorted[term] = ([docno], [impact])
+
+    def remove(self, property_id: str):
+        with self._lock:
+            self._remove_locked(property_id)
+            self._results.clear()
+
+    def _remove_locked(self, property_id: str):
+        docno = self._docno.pop(property_id, None)
+        if docno is None:
+            return
+        self._remove_postings_locked(docno, self._doc_terms.pop(docno))
+        self._total_len -= self._doc_len.pop(docno)
+        del self._summaries[docno]
+        if self._rebuilding:
+            self._removed_meanwhile.append(docno)
+
+    def _remove_postings_locked(self, docno: int, terms: dict):
+        for term in terms:
+            postings = self._postings[term]
+            impact = postings.pop(docno)
+            if not postings:
+                del self._postings[term]
+                self._sorted.pop(term, None)
+            elif term in self._sorted:
+                # Kept sorted in place, so a listing update never re-sorts a common term
+                docnos, impacts = self._sorted[term]
+                lo = bisect.bisect_left(impacts, -impact, key=neg)
+                i = docnos.index(docno, lo, bisect.bisect_right(impacts, -impact, lo, key=neg))
+                del docnos[i], impacts[i]
+
+    def _avgdl(self) -> float:
+        return self._total_len / len(self._doc_len) if self._doc_len else 1.0
+
+    def _drifted(self) -> bool:
+        return abs(self._avgdl() - self._impact_avgdl) > self.REWEIGHT_DRIFT * self._impact_avgdl
+
+    def _rebuild(self):
+        """Recomputes and sorts every posting off the lock, then swaps them in.
+
+        Listings changed while it runs are replayed onto the new postings.
+        """
+        with self._rebuild_lock:
+            with self._lock:
+                self._rebuilding = True
+                avgdl = self._avgdl() if self._drifted() else self._impact_avgdl
+                # The per-document term dicts are replaced, never changed, so a shallow copy is a snapshot
+                doc_terms, doc_len, next_docno = dict(self._doc_terms), dict(self._doc_len), self._next_docno
+            try:
+                postings = self._compute_postings(doc_terms, doc_len, avgdl)
+                ranked = {term: self._sort_term(term_postings) for term, term_postings in postings.items()}
+            except BaseException:
+                with self._lock:
+                    self._rebuilding = False
+                    self._removed_meanwhile = []
+                raise
+            with self._lock:
+                self._postings, self._sorted, self._impact_avgdl = postings, ranked, avgdl
+                for docno in self._removed_meanwhile:
+                    if docno in doc_terms:
+                        self._remove_postings_locked(docno, doc_terms[docno])
+                for docno in range(next_docno, self._next_docno):
+                    if docno in self._doc_terms:
+                        self._add_postings_locked(docno)
+                self._removed_meanwhile = []
+                self._rebuilding = False
+                self._results.clear()
+
+    def _compute_postings(self, doc_terms: dict, doc_len: dict, avgdl: float):
+        postings = defaultdict(dict)
+        by_length = {}          # document length -> {tf: impact}; few distinct values of either
+        for docno, terms in doc_terms.items():
+            length = doc_len[docno]
+            impact_of = by_length.get(length)
+            if impact_of is None:
+                impact_of = by_length[length] = {}
+            norm = self._norm(length, avgdl)
+            for term, tf in terms.items():
+                impact = impact_of.get(tf)
+                if impact is None:
+                    impact = impact_of[tf] = self._impact(tf, norm)
+                postings[term][docno] = impact
+        return postings
+
+    @staticmethod
+    def _sort_term(postings: dict) -> tuple:
+        # Sorting the numbers by a float key is several times faster than sorting (impact, number) pairs
+        docnos = sorted(postings, key=postings.__getitem__, reverse=True)
+        return docnos, list(map(postings.__getitem__, docnos))
+
+    def load(self, changes):
+        """Applies (change type, property ID, data) changes, then reweights and sorts the postings once."""
+        with self._lock:
+            self._loading = True
+        try:
+            self._apply(changes)
+        finally:
+            with self._lock:
+                self._loading = False
+        self._rebuild()
+
+    # --- Queries ---
+    def _sorted_postings(self, term: str) -> tuple:
+        ranked = self._sorted.get(term)
+        if ranked is None:
+            # Only a query racing a load gets here
+            ranked = self._sorted[term] = self._sort_term(self._postings[term])
+        return ranked
+
+    def search(self, query: str, k: int = 20) -> list:
+        """Top k listings for `query` as [(score, summary)], best first."""
+        with self._lock:
+            cached = self._results.get((query, k))
+            if cached is not None:
+                return [(score, dict(summary)) for score, summary in cached]
+            n = len(self._doc_len)
+            weights = {}
+            for term in set(index_terms(query)):
+                df = len(self._postings.get(term, ()))
+                if df:
+                    # BM25 IDF, floored so very common words still count a little
+                    weights[term] = max(0.01, math.log((n - df + 0.5) / (df + 0.5) + 1))
+            lists = [(weight, *self._sorted_postings(term)) for term, weight in weights.items()]
+            lookups = [(weight, self._postings[term].get) for term, weight in weights.items()]
+            depths = [0] * len(lists)
+            # The most a listing not met yet can still score from each list
+            bounds = [weight * impacts[0] for weight, _, impacts in lists]
+            seen = set()
+            top = []                # min-heap of the best (score, document number) so far
+            while len(top) < k or top[0][0] < sum(bounds):
+                # Read on where the next block lowers the bound the most; common
+                # words with flat impacts are only read as deep as they matter
+                best, best_drop = None, 0.0
+                for i, (weight, docnos, impacts) in enumerate(lists):
+                    if depths[i] >= len(docnos):
+                        continue
+                    end = depths[i] + self.BLOCK
+                    drop = bounds[i] - (weight * impacts[end] if end < len(impacts) else 0.0)
+                    if best is None or drop > best_drop:
+                        best, best_drop = i, drop
+                if best is None:
+                    break
+                weight, docnos, impacts = lists[best]
+                start = depths[best]
+                end = depths[best] = start + self.BLOCK
+                for docno in docnos[start:end]:
+                    if docno in seen:
+                        continue
+                    seen.add(docno)
+                    score = 0.0
+                    for term_weight, impact_of in lookups:
+                        impact = impact_of(docno)
+                        if impact is not None:
+                            score += term_weight * impact
+                    if len(top) < k:
+                        heapq.heappush(top, (score, docno))
+                    elif score > top[0][0]:
+                        heapq.heapreplace(top, (score, docno))
+                bounds[best] = weight * impacts[end] if end < len(impacts) else 0.0
+            top.sort(reverse=True)
+            results = [(round(score, 4), self._summaries[docno]) for score, docno in top]
+            if len(self._results) >= self.RESULT_CACHE:
+                self._results.clear()
+            self._results[(query, k)] = results
+            return [(score, dict(summary)) for score, summary in results]
+
+    def clear_cache(self):
+        """Drops the cached results, so the next searches are computed again."""
+        with self._lock:
+            self._results.clear()
+
+    def __len__(self):
+        return len(self._doc_len)
+
+    # --- Listing store sync ---
+    def _apply(self, changes):
+        for change_type, property_id, data in changes:
+            if change_type == "REMOVED":
+                self.remove(property_id)
+            else:
+                self.upsert(property_id, data)
+
+    def _on_changes(self, changes):
+        # The first snapshot brings every listing in one batch
+        if len(changes) >= self.BULK_CHANGES:
+            self.load(changes)
+        else:
+            self._apply(changes)
+        self.ready.set()
+
+    def watch(self, listings):
+        """Loads every listing and keeps the index current by watching the listing store."""
+        self._watch = listings.watch(self._on_changes)
+        return self
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch()
+            self._watch = None
+
+
+def highlight(text: str, query: str) -> str:
+    """Markdown with the words of `text` that match a query term in bold."""
+    wanted = set(tokenize(query))
+    return re.sub(
+        r"[A-Za-z0-9]+",
+        lambda m: f"**{m.group(0)}**" if stem(m.group(0).lower()) in wanted else m.group(0),
+        str(text or ""),
+    )
@@ -0,0 +1,183 @@
+# tracing.py
+
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import math
+import os
+import secrets
+import threading
+import time
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------------
+# Configuration
+# -------------------------------------
+# One JSON object per finished span, using OpenTelemetry field names
+# (traceId, spanId, parentSpanId, startTimeUnixNano, ...), so the file can be
+# summarised here or converted/shipped by any OTLP-aware tool.
+#
+# The file rotates once it passes TRACE_MAX_BYTES: the full file moves to
+# TRACE_FILE + ".1" (replacing the previous one), so at most twice that is kept.
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1") == "1"
+TRACE_FILE = os.getenv("TRACE_FILE", ".traces/spans.jsonl")
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(16 * 1024 * 1024)))
+TAIL_BLOCK = 64 * 1024
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_write_lock = threading.Lock()
+
+
+def _write(record: dict):
+    try:
+        with _write_lock:
+            if os.path.dirname(TRACE_FILE):
+                os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+                size = f.tell()
+            if size > TRACE_MAX_BYTES:
+                # Processes sharing the file may both rotate; the loser only drops older spans
+                with contextlib.suppress(FileNotFoundError):
+                    os.replace(TRACE_FILE, TRACE_FILE + ".1")
+    except OSError as e:
+        logger.error(f"Trace write error: {e}")
+
+
+# -------------------------------------
+# Spans
+# -------------------------------------
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """Times the enclosed block as one span; spans opened inside it become its children.
+
+    Yields the attribute dict so callers can add attributes while the span is open.
+    """
+    if not TRACE_ENABLED:
+        yield attributes
+        return
+    parent = _current_span.get()
+    trace_id = parent["traceId"] if parent else secrets.token_hex(16)
+    current = {"traceId": trace_id, "spanId": secrets.token_hex(8)}
+    token = _current_span.set(current)
+    start_ns = time.time_ns()
+    start = time.perf_counter()
+    status = {"code": "OK"}
+    try:
+        yield attributes
+    except BaseException as e:
+        status = {"code": "ERROR", "message": str(e)[:500]}
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        _current_span.reset(token)
+        _write({
+            "traceId": trace_id,
+            "spanId": current["spanId"],
+            "parentSpanId": parent["spanId"] if parent else "",
+            "name": name,
+            "startTimeUnixNano": start_ns,
+            "endTimeUnixNano": start_ns + int(duration_ms * 1e6),
+            "durationMs": round(duration_ms, 3),
+            "attributes": attributes,
+            "status": status,
+        })
+
+
+def traced(name: str = None):
+    """Decorator form of span()."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def bind_context(func):
+    """Wraps func to run in the caller's trace context (for ThreadPoolExecutor workers)."""
+    ctx = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return ctx.copy().run(func, *args, **kwargs)
+
+    return wrapper
+
+
+# -------------------------------------
+# Summaries
+# -------------------------------------
+def _tail_lines(path: str, count: int) -> list:
+    """Last `count` complete lines of the file, read backwards in blocks."""
+    try:
+        with open(path, "rb") as f:
+            pos = f.seek(0, os.SEEK_END)
+            blocks, newlines = [], 0
+            while pos > 0 and newlines <= count:
+                step = min(TAIL_BLOCK, pos)
+                pos -= step
+                f.seek(pos)
+                blocks.append(f.read(step))
+                newlines += blocks[-1].count(b"\n")
+    except FileNotFoundError:
+        return []
+    lines = b"".join(reversed(blocks)).splitlines()
+    if pos > 0:
+        # Starts mid-line
+        lines = lines[1:]
+    return lines[-count:] if count else []
+
+
+def read_spans(path: str = TRACE_FILE, max_spans: int = 20000) -> list:
+    """Returns the most recent max_spans span records, reading only the tail of the file."""
+    lines = _tail_lines(path, max_spans)
+    if len(lines) < max_spans:
+        lines = _tail_lines(path + ".1", max_spans - len(lines)) + lines
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile
+    index = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(spans: list) -> list:
+    """Per span name: count, error count, p50/p95/max duration in ms; slowest p95 first."""
+    durations = defaultdict(list)
+    errors = defaultdict(int)
+    for record in spans:
+        durations[record["name"]].append(record["durationMs"])
+        if record.get("status", {}).get("code") == "ERROR":
+            errors[record["name"]] += 1
+    rows = []
+    for name, values in durations.items():
+        values.sort()
+        rows.append({
+            "stage": name,
+            "count": len(values),
+            "errors": errors[name],
+            "p50_ms": round(percentile(values, 50), 1),
+            "p95_ms": round(percentile(values, 95), 1),
+            "max_ms": round(values[-1], 1),
+        })
+    rows.sort(key=lambda r: r["p95_ms"], reverse=True)
+    return rows
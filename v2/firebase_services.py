@@ -2,6 +2,7 @@ import firebase_admin
 import logging
 from firebase_admin import credentials, firestore, storage
 from google.cloud import storage as gcs
+from metrics import instrument_session
 from config import FIREBASE_PROJECT_ID, FIREBASE_PRIVATE_KEY, FIREBASE_CLIENT_EMAIL, FIREBASE_STORAGE_BUCKET
 
 # Enable logging
@@ -47,3 +48,5 @@ def get_gcs_client():
 db = get_firestore_client()
 bucket = get_storage_bucket()
 gcs_client = get_gcs_client()
+instrument_session(bucket.client._http, "storage")
+instrument_session(gcs_client._http, "storage")
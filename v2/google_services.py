@@ -3,6 +3,7 @@ import gspread
 from google.oauth2.service_account import Credentials as GSpreadCredentials
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseUpload
+from http_transport import pooled_session, SessionHttp
 from config import (
     GSPREAD_PROJECT_ID,
     GSPREAD_PRIVATE_KEY_ID,
@@ -37,7 +38,7 @@ gspread_sa_info = {
     "client_x509_cert_url": f"https://www.googleapis.com/robot/v1/metadata/x509/{GSPREAD_CLIENT_EMAIL}",
 }
 gs_creds = GSpreadCredentials.from_service_account_info(gspread_sa_info, scopes=SCOPES)
-gc = gspread.authorize(gs_creds)
+gc = gspread.Client(auth=gs_creds, session=pooled_session(gs_creds))
 sheet = gc.open_by_key(GOOGLE_SHEET_ID).worksheet(SHEET_NAME)
 
 def ensure_sheet_headers():
@@ -81,7 +82,7 @@ drive_sa_info = {
     "client_x509_cert_url": f"https://www.googleapis.com/robot/v1/metadata/x509/{GOOGLE_DRIVE_CLIENT_EMAIL}",
 }
 drive_creds = GSpreadCredentials.from_service_account_info(drive_sa_info, scopes=SCOPES)
-drive_service = build("drive", "v3", credentials=drive_creds)
+drive_service = build("drive", "v3", http=SessionHttp(pooled_session(drive_creds)), cache_discovery=False)
 
 def create_drive_folder(folder_name: str, parent_id: str) -> str:
     query = f"'{parent_id}' in parents and name='{folder_name}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
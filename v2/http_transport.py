@@ -0,0 +1,51 @@
+# http_transport.py
+
+import os
+
+import httplib2
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+
+from metrics import instrument_session
+
+# -------------------------------------
+# Pooled HTTP Transport
+# -------------------------------------
+# Upload threads share one Drive service and one gspread client. httplib2 (the
+# googleapiclient default) is not thread-safe and opens a fresh TLS connection
+# per request, so both clients are routed through a requests/urllib3 pool.
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "120"))
+
+
+def pooled_session(creds, pool_maxsize: int = HTTP_POOL_MAXSIZE) -> AuthorizedSession:
+    """Returns an AuthorizedSession with a keep-alive connection pool of the given size.
+
+    Every request through it is recorded in the backend call metrics.
+    """
+    session = AuthorizedSession(creds)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return instrument_session(session)
+
+
+class SessionHttp:
+    """httplib2.Http-compatible wrapper so googleapiclient can use a pooled session."""
+
+    def __init__(self, session: AuthorizedSession, timeout: float = HTTP_TIMEOUT):
+        self.session = session
+        self.timeout = timeout
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        # Redirects are not followed: Drive answers resumable upload chunks with
+        # 308 "Resume Incomplete", which googleapiclient must see as-is.
+        resp = self.session.request(
+            method, uri, data=body, headers=headers, timeout=self.timeout, allow_redirects=False
+        )
+        info = dict(resp.headers)
+        info["status"] = str(resp.status_code)
+        return httplib2.Response(info), resp.content
+
+    def close(self):
+        self.session.close()
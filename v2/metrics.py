@@ -0,0 +1,306 @@
+# metrics.py
+
+import atexit
+import contextlib
+import functools
+import inspect
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------------
+# Configuration
+# -------------------------------------
+# Backend call metrics in Prometheus text format, served on METRICS_PORT
+# (GET /metrics) and/or rewritten to METRICS_FILE every METRICS_DUMP_INTERVAL s.
+# Every process exports its own registry: each one serves on the first free
+# port from METRICS_PORT up (scrape the whole range), and dumps to METRICS_FILE
+# with its pid before the extension ("metrics.prom" -> "metrics.4242.prom"),
+# with a pid label so a textfile collector can merge the files.
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_PORT_RANGE = int(os.getenv("METRICS_PORT_RANGE", "16"))
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_DUMP_INTERVAL = float(os.getenv("METRICS_DUMP_INTERVAL", "60"))
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "backend_calls_total": "Backend calls by service, operation and outcome (ok, error, rate_limited).",
+    "backend_call_seconds": "Backend call latency in seconds.",
+    "backend_bytes_sent_total": "Request payload bytes sent to backends.",
+    "backend_retries_total": "Retried backend operations.",
+    "backend_circuit_rejections_total": "Calls refused because the service's circuit breaker was open.",
+}
+
+
+# -------------------------------------
+# Registry
+# -------------------------------------
+class Registry:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)                 # (name, labels) -> value
+        self._histograms = {}                               # (name, labels) -> [bucket counts, sum, count]
+
+    def inc(self, name: str, labels: dict, value: float = 1.0):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name: str, labels: dict, value: float):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist[0][i] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    def counter_values(self, name: str) -> dict:
+        with self._lock:
+            return {labels: value for (n, labels), value in self._counters.items() if n == name}
+
+    def render(self, const_labels: tuple = ()) -> str:
+        """Prometheus text exposition format (version 0.0.4); const_labels are added to every sample."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._histograms.items())
+        lines = []
+        declared = set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        counters = [((name, const_labels + labels), value) for (name, labels), value in counters]
+        histograms = [((name, const_labels + labels), hist) for (name, labels), hist in histograms]
+        for (name, labels), value in counters:
+            declare(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), (bucket_counts, total, count) in histograms:
+            declare(name, "histogram")
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', f'{bound:g}'),))} {bucket_count}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels) + "}"
+
+
+registry = Registry()
+
+
+# -------------------------------------
+# Recording
+# -------------------------------------
+_RATE_LIMIT_TEXT = re.compile(r"\b429\b|RESOURCE_EXHAUSTED|rateLimitExceeded|Rate limit exceeded")
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """True for HTTP 429 / RESOURCE_EXHAUSTED errors from any of the Google clients (or the fakes)."""
+    for attr in ("status_code", "code"):
+        if getattr(error, attr, None) in (429, "429"):
+            return True
+    for holder in ("resp", "response"):
+        response = getattr(error, holder, None)
+        if response is not None and getattr(response, "status", getattr(response, "status_code", None)) in (429, "429"):
+            return True
+    return bool(_RATE_LIMIT_TEXT.search(str(error)))
+
+
+def record_call(service: str, op: str, seconds: float, outcome: str = "ok", nbytes: int = 0):
+    labels = {"service": service, "op": op}
+    registry.inc("backend_calls_total", {**labels, "outcome": outcome})
+    registry.observe("backend_call_seconds", labels, seconds)
+    if nbytes:
+        registry.inc("backend_bytes_sent_total", labels, nbytes)
+
+
+def record_retry(service: str, op: str):
+    registry.inc("backend_retries_total", {"service": service, "op": op})
+
+
+@contextlib.contextmanager
+def metered(service: str, op: str, nbytes: int = 0):
+    """Records one backend call: count by outcome, latency and bytes sent."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record_call(service, op, time.perf_counter() - start, "rate_limited" if is_rate_limited(e) else "error", nbytes)
+        raise
+    record_call(service, op, time.perf_counter() - start, "ok", nbytes)
+
+
+def meter(service: str, op: str = None):
+    """Decorator form of metered(); generator functions are timed until exhausted."""
+    def decorator(func):
+        name = op or func.__name__
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def gen_wrapper(*args, **kwargs):
+                with metered(service, name):
+                    yield from func(*args, **kwargs)
+            return gen_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with metered(service, name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+# -------------------------------------
+# HTTP Session Instrumentation
+# -------------------------------------
+_SERVICE_BY_HOST = {
+    "sheets.googleapis.com": "sheets",
+    "www.googleapis.com": "drive",
+    "storage.googleapis.com": "storage",
+    "oauth2.googleapis.com": "oauth",
+}
+_OP_SEGMENT = re.compile(r"^[a-z][A-Za-z]{1,19}$")
+
+
+def _operation(method: str, path: str) -> str:
+    # Keep API words (files, permissions, values, ...) and drop IDs, ranges and versions
+    words = [seg for seg in path.replace(":", "/").split("/") if _OP_SEGMENT.match(seg)]
+    return f"{method} {'.'.join(words) or '/'}"
+
+
+def _service_for(url) -> str:
+    host = url.hostname or ""
+    if host == "www.googleapis.com" and url.path.startswith(("/storage", "/upload/storage")):
+        return "storage"
+    return _SERVICE_BY_HOST.get(host, host)
+
+
+def instrument_session(session, service: str = None):
+    """Adds a response hook that records every request made through a requests.Session."""
+    def on_response(response, *args, **kwargs):
+        request = response.request
+        url = urlparse(request.url)
+        body = request.body
+        nbytes = len(body) if isinstance(body, (bytes, str)) else int(request.headers.get("Content-Length", 0) or 0)
+        if response.status_code == 429:
+            outcome = "rate_limited"
+        elif response.status_code >= 400:
+            outcome = "error"
+        else:
+            outcome = "ok"
+        record_call(service or _service_for(url), _operation(request.method, url.path),
+                    response.elapsed.total_seconds(), outcome, nbytes)
+        return response
+
+    session.hooks.setdefault("response", []).append(on_response)
+    return session
+
+
+# -------------------------------------
+# Export
+# -------------------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = "127.0.0.1", tries: int = 1):
+    """Serves /metrics on the first free port of port .. port + tries - 1."""
+    for offset in range(tries):
+        try:
+            server = ThreadingHTTPServer((host, port + offset), _MetricsHandler)
+            break
+        except OSError:
+            # Taken by another server process on this host
+            if offset == tries - 1:
+                raise
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    logger.info(f"Metrics served on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def process_path(path: str) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}.{os.getpid()}{ext}"
+
+
+def dump_to_file(path: str):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(registry.render((("pid", str(os.getpid())),)))
+    os.replace(tmp, path)
+
+
+def _remove_dump(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def start_file_dump(path: str, interval: float = METRICS_DUMP_INTERVAL):
+    # A stale file would keep reporting a process that is gone
+    atexit.register(_remove_dump, path)
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                dump_to_file(path)
+            except OSError as e:
+                logger.error(f"Metrics dump error: {e}")
+    threading.Thread(target=loop, daemon=True, name="metrics-dump").start()
+
+
+_exporter_started = False
+_exporter_lock = threading.Lock()
+
+
+def start_exporter():
+    """Starts the endpoint and/or file dump configured by env; safe to call on every rerun."""
+    global _exporter_started
+    with _exporter_lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+        if METRICS_PORT:
+            try:
+                start_http_server(METRICS_PORT, tries=METRICS_PORT_RANGE)
+            except OSError as e:
+                logger.error(f"Metrics endpoint error: no free port in {METRICS_PORT}-{METRICS_PORT + METRICS_PORT_RANGE - 1}: {e}")
+        if METRICS_FILE:
+            start_file_dump(process_path(METRICS_FILE))
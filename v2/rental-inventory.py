@@ -25,6 +25,7 @@ st.markdown(
 
 
 from firebase_services import db
+from metrics import metered, start_exporter
 from google_services import (
     ensure_sheet_headers,
     append_to_google_sheet,
@@ -45,6 +46,7 @@ from area_data import areasData, all_micromarkets, find_area  # Ensure area_data
 
 # Ensure sheet headers are set
 ensure_sheet_headers()
+start_exporter()
 
 st.title("Rental Inventory Entry")
 
@@ -302,7 +304,9 @@ if submitted:
     
     try:
         append_to_google_sheet(sheet_row)
-        db.collection("rental-inventories").document(property_id).set(property_data)
+        # create() fails rather than overwrite another agent's listing
+        with metered("firestore", "create"):
+            db.collection("rental-inventories").document(property_id).create(property_data)
         st.success("Property saved to Firebase!")
         st.success("Property details appended to Google Sheet!")
         st.success("Submission Successful!")
@@ -1,6 +1,9 @@
 import datetime
+import time
+import uuid
 import streamlit as st
 from firebase_services import db, bucket
+from metrics import metered
 
 def parse_coordinates(coord_str: str):
     try:
@@ -27,7 +30,8 @@ def strip_plus91(num: str) -> str:
 def fetch_agent_details(agent_number: str):
     from firebase_services import db
     agent_number = standardize_phone_number(agent_number)
-    docs = db.collection("agents").where("phonenumber", "==", agent_number).limit(1).stream()
+    with metered("firestore", "find_agent"):
+        docs = list(db.collection("agents").where("phonenumber", "==", agent_number).limit(1).stream())
     for doc in docs:
         data = doc.to_dict()
         return data.get("cpId"), data.get("name")
@@ -35,7 +39,8 @@ def fetch_agent_details(agent_number: str):
 
 def generate_property_id():
     from firebase_services import db
-    docs = list(db.collection("rental-inventories").stream())
+    with metered("firestore", "stream"):
+        docs = list(db.collection("rental-inventories").stream())
     max_id = 0
     for doc in docs:
         pid = doc.get("propertyId")
@@ -47,7 +52,22 @@ def generate_property_id():
             except Exception:
                 pass
     new_id = max_id + 1
-    return f"RN{new_id:03d}"
+    return claim_property_id(new_id)
+
+def claim_property_id(number: int) -> str:
+    """Reserves RN<number> (or the next free number) so no other session or app instance gets it."""
+    from firebase_services import db
+    from google.api_core.exceptions import Conflict
+    owner = uuid.uuid4().hex
+    while True:
+        property_id = f"RN{number:03d}"
+        try:
+            # Whoever creates the reservation document first owns the ID
+            with metered("firestore", "create"):
+                db.collection("rental-inventory-ids").document(property_id).create({"owner": owner, "createdAt": time.time()})
+            return property_id
+        except Conflict:
+            number += 1
 
 def upload_media_to_firebase(property_id: str, file_obj, folder: str, filename: str) -> str:
     path = f"rental-media-files/{property_id}/{folder}/{filename}"